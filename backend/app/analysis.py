@@ -12,6 +12,11 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 VERAPDF_CONTAINER_NAME = "verapdf_service"
+# Zagregowane błędy veraPDF: ile przykładowych kontekstów obiektów i numerów stron zachować na regułę
+MAX_SAMPLE_CONTEXTS = 3
+MAX_RULE_PAGES = 20
+# Numer strony (od 0) w kontekście sprawdzenia, np. "root/document[0]/pages[4](12 0 obj PDPage)/..."
+PAGE_CONTEXT_RE = re.compile(r"pages\[(\d+)\]")
 
 class PdfAnalysis:
     """
@@ -389,22 +394,52 @@ def validate_pdf_ua(pdf_filename: str) -> Tuple[bool, str]:
 def parse_verapdf_report(xml_report: str) -> List[Dict]:
     """
     Parsuje raport XML z veraPDF i wyciąga listę błędów.
+
+    Jeden wpis na parę (klauzula, numer testu) z liczbą wystąpień (`count`, z atrybutu
+    failedChecks), typem obiektu, numerami stron i kilkoma przykładowymi kontekstami.
+    veraPDF zwykle podaje już jeden <rule> na parę - scalane są tylko powtórzenia.
+    Wpisy są posortowane malejąco po liczbie wystąpień.
     """
-    failed_rules = []
+    aggregated: Dict[Tuple, Dict] = {}
+    pages: Dict[Tuple, set] = {}
     try:
         # Usuwa przestrzeń nazw dla uproszczenia
         xml_report = xml_report.replace('xmlns="http://www.verapdf.org/ValidationProfile"', '')
         root = ET.fromstring(xml_report)
 
         for rule in root.findall('.//rule[@status="failed"]'):
-            error = {
-                "specification": rule.get("specification"),
-                "clause": rule.get("clause"),
-                "testNumber": rule.get("testNumber"),
-                "description": rule.find("description").text if rule.find("description") is not None else "No description"
-            }
+            key = (rule.get("clause"), rule.get("testNumber"))
+            error = aggregated.get(key)
+            if error is None:
+                error = aggregated[key] = {
+                    "specification": rule.get("specification"),
+                    "clause": rule.get("clause"),
+                    "testNumber": rule.get("testNumber"),
+                    "description": rule.find("description").text if rule.find("description") is not None else "No description",
+                    "object": rule.findtext("object"),
+                    "count": 0,
+                    "pages": [],
+                    "contexts": []
+                }
+                pages[key] = set()
+
+            checks = rule.findall('check[@status="failed"]')
+            # failedChecks to pełna liczba; veraPDF wypisuje tylko część sprawdzeń (--maxfailuresdisplayed)
+            failed_checks = rule.get("failedChecks", "")
+            error["count"] += int(failed_checks) if failed_checks.isdigit() else max(len(checks), 1)
+            for check in checks:
+                context = check.findtext("context") or ""
+                page = PAGE_CONTEXT_RE.search(context)
+                if page:
+                    pages[key].add(int(page.group(1)) + 1)
+                if context and len(error["contexts"]) < MAX_SAMPLE_CONTEXTS:
+                    error["contexts"].append(context)
+
+        failed_rules = []
+        for key, error in aggregated.items():
+            error["pages"] = sorted(pages[key])[:MAX_RULE_PAGES]
             failed_rules.append(error)
-        
+        failed_rules.sort(key=lambda error: -error["count"])
         return failed_rules
 
     except ET.ParseError:
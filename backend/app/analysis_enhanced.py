@@ -1,11 +1,20 @@
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import time
 from app.models.analysis_levels import AnalysisLevel
 from app.analysis import PdfAnalysis
 
 logger = logging.getLogger(__name__)
 
+# Etapy analizy wykonywane na danym poziomie (wyższy poziom zawiera etapy niższego)
+LEVEL_STAGES = {
+    AnalysisLevel.QUICK: ("basic", "quick_metrics"),
+    AnalysisLevel.STANDARD: ("basic", "quick_metrics", "metadata", "images", "headings", "text_preview"),
+    AnalysisLevel.PROFESSIONAL: (
+        "basic", "quick_metrics", "metadata", "images", "headings", "text_preview", "deep_scan"
+    ),
+}
+
 class EnhancedPdfAnalysis(PdfAnalysis):
     """
     Rozszerzona klasa analizy PDF z obsługą poziomów szczegółowości.
@@ -22,30 +31,13 @@ class EnhancedPdfAnalysis(PdfAnalysis):
         logger.info(f"Rozpoczynanie analizy PDF - poziom: {level.value}")
         logger.info(f"Konfiguracja: {config['name']}")
         
-        # Podstawowe informacje (dla wszystkich poziomów)
         results = {
             "analysis_level": level.value,
             "analysis_config": config,
-            "page_count": min(self.doc.page_count, config['max_pages_to_scan'] or self.doc.page_count),
-            "total_pages": self.doc.page_count,
-            "is_tagged": self._is_tagged(),
-            "contains_text": self._check_text_presence(config['max_pages_to_scan']),
         }
-        
-        # QUICK - tylko podstawy
-        if level == AnalysisLevel.QUICK:
-            results.update(self._quick_analysis())
-            
-        # STANDARD - dodajemy szczegóły
-        elif level == AnalysisLevel.STANDARD:
-            results.update(self._quick_analysis())
-            results.update(self._standard_analysis())
-            
-        # PROFESSIONAL - pełna analiza
-        elif level == AnalysisLevel.PROFESSIONAL:
-            results.update(self._quick_analysis())
-            results.update(self._standard_analysis())
-            results.update(self._professional_analysis())
+        # Wyższy poziom = etapy niższego + własne (patrz LEVEL_STAGES)
+        for stage in LEVEL_STAGES[level]:
+            results.update(self.run_stage(stage, level))
         
         # Czas analizy
         results["analysis_time"] = round(time.time() - start_time, 2)
@@ -53,6 +45,34 @@ class EnhancedPdfAnalysis(PdfAnalysis):
         
         return results
     
+    def run_stage(self, stage: str, level: AnalysisLevel = AnalysisLevel.STANDARD) -> Dict[str, Any]:
+        """Wykonuje pojedynczy etap analizy; wynik jest fragmentem słownika wyników"""
+        config = level.get_config()
+        if stage == "basic":
+            # Podstawowe informacje (dla wszystkich poziomów)
+            return self.basic_for_level(self.basic_facts(), config)
+        if stage == "quick_metrics":
+            return self._quick_analysis()
+        if stage == "metadata":
+            # Metadane - używamy rozszerzonej wersji
+            metadata = self._get_extended_metadata()
+            return {
+                "metadata": metadata,
+                "is_title_defined": metadata.get("is_title_defined", False),
+                "is_lang_defined": metadata.get("is_lang_defined", False),
+            }
+        if stage == "images":
+            # Obrazy i alt-teksty - używamy metody z klasy bazowej
+            return {"image_info": self._get_image_alts()} if self._count_images() > 0 else {}
+        if stage == "headings":
+            # Nagłówki - używamy metody z klasy bazowej
+            return {"heading_info": self._analyze_headings()} if self._is_tagged() else {}
+        if stage == "text_preview":
+            return {"text_preview": self._extract_text_preview(max_chars=500)}
+        if stage == "deep_scan":
+            return self._professional_analysis()
+        raise ValueError(f"Nieznany etap analizy: {stage}")
+    
     def _quick_analysis(self) -> Dict[str, Any]:
         """Szybka analiza - podstawowe metryki"""
         return {
@@ -64,29 +84,6 @@ class EnhancedPdfAnalysis(PdfAnalysis):
             }
         }
     
-    def _standard_analysis(self) -> Dict[str, Any]:
-        """Standardowa analiza - więcej szczegółów"""
-        results = {}
-        
-        # Metadane - używamy rozszerzonej wersji
-        metadata = self._get_extended_metadata()
-        results["metadata"] = metadata
-        results["is_title_defined"] = metadata.get("is_title_defined", False)
-        results["is_lang_defined"] = metadata.get("is_lang_defined", False)
-        
-        # Obrazy i alt-teksty - używamy metody z klasy bazowej
-        if self._count_images() > 0:
-            results["image_info"] = self._get_image_alts()
-        
-        # Nagłówki - używamy metody z klasy bazowej
-        if self._is_tagged():
-            results["heading_info"] = self._analyze_headings()
-        
-        # Preview tekstu
-        results["text_preview"] = self._extract_text_preview(max_chars=500)
-        
-        return results
-    
     def _professional_analysis(self) -> Dict[str, Any]:
         """Profesjonalna analiza - deep scan"""
         results = {
@@ -117,6 +114,34 @@ class EnhancedPdfAnalysis(PdfAnalysis):
     
     # ===== METODY POMOCNICZE UNIKALNE DLA ENHANCED =====
     
+    def basic_facts(self) -> Dict[str, Any]:
+        """Dane etapu "basic" niezależne od poziomu analizy (jeden wpis cache dla wszystkich poziomów)"""
+        return {
+            "total_pages": self.doc.page_count,
+            "is_tagged": self._is_tagged(),
+            "first_text_page": self._first_text_page(),
+        }
+    
+    @staticmethod
+    def basic_for_level(facts: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+        """Wynik etapu "basic" z limitem skanowanych stron danego poziomu"""
+        total_pages = facts["total_pages"]
+        max_pages = config['max_pages_to_scan'] or total_pages
+        first_text_page = facts["first_text_page"]
+        return {
+            "page_count": min(total_pages, max_pages),
+            "total_pages": total_pages,
+            "is_tagged": facts["is_tagged"],
+            "contains_text": first_text_page is not None and first_text_page < max_pages,
+        }
+    
+    def _first_text_page(self) -> Optional[int]:
+        """Indeks pierwszej strony z tekstem (None, gdy dokument nie ma warstwy tekstowej)"""
+        for i, page in enumerate(self.doc):
+            if page.get_text().strip():
+                return i
+        return None
+    
     def _check_text_presence(self, max_pages: int = None) -> bool:
         """Sprawdza obecność tekstu"""
         pages_to_check = min(self.doc.page_count, max_pages or self.doc.page_count)
@@ -235,7 +260,7 @@ class EnhancedPdfAnalysis(PdfAnalysis):
                 "has_text": bool(page.get_text().strip()),
                 "image_count": len(page.get_images()),
                 "link_count": len(page.get_links()),
-                "annotation_count": len(page.annots()),
+                "annotation_count": len(list(page.annots())),
                 "rotation": page.rotation,
                 "mediabox": list(page.mediabox)
             }
@@ -0,0 +1,82 @@
+import threading
+import time
+from typing import Callable, Dict, Any
+
+
+class CircuitBreaker:
+    """
+    Wyłącznik awaryjny dla zależności sieciowych (np. Redis).
+
+    - closed: wywołania przechodzą normalnie, kolejne błędy są liczone
+    - open: po `failure_threshold` błędach z rzędu wywołania są od razu odrzucane
+    - half_open: po `reset_timeout` sekundach przepuszczane jest jedno próbne wywołanie;
+      sukces zamyka obwód, błąd otwiera go ponownie
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_progress = False
+        self.metrics = {"opened": 0, "rejected": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        """Czy wywołanie może zostać wykonane (w stanie half-open - tylko jedno naraz)"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and self._clock() - self._opened_at < self.reset_timeout:
+                self.metrics["rejected"] += 1
+                return False
+            # Half-open: przepuszczamy pojedyncze wywołanie próbne
+            if self._trial_in_progress:
+                self.metrics["rejected"] += 1
+                return False
+            self._state = self.HALF_OPEN
+            self._trial_in_progress = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_progress = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_progress = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.metrics["opened"] += 1
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+    def trip(self) -> None:
+        """Natychmiast otwiera obwód (np. gdy zależność jest niedostępna przy starcie)"""
+        with self._lock:
+            if self._state != self.OPEN:
+                self.metrics["opened"] += 1
+            self._state = self.OPEN
+            self._opened_at = self._clock()
+            self._trial_in_progress = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Stan wyłącznika do endpointów diagnostycznych"""
+        return {"state": self.state, "consecutive_failures": self._failures, **self.metrics}
@@ -0,0 +1,149 @@
+from typing import Optional
+
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - zależność opcjonalna
+    brotli = None
+
+# Formaty już skompresowane - ponowna kompresja to tylko koszt CPU
+INCOMPRESSIBLE_TYPES = ("application/pdf", "application/zip", "application/gzip", "image/", "video/", "audio/")
+# Większe odpowiedzi kompresujemy w wątku, żeby nie blokować pętli zdarzeń
+THREAD_MINIMUM_SIZE = 256 * 1024
+
+
+def _mark_encoded(headers: MutableHeaders) -> None:
+    """
+    Nagłówki odpowiedzi, której treść zależy od Accept-Encoding.
+    Zakodowana treść ma inne bajty niż tożsamościowa, więc silny ETag staje się słaby
+    (cache i If-None-Match nie pomylą wariantów), a Vary informuje cache o negocjacji.
+    """
+    headers.add_vary_header("Accept-Encoding")
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = f"W/{etag}"
+
+
+class BrotliMiddleware:
+    """
+    Kompresja odpowiedzi algorytmem Brotli dla klientów wysyłających 'Accept-Encoding: br'.
+
+    Działa jako warstwa zewnętrzna nad GZipMiddleware: gdy wybiera Brotli, ukrywa
+    nagłówek Accept-Encoding przed warstwami wewnętrznymi, więc odpowiedź nie jest
+    kompresowana dwa razy. Bez pakietu `brotli` obsługuje tylko nagłówki odpowiedzi
+    skompresowanych przez GZipMiddleware (słaby ETag, Vary).
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.quality = quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        if brotli is None or "br" not in [token.split(";")[0].strip() for token in accept_encoding.split(",")]:
+            await self.app(scope, receive, _EncodedHeadersSender(send).send)
+            return
+
+        inner_scope = dict(scope)
+        inner_scope["headers"] = [
+            (name, value) for name, value in scope["headers"] if name.lower() != b"accept-encoding"
+        ]
+        responder = _BrotliResponder(self.minimum_size, self.quality, send)
+        await self.app(inner_scope, receive, responder.send)
+
+
+class _EncodedHeadersSender:
+    """Poprawia nagłówki odpowiedzi skompresowanych przez warstwy wewnętrzne (gzip)"""
+
+    def __init__(self, send: Send):
+        self._send = send
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = MutableHeaders(raw=message["headers"])
+            if "content-encoding" in headers:
+                _mark_encoded(headers)
+        await self._send(message)
+
+
+class _BrotliResponder:
+    def __init__(self, minimum_size: int, quality: int, send: Send):
+        self.minimum_size = minimum_size
+        self.quality = quality
+        self._send = send
+        self.initial_message: Optional[Message] = None
+        self.passthrough = False
+        self.compressor = None
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.passthrough = (
+                "content-encoding" in headers
+                or message["status"] in (204, 206, 304)
+                or content_type.startswith(INCOMPRESSIBLE_TYPES)
+            )
+            if self.passthrough:
+                if "content-encoding" in headers or message["status"] == 304:
+                    # 304 zastępuje odpowiedź, która mogła być zakodowana - te same nagłówki
+                    _mark_encoded(MutableHeaders(raw=message["headers"]))
+                await self._send(message)
+            else:
+                self.initial_message = message
+            return
+
+        if self.passthrough or message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.initial_message is not None:
+            # Pierwszy fragment treści - decydujemy o kompresji
+            start, self.initial_message = self.initial_message, None
+            headers = MutableHeaders(raw=start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+
+            if not more_body:
+                if len(body) < self.minimum_size:
+                    await self._send(start)
+                    await self._send(message)
+                    return
+                compressed = await self._run(brotli.compress, body, quality=self.quality)
+                headers["Content-Encoding"] = "br"
+                _mark_encoded(headers)
+                headers["Content-Length"] = str(len(compressed))
+                await self._send(start)
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+
+            # Odpowiedź strumieniowa - kompresujemy fragmentami
+            self.compressor = brotli.Compressor(quality=self.quality)
+            headers["Content-Encoding"] = "br"
+            _mark_encoded(headers)
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            await self._send(start)
+
+        if self.compressor is None:
+            await self._send(message)
+            return
+
+        chunk = self.compressor.process(body)
+        chunk += self.compressor.flush() if more_body else self.compressor.finish()
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    async def _run(self, func, data: bytes, **kwargs) -> bytes:
+        if len(data) < THREAD_MINIMUM_SIZE:
+            return func(data, **kwargs)
+        return await anyio.to_thread.run_sync(lambda: func(data, **kwargs))
@@ -0,0 +1,82 @@
+import fnmatch
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class LocalCache:
+    """
+    Ograniczony pamięciowo cache LRU z TTL w obrębie procesu.
+
+    Budżet liczony jest w bajtach (rozmiar przekazywany przez wywołującego,
+    np. długość zserializowanego wpisu z Redis). Przy przekroczeniu budżetu
+    usuwane są najdawniej używane wpisy. Zwracane obiekty są współdzielone -
+    wywołujący nie powinien ich modyfikować.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, ttl: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self.metrics = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.metrics["misses"] += 1
+                return None
+            expires_at, _, value = entry
+            if expires_at <= self._clock():
+                self._remove(key)
+                self.metrics["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.metrics["hits"] += 1
+            return value
+
+    def set(self, key: str, value: Any, size: int, ttl: Optional[float] = None) -> bool:
+        """Zapisuje wpis; zbyt duże wpisy (ponad 1/8 budżetu) nie trafiają do cache"""
+        if size > self.max_bytes // 8:
+            return False
+        expires_at = self._clock() + min(ttl or self.ttl, self.ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.metrics["evictions"] += 1
+        return True
+
+    def invalidate(self, pattern: str) -> int:
+        """Usuwa wpis o danym kluczu albo wszystkie pasujące do wzorca glob (jak w Redis)"""
+        with self._lock:
+            if not any(ch in pattern for ch in "*?["):
+                keys = [pattern] if pattern in self._entries else []
+            else:
+                keys = [key for key in self._entries if fnmatch.fnmatchcase(key, pattern)]
+            for key in keys:
+                self._remove(key)
+            self.metrics["invalidations"] += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.metrics, "entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
@@ -0,0 +1,156 @@
+import json
+import zlib
+from datetime import date, datetime
+from typing import Any, Union
+
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - zależność opcjonalna
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - zależność opcjonalna
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zależność opcjonalna
+    zstandard = None
+
+# Nazwa aktywnego serializera (do metryk i benchmarków)
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+
+def dumps(obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """
+    Serializuje obiekt do JSON (UTF-8, bez escapowania znaków spoza ASCII).
+    Używa orjson jeśli jest dostępny, w przeciwnym razie standardowego json.
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option, default=_default)
+    return json.dumps(
+        obj,
+        ensure_ascii=False,
+        indent=2 if indent else None,
+        separators=None if indent else (",", ":"),
+        sort_keys=sort_keys,
+        default=_default
+    ).encode()
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """Deserializuje JSON (bytes lub str)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = bytes(data)
+    return json.loads(data)
+
+
+def _default(obj: Any) -> Any:
+    """Typy spoza JSON spotykane w wynikach analizy (np. krotki z PyMuPDF, zbiory)"""
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8", errors="replace")
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+# --- Zwarty format binarny dla Redis (cache i backend wyników Celery) ---
+#
+# Nagłówek: PACK_MAGIC + bajt wersji + bajt formatu (serializer | kompresja << 4).
+# Wpisy bez nagłówka to starszy JSON - nadal są czytelne.
+
+PACK_MAGIC = b"\x00PA"
+PACK_VERSION = 1
+# Poniżej tego rozmiaru kompresja nie opłaca się
+COMPRESSION_MIN_SIZE = 1024
+
+SERIALIZER_JSON = 0
+SERIALIZER_MSGPACK = 1
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+
+PACK_SERIALIZER = SERIALIZER_MSGPACK if msgpack is not None else SERIALIZER_JSON
+PACK_COMPRESSION = COMPRESSION_ZSTD if zstandard is not None else COMPRESSION_ZLIB
+ZSTD_LEVEL = 6
+ZLIB_LEVEL = 6
+
+
+def pack(obj: Any) -> bytes:
+    """Serializuje obiekt do zwartej, wersjonowanej postaci binarnej (msgpack + zstd/zlib)"""
+    serializer = PACK_SERIALIZER
+    if serializer == SERIALIZER_MSGPACK:
+        body = msgpack.packb(obj, default=_default, use_bin_type=True)
+    else:
+        body = dumps(obj)
+
+    compression = COMPRESSION_NONE
+    if len(body) >= COMPRESSION_MIN_SIZE:
+        compression = PACK_COMPRESSION
+        if compression == COMPRESSION_ZSTD:
+            body = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+        else:
+            body = zlib.compress(body, ZLIB_LEVEL)
+
+    return PACK_MAGIC + bytes((PACK_VERSION, serializer | compression << 4)) + body
+
+
+def unpack(data: Union[bytes, str]) -> Any:
+    """Odczytuje dane zapisane przez pack() lub starszy zapis JSON"""
+    if isinstance(data, str) or not data.startswith(PACK_MAGIC):
+        return loads(data)
+
+    header_size = len(PACK_MAGIC) + 2
+    version, fmt = data[len(PACK_MAGIC)], data[len(PACK_MAGIC) + 1]
+    if version != PACK_VERSION:
+        raise ValueError(f"Unsupported packed payload version: {version}")
+
+    body = data[header_size:]
+    compression = fmt >> 4
+    if compression == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise ValueError("Payload is zstd-compressed but zstandard is not installed")
+        body = zstandard.ZstdDecompressor().decompress(body)
+    elif compression == COMPRESSION_ZLIB:
+        body = zlib.decompress(body)
+
+    if fmt & 0x0F == SERIALIZER_MSGPACK:
+        if msgpack is None:
+            raise ValueError("Payload is msgpack-encoded but msgpack is not installed")
+        return msgpack.unpackb(body, raw=False, strict_map_key=False)
+    return loads(body)
+
+
+# Nazwa serializera wyników Celery opartego o pack()/unpack()
+CELERY_RESULT_SERIALIZER = "pdfaudit-packed"
+
+
+def register_celery_serializer() -> str:
+    """Rejestruje pack()/unpack() jako serializer kombu i zwraca jego nazwę"""
+    from kombu.serialization import register
+
+    register(
+        CELERY_RESULT_SERIALIZER, pack, unpack,
+        content_type="application/x-pdfaudit-packed",
+        content_encoding="binary"
+    )
+    return CELERY_RESULT_SERIALIZER
+
+
+class FastJSONResponse(JSONResponse):
+    """Odpowiedź JSON serializowana wspólnym szybkim serializerem"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
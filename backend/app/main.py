@@ -1,11 +1,38 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from app.common.compression import BrotliMiddleware
+from app.common.serialization import FastJSONResponse
 from app.routers import pdf, rules
+from app.services.task_status import task_status_watcher
+from app.services.report_renderer import report_renderer
+from app.services.redis_client import redis_client
+from app.services.rules_service import rules_service
+from app.services.stage_cache import all_stage_fingerprints
+from app.tasks import analysis_fingerprint
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Odciski wersji cache liczone raz przy starcie (źródła analizatorów, wersja veraPDF)
+    stage_fingerprints = await run_in_threadpool(all_stage_fingerprints)
+    print(f"🔖 Wersja cache analizy: {await run_in_threadpool(analysis_fingerprint)}, etapy: {stage_fingerprints}")
+    # Przeładowywanie bazy reguł po zmianie pliku (bez restartu procesu)
+    rules_service.start_watcher()
+    yield
+    rules_service.stop_watcher()
+    # Zamykamy wspólne połączenie pub/sub dla long-poll statusu zadań
+    await task_status_watcher.close()
+    report_renderer.shutdown()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 load_dotenv()
 # Odczytujemy zmienne środowiskowe przekazane przez Dockera
@@ -38,9 +65,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Kompresja dużych odpowiedzi (raporty): Brotli gdy klient go obsługuje, w przeciwnym razie gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=6)
+app.add_middleware(BrotliMiddleware, minimum_size=1024)
+
 app.include_router(pdf.router)
 app.include_router(rules.router)
 
 @app.get("/")
 def read_root():
-    return {"Hello": "From Final Version"}
\ No newline at end of file
+    return {"Hello": "From Final Version"}
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Metryki cache (suma ze wszystkich procesów) w formacie Prometheus"""
+    body = await run_in_threadpool(redis_client.shared_metrics.render_prometheus)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
\ No newline at end of file
@@ -0,0 +1,46 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Literal, Optional, Union
+
+
+class FeatureSpec(BaseModel):
+    """Cecha dokumentu używana w kryteriach (pierwsza istniejąca ścieżka w danych wejściowych)"""
+    type: Literal["flag", "number"] = Field(..., description="flag - wartość logiczna, number - liczba")
+    paths: List[List[str]] = Field(..., min_length=1, description="Ścieżki, np. [['analysis', 'is_tagged']]")
+    default: float = Field(0, description="Wartość liczby, gdy żadna ścieżka nie istnieje")
+
+
+class CriterionSpec(BaseModel):
+    """Kryterium oceny: maksimum punktów i wyrażenie liczące punkty"""
+    name: str = Field(..., description="Nazwa kryterium w raporcie")
+    max: int = Field(..., ge=0, description="Maksymalna liczba punktów")
+    points: Union[int, Dict[str, Any]] = Field(..., description="Wyrażenie: liczba, if/sum/ratio/deduct")
+    when: Optional[Dict[str, Any]] = Field(None, description="Warunek występowania kryterium w ocenie")
+
+
+class LevelSpec(BaseModel):
+    """Próg poziomu dostępności (procent wyniku)"""
+    min: float = Field(..., ge=0, le=100)
+    label: str
+
+
+class ScoringProfileSpec(BaseModel):
+    """Deklaratywna definicja profilu oceny dostępności"""
+    description: str = ""
+    criteria: List[CriterionSpec] = Field(..., min_length=1)
+    levels: List[LevelSpec] = Field(..., min_length=1, description="Progi malejąco; ostatni musi mieć min 0")
+
+
+class ScoringProfilesFile(BaseModel):
+    """Zawartość pliku z profilami oceny"""
+    features: Dict[str, FeatureSpec]
+    profiles: Dict[str, ScoringProfileSpec] = Field(..., min_length=1)
+
+
+class ScoringProfileError(ValueError):
+    """Niepoprawna definicja profilu oceny"""
+    pass
+
+
+class ScoringProfileNotFoundError(Exception):
+    """Wyjątek gdy profil oceny nie istnieje"""
+    pass
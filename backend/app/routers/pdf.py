@@ -1,15 +1,25 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse, StreamingResponse
-from celery.result import AsyncResult
-from weasyprint import HTML
-import json
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from celery import states
 import io
+import hashlib
 from datetime import datetime
 from enum import Enum
+from typing import Optional
 
 # Importujemy tylko to, co jest naprawdę potrzebne
-from app.tasks import run_full_pdf_analysis_task
+from app.tasks import run_full_pdf_analysis_task, invalidate_cache_task, analysis_fingerprint
+from app.common.serialization import FastJSONResponse
 from app.services.redis_client import redis_client
+from app.services.stage_cache import all_stage_fingerprints
+from app.services import fingerprints
+from app.services.rules_service import rules_service
+from app.services.scoring import scoring_profiles, CLASSIC_PROFILE
+from app.services.recommendations import recommendation_engine
+from app.services.task_status import task_status_watcher, describe_failure, MAX_WAIT_SECONDS
+from app.services.webhooks import webhook_outbox, is_valid_callback_url, CallbackPayload
+from app.services.report_renderer import report_renderer, generate_html_report, iter_html_report
 
 # Definicja formatów raportu
 class ReportFormat(str, Enum):
@@ -17,23 +27,67 @@ class ReportFormat(str, Enum):
     html = "html"
     pdf = "pdf"
 
+REPORT_MEDIA_TYPES = {
+    ReportFormat.json: "application/json",
+    ReportFormat.html: "text/html",
+    ReportFormat.pdf: "application/pdf"
+}
+# Wynik zadania jest niezmienny - przeglądarka może go cache'ować, ale raport z audytu
+# może dotyczyć prywatnego dokumentu, więc współdzielone proxy/CDN nie mogą go zapisywać
+REPORT_CACHE_CONTROL = "private, max-age=86400, immutable"
+
 router = APIRouter()
 
 # --- GŁÓWNE ENDPOINTY APLIKACJI ---
 
 @router.post("/upload/", tags=["PDF Processing"], status_code=202)
-async def upload_pdf_for_analysis(file: UploadFile = File(...)):
+async def upload_pdf_for_analysis(
+    file: UploadFile = File(...),
+    callback_url: Optional[str] = Form(None, description="Adres http(s), na który zostanie wysłany wynik (POST, podpis HMAC)"),
+    callback_payload: CallbackPayload = Form(CallbackPayload.summary, description="Pełny raport lub podsumowanie"),
+    scoring_profile: str = Form(CLASSIC_PROFILE, description="Profil oceny dostępności (lista: /scoring-profiles)"),
+    locale: Optional[str] = Form(None, description="Język rekomendacji, np. 'pl', 'en' (domyślnie polski)")
+):
     """
     Przyjmuje plik PDF, uruchamia analizę w tle i zwraca ID zadania.
+    Z `callback_url` wynik zostanie dostarczony webhookiem - bez odpytywania statusu.
     """
     if file.content_type != "application/pdf":
         raise HTTPException(
             status_code=400,
             detail="Nieprawidłowy typ pliku. Proszę przesłać plik PDF."
         )
+    if callback_url and not webhook_outbox.enabled:
+        raise HTTPException(
+            status_code=400,
+            detail="Webhooki są wyłączone (brak WEBHOOK_SECRET na serwerze) - pomiń callback_url."
+        )
+    # Rozwiązanie nazwy hosta (DNS) blokuje - poza pętlą zdarzeń
+    if callback_url and not await run_in_threadpool(is_valid_callback_url, callback_url):
+        raise HTTPException(
+            status_code=400,
+            detail="Nieprawidłowy callback_url. Wymagany jest absolutny adres http(s) hosta publicznego."
+        )
+    if scoring_profile not in scoring_profiles.profiles:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Nieznany profil oceny '{scoring_profile}'. Dostępne: {', '.join(scoring_profiles.names())}"
+        )
+    if locale and locale not in recommendation_engine.locales():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Nieobsługiwany język '{locale}'. Dostępne: {', '.join(recommendation_engine.locales())}"
+        )
     try:
         file_bytes = await file.read()
-        task = run_full_pdf_analysis_task.delay(file_bytes=file_bytes, filename=file.filename)
+        task = run_full_pdf_analysis_task.delay(
+            file_bytes=file_bytes,
+            filename=file.filename,
+            callback_url=callback_url,
+            callback_payload=callback_payload.value,
+            scoring_profile=scoring_profile,
+            locale=locale
+        )
         return {"task_id": task.id}
     except Exception as e:
         return JSONResponse(
@@ -42,74 +96,127 @@ async def upload_pdf_for_analysis(file: UploadFile = File(...)):
         )
 
 @router.get("/analysis/{task_id}", tags=["PDF Processing"])
-async def get_analysis_status(task_id: str):
+async def get_analysis_status(
+    task_id: str,
+    wait: float = Query(0, ge=0, le=MAX_WAIT_SECONDS, description="Long-poll: maksymalny czas oczekiwania na wynik (s)")
+):
     """
     Sprawdza status zadania analizy na podstawie jego ID i zwraca wynik.
+    Z parametrem `wait` żądanie czeka na zakończenie zadania zamiast wymuszać odpytywanie.
     """
-    task_result = AsyncResult(task_id)
-    if task_result.ready():
-        if task_result.successful():
-            result = task_result.get()
-            return {"status": "SUCCESS", "result": result}
+    try:
+        meta = await task_status_watcher.wait_for_meta(task_id, wait)
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"detail": f"Backend wyników jest niedostępny: {str(e)}"})
+
+    if meta["status"] in states.READY_STATES:
+        if meta["status"] == states.SUCCESS:
+            # Duży raport serializujemy bezpośrednio, z pominięciem jsonable_encoder
+            return FastJSONResponse({"status": "SUCCESS", "result": meta.get("result")})
         else:
             return JSONResponse(
                 status_code=500,
-                content={"status": "FAILURE", "error_message": str(task_result.info)}
+                content={"status": "FAILURE", "error_message": describe_failure(meta)}
             )
     else:
-        return {"status": task_result.state}
+        return {"status": meta["status"]}
 
 @router.get("/report/{report_id}", tags=["Reports"])
 async def get_report_by_id(report_id: str):
     """
     Pobiera wygenerowany raport na podstawie jego ID (task_id).
     """
-    task_result = AsyncResult(report_id)
-    if task_result.ready():
-        if task_result.successful():
-            result = task_result.get()
-            return {"status": "SUCCESS", "report": result}
+    try:
+        meta = await task_status_watcher.get_meta(report_id)
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"detail": f"Backend wyników jest niedostępny: {str(e)}"})
+
+    if meta["status"] in states.READY_STATES:
+        if meta["status"] == states.SUCCESS:
+            return FastJSONResponse({"status": "SUCCESS", "report": meta.get("result")})
         else:
             return JSONResponse(
                 status_code=500,
-                content={"status": "FAILURE", "error_message": str(task_result.info)}
+                content={"status": "FAILURE", "error_message": describe_failure(meta)}
             )
     else:
         raise HTTPException(status_code=404, detail="Raport nie został znaleziony lub nie jest jeszcze gotowy.")
 
+@router.get("/report/{report_id}/{format}", tags=["Reports"])
+async def download_stored_report(report_id: str, format: ReportFormat, request: Request):
+    """
+    Renderuje raport zapisanego wyniku zadania w wybranym formacie.
+    Klient nie musi odsyłać raportu - serwer czyta go z backendu wyników.
+    Obsługuje ETag / If-None-Match (304 bez ponownego renderowania i przesyłania).
+    """
+    try:
+        meta = await task_status_watcher.get_meta(report_id)
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"detail": f"Backend wyników jest niedostępny: {str(e)}"})
+
+    if meta["status"] != states.SUCCESS:
+        raise HTTPException(status_code=404, detail="Raport nie został znaleziony lub nie jest jeszcze gotowy.")
+
+    # Wynik zadania się nie zmienia - ETag wyznaczają ID, czas zakończenia, format i wersja szablonu/silnika
+    digest = hashlib.sha256(f"{report_id}:{meta.get('date_done')}".encode()).hexdigest()
+    etag = f'"{digest[:32]}-{format.value}-{report_renderer.artifact_version(format.value)}"'
+    headers = {"ETag": etag, "Cache-Control": REPORT_CACHE_CONTROL}
+
+    # Porównanie słabe (RFC 9110) - skompresowane odpowiedzi mają ETag z prefiksem W/
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+
+    headers["Content-Disposition"] = f"attachment; filename=report_{report_id}.{format.value}"
+    if format == ReportFormat.html:
+        # HTML strumieniujemy sekcjami prosto z szablonu - stały czas do pierwszego bajtu
+        return StreamingResponse(iter_html_report(meta["result"]), media_type=REPORT_MEDIA_TYPES[format], headers=headers)
+
+    try:
+        content = await report_renderer.render(meta["result"], format.value, digest=digest)
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"detail": f"Nie udało się wygenerować raportu: {str(e)}"}
+        )
+
+    return Response(content=content, media_type=REPORT_MEDIA_TYPES[format], headers=headers)
+
 @router.post("/download-report/{format}", tags=["Reports"])
 async def download_report(format: ReportFormat, report_data: dict):
     """
     Pobiera gotowy raport (przesłany w body) w wybranym formacie.
+    HTML jest strumieniowany z szablonu; JSON i PDF renderowane w puli procesów
+    i cache'owane per (treść raportu, format).
     """
     filename = f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-
-    if format == ReportFormat.json:
-        content = json.dumps(report_data, indent=2, ensure_ascii=False)
-        return StreamingResponse(
-            io.BytesIO(content.encode()),
-            media_type="application/json",
-            headers={"Content-Disposition": f"attachment; filename={filename}.json"}
-        )
-
-    # Generowanie HTML jest potrzebne zarówno dla formatu HTML, jak i PDF
-    html_content = generate_html_report(report_data)
+    headers = {"Content-Disposition": f"attachment; filename={filename}.{format.value}"}
 
     if format == ReportFormat.html:
-        return StreamingResponse(
-            io.BytesIO(html_content.encode()),
-            media_type="text/html",
-            headers={"Content-Disposition": f"attachment; filename={filename}.html"}
-        )
+        return StreamingResponse(iter_html_report(report_data), media_type=REPORT_MEDIA_TYPES[format], headers=headers)
 
-    if format == ReportFormat.pdf:
-        pdf_bytes = HTML(string=html_content).write_pdf()
-        return StreamingResponse(
-            io.BytesIO(pdf_bytes),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}.pdf"}
+    try:
+        content = await report_renderer.render(report_data, format.value)
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"detail": f"Nie udało się wygenerować raportu: {str(e)}"}
         )
 
+    return StreamingResponse(
+        io.BytesIO(content),
+        media_type=REPORT_MEDIA_TYPES[format],
+        headers=headers
+    )
+
+@router.get("/scoring-profiles", tags=["PDF Processing"])
+async def get_scoring_profiles():
+    """
+    Zwraca dostępne profile oceny dostępności (kryteria z punktacją i progi poziomów).
+    Profil wybiera się przy wysyłaniu pliku (`scoring_profile`).
+    """
+    return {"default": CLASSIC_PROFILE, "profiles": scoring_profiles.describe()}
+
 # --- ENDPOINTY DO ZARZĄDZANIA CACHEM ---
 
 @router.get("/cache/status", tags=["Cache Management"])
@@ -118,89 +225,71 @@ async def get_cache_status():
     Monitoruje status i metryki cache Redis.
     """
     try:
-        metrics = redis_client.get_metrics()
+        # Metryki współdzielone i odcisk wersji veraPDF (`docker exec`) czytamy poza pętlą zdarzeń
+        metrics = await run_in_threadpool(redis_client.get_metrics)
         return {
             "redis_available": metrics.get('redis_available', False),
-            "cache_metrics": metrics
+            "cache_metrics": metrics,
+            "fingerprints": {
+                "analysis": await run_in_threadpool(analysis_fingerprint),
+                "stages": await run_in_threadpool(all_stage_fingerprints),
+                "rules": fingerprints.component_version("rules"),
+                "rules_snapshot": rules_service.status(),
+            }
         }
     except Exception as e:
         return JSONResponse(status_code=500, content={"status": "error", "message": str(e)})
 
 @router.delete("/cache/clear", tags=["Cache Management"])
-async def clear_cache(pattern: str = None):
+async def clear_cache(
+    pattern: Optional[str] = None,
+    background: bool = Query(False, description="Uruchom czyszczenie jako zadanie w tle (dla dużych wzorców)")
+):
     """
-    Czyści cache według podanego wzorca.
+    Czyści cache według podanego wzorca (tylko klucze cache, np. `pdf_analysis:v1.0:*`).
+    Z parametrem `background` zwraca ID zadania, którego postęp można śledzić.
     """
-    deleted_count = redis_client.invalidate_cache(pattern)
-    return {"status": "success", "deleted_count": deleted_count}
+    if pattern is not None and not redis_client.is_safe_pattern(pattern):
+        raise HTTPException(
+            status_code=400,
+            detail="Niedozwolony wzorzec - dopuszczalne są tylko klucze cache (np. 'pdf_analysis:v1.0:*')."
+        )
 
+    if background:
+        task = invalidate_cache_task.delay(pattern)
+        return JSONResponse(status_code=202, content={
+            "status": "accepted",
+            "job_id": task.id,
+            "status_url": f"/cache/clear/{task.id}"
+        })
 
-# --- FUNKCJE POMOCNICZE (UŻYWANE PRZEZ ENDPOINTY W TYM PLIKU) ---
+    deleted_count = await run_in_threadpool(redis_client.invalidate_cache, pattern)
+    return {"status": "success", "deleted_count": deleted_count}
 
-def generate_html_report(report_data: dict) -> str:
+@router.get("/cache/clear/{job_id}", tags=["Cache Management"])
+async def get_cache_clear_status(job_id: str):
     """
-    Generuje raport w formacie HTML na podstawie danych JSON.
-    Pozostaje tutaj, ponieważ jest bezpośrednio używana przez endpoint /download-report/.
+    Postęp czyszczenia cache uruchomionego w tle.
     """
-    metadata = report_data.get('metadata', {})
-    score_data = report_data.get('accessibility_score', {})
-    recommendations = report_data.get('recommendations', [])
-    filename = metadata.get('filename', 'Brak nazwy')
-    analysis_date = metadata.get('analysis_date', 'Brak daty')
-    percentage = score_data.get('percentage', 0)
-    level = score_data.get('level', 'Niski')
-    details = score_data.get('details', [])
+    try:
+        meta = await task_status_watcher.get_meta(job_id)
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"detail": f"Backend wyników jest niedostępny: {str(e)}"})
 
-    level_map = {
-        "Wysoki": {"class": "high", "color": "#10B981"},
-        "Średni": {"class": "medium", "color": "#F59E0B"},
-        "Niski": {"class": "low", "color": "#EF4444"}
-    }
-    level_info = level_map.get(level, level_map["Niski"])
+    if meta["status"] == states.FAILURE:
+        return JSONResponse(status_code=500, content={"status": "FAILURE", "error_message": describe_failure(meta)})
+    result = meta.get("result") if isinstance(meta.get("result"), dict) else {}
+    return {"job_id": job_id, "status": meta["status"], **result}
 
-    details_rows = ""
-    for detail in details:
-        details_rows += f"""<tr><td>{detail.get('criterion', 'Brak danych')}</td><td>{detail.get('points', 0)} / {detail.get('max', 0)}</td></tr>"""
 
-    recommendations_list = ""
-    if recommendations:
-        for rec in recommendations:
-            priority = rec.get('priority', 'low')
-            recommendations_list += f"""<div class="recommendation {priority}"><span class="priority {priority}">{priority.upper()}</span><div class="content"><strong>{rec.get('issue', 'Brak danych')}</strong><p>{rec.get('recommendation', 'Brak danych')}</p></div></div>"""
-    else:
-        recommendations_list = "<p>Brak rekomendacji. Dobra robota!</p>"
-
-    html = f"""
-    <!DOCTYPE html>
-    <html lang="pl">
-    <head>
-        <meta charset="UTF-8">
-        <title>Raport Dostępności PDF</title>
-        <style>
-            body {{ font-family: 'Lato', sans-serif; background-color: #f8f9fa; color: #212529; margin: 0; padding: 2rem; }}
-            .container {{ max-width: 800px; margin: auto; background: #ffffff; border-radius: 12px; box-shadow: 0 4px 20px rgba(0,0,0,0.05); overflow: hidden; }}
-            .header {{ background-color: #4A5568; color: #ffffff; padding: 2rem; }}
-            .header h1 {{ margin: 0; }} .header p {{ opacity: 0.8; }}
-            .section {{ padding: 2rem; border-bottom: 1px solid #e9ecef; }} .section:last-child {{ border-bottom: none; }}
-            h2 {{ color: #2c3e50; border-bottom: 2px solid #e0e0e0; padding-bottom: 0.5rem; }}
-            .score-card {{ text-align: center; padding: 2rem; border: 1px solid {level_info['color']}; background-color: {level_info['color']}1A; border-radius: 8px; }}
-            .score {{ font-size: 4.5rem; font-weight: 700; color: {level_info['color']}; }}
-            .score-level {{ font-size: 1.25rem; font-weight: 700; color: {level_info['color']}; }}
-            table {{ width: 100%; border-collapse: collapse; margin-top: 1.5rem; }}
-            th, td {{ padding: 0.75rem 1rem; text-align: left; border-bottom: 1px solid #dee2e6; }}
-            th {{ background-color: #f1f3f5; }}
-            .recommendation {{ display: flex; gap: 1rem; margin-bottom: 1rem; padding: 1rem; background-color: #f8f9fa; border-radius: 8px; border-left: 5px solid; }}
-            .recommendation.high {{ border-color: #EF4444; }} .recommendation.medium {{ border-color: #F59E0B; }} .recommendation.low {{ border-color: #10B981; }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <header class="header"><h1>Raport Dostępności PDF</h1><p><strong>Plik:</strong> {filename}</p><p><strong>Data analizy:</strong> {analysis_date}</p></header>
-            <section class="section"><h2>Wynik Dostępności</h2><div class="score-card"><div class="score">{percentage}%</div><div class="score-level">Poziom: {level}</div></div></section>
-            <section class="section"><h2>Szczegóły Analizy</h2><table><thead><tr><th>Kryterium</th><th>Wynik</th></tr></thead><tbody>{details_rows}</tbody></table></section>
-            <section class="section"><h2>Rekomendacje</h2>{recommendations_list}</section>
-        </div>
-    </body>
-    </html>
-    """
-    return html
\ No newline at end of file
+# --- ENDPOINTY WEBHOOKÓW ---
+
+@router.get("/webhooks/status", tags=["Webhooks"])
+async def get_webhooks_status():
+    """
+    Zwraca metryki doręczeń webhooków (udane, ponowione, dead-letter, oczekujące).
+    """
+    try:
+        return await run_in_threadpool(webhook_outbox.get_metrics)
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"status": "error", "message": str(e)})
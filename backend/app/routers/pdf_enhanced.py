@@ -1,11 +1,15 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Query
 from fastapi.responses import JSONResponse
-from celery.result import AsyncResult
+from celery import states
 from typing import Optional
 from enum import Enum
 
 from app.tasks import run_enhanced_pdf_analysis_task
 from app.models.analysis_levels import AnalysisLevel
+from app.common.serialization import FastJSONResponse
+from app.services.scoring import scoring_profiles, DETAILED_PROFILE
+from app.services.recommendations import recommendation_engine
+from app.services.task_status import task_status_watcher, describe_failure, MAX_WAIT_SECONDS
 
 router = APIRouter()
 
@@ -18,6 +22,14 @@ async def upload_pdf_for_analysis(
     analysis_level: AnalysisLevel = Query(
         default=AnalysisLevel.STANDARD,
         description="Poziom szczegółowości analizy"
+    ),
+    scoring_profile: str = Query(
+        default=DETAILED_PROFILE,
+        description="Profil oceny dostępności (lista: /scoring-profiles)"
+    ),
+    locale: Optional[str] = Query(
+        default=None,
+        description="Język rekomendacji, np. 'pl', 'en' (domyślnie polski)"
     )
 ):
     """
@@ -34,6 +46,17 @@ async def upload_pdf_for_analysis(
             detail="Nieprawidłowy typ pliku. Proszę przesłać plik PDF."
         )
     
+    if scoring_profile not in scoring_profiles.profiles:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Nieznany profil oceny '{scoring_profile}'. Dostępne: {', '.join(scoring_profiles.names())}"
+        )
+    if locale and locale not in recommendation_engine.locales():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Nieobsługiwany język '{locale}'. Dostępne: {', '.join(recommendation_engine.locales())}"
+        )
+    
     # Sprawdź rozmiar pliku dla różnych poziomów
     file_bytes = await file.read()
     
@@ -66,12 +89,15 @@ async def upload_pdf_for_analysis(
         task = run_enhanced_pdf_analysis_task.delay(
             file_bytes=file_bytes,
             filename=file.filename,
-            analysis_level=analysis_level.value
+            analysis_level=analysis_level.value,
+            scoring_profile=scoring_profile,
+            locale=locale
         )
         
         return {
             "task_id": task.id,
             "analysis_level": analysis_level.value,
+            "scoring_profile": scoring_profile,
             "estimated_time": analysis_level.get_config()["estimated_time"],
             "message": f"Analiza rozpoczęta - poziom: {analysis_level.get_config()['name']}"
         }
@@ -100,16 +126,22 @@ async def get_analysis_levels():
     return {"levels": levels}
 
 @router.get("/analysis/{task_id}", tags=["PDF Processing"])
-async def get_analysis_status(task_id: str):
+async def get_analysis_status(
+    task_id: str,
+    wait: float = Query(0, ge=0, le=MAX_WAIT_SECONDS, description="Long-poll: maksymalny czas oczekiwania na wynik (s)")
+):
     """
     Sprawdza status zadania analizy.
     Zwraca różne szczegóły w zależności od wybranego poziomu analizy.
     """
-    task_result = AsyncResult(task_id)
+    try:
+        meta = await task_status_watcher.wait_for_meta(task_id, wait)
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"detail": f"Backend wyników jest niedostępny: {str(e)}"})
     
-    if task_result.ready():
-        if task_result.successful():
-            result = task_result.get()
+    if meta["status"] in states.READY_STATES:
+        if meta["status"] == states.SUCCESS:
+            result = meta.get("result")
             
             # Formatuj odpowiedź w zależności od poziomu
             analysis_level = result.get("analysis_level", "standard")
@@ -127,17 +159,17 @@ async def get_analysis_status(task_id: str):
                     "quick_score": _calculate_quick_score(result)
                 }
             
-            return response
+            return FastJSONResponse(response)
         else:
             return JSONResponse(
                 status_code=500,
-                content={"status": "FAILURE", "error_message": str(task_result.info)}
+                content={"status": "FAILURE", "error_message": describe_failure(meta)}
             )
     else:
         # Zwróć postęp w zależności od poziomu
         progress_info = {
-            "status": task_result.state,
-            "progress": _estimate_progress(task_result.state)
+            "status": meta["status"],
+            "progress": _estimate_progress(meta["status"])
         }
         
         return progress_info
@@ -1,7 +1,16 @@
-from fastapi import APIRouter, HTTPException, Query, Path
+from fastapi import APIRouter, HTTPException, Query, Path, Response
 from typing import List, Optional
 from app.models.rules import WCAGRule, RuleNotFoundError
 from app.services.rules_service import rules_service
+from app.services.redis_client import redis_client
+from app.services.task_status import task_status_watcher
+from app.common.serialization import FastJSONResponse
+from celery import states
+from fastapi.concurrency import run_in_threadpool
+
+# Wynik zakończonego zadania się nie zmienia - rekomendacje żyją tyle, co wyniki w Celery (domyślnie 1 dzień)
+RECOMMENDATIONS_CACHE_PREFIX = "rule:recommendations"
+RECOMMENDATIONS_CACHE_TTL = 24 * 3600
 
 router = APIRouter(
     prefix="/rules",
@@ -39,6 +48,7 @@ async def get_rule(
 
 @router.get("/", response_model=List[WCAGRule])
 async def list_rules(
+    response: Response,
     level: Optional[str] = Query(None, description="Filtruj po poziomie (A, AA, AAA)"),
     category: Optional[str] = Query(None, description="Filtruj po kategorii POUR"),
     pdf_specific: Optional[bool] = Query(None, description="Tylko reguły dla PDF"),
@@ -53,22 +63,20 @@ async def list_rules(
     - **level**: A, AA, lub AAA
     - **category**: perceivable, operable, understandable, robust
     - **pdf_specific**: true dla reguł specyficznych dla PDF
-    - **search**: tekst do wyszukania
+    - **search**: tekst do wyszukania (wyniki od najlepiej dopasowanych, łączy się z filtrami)
+    
+    Łączna liczba wyników jest zwracana w nagłówku `X-Total-Count`.
     """
     try:
-        if search:
-            rules = await rules_service.search_rules(search)
-        else:
-            rules = await rules_service.get_all_rules(
-                level=level,
-                category=category, 
-                pdf_specific=pdf_specific
-            )
-        
-        # Paginacja
-        total = len(rules)
-        rules = rules[offset:offset + limit]
-        
+        total, rules = rules_service.query_rules(
+            search=search,
+            level=level,
+            category=category,
+            pdf_specific=pdf_specific,
+            limit=limit,
+            offset=offset
+        )
+        response.headers["X-Total-Count"] = str(total)
         return rules
         
     except Exception as e:
@@ -81,16 +89,25 @@ async def get_recommendations_for_analysis(
     """
     Zwraca rekomendacje reguł WCAG na podstawie wyników analizy PDF.
     
-    Endpoint integruje się z istniejącą analizą i sugeruje,
-    które reguły WCAG są najbardziej istotne dla danego dokumentu.
+    Wynik zakończonego zadania jest pobierany z backendu wyników Celery, a każde
+    ustalenie analizy i błąd PDF/UA jest mapowane na reguły z bazy wiedzy.
+    Rekomendacje są cache'owane per zadanie, wersję bazy reguł i mapy FINDING_RULES.
     """
-    # Tu możesz pobrać wyniki analizy z Redis/Celery
-    # Na potrzeby przykładu zakładam, że masz już wyniki
+    cache_key = f"{RECOMMENDATIONS_CACHE_PREFIX}:{rules_service.recommendations_version()}:{task_id}"
+    cached = await run_in_threadpool(redis_client.get_cache, cache_key)
+    if cached is not None:
+        return FastJSONResponse(cached)
+    
+    try:
+        meta = await task_status_watcher.get_meta(task_id)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Backend wyników jest niedostępny: {str(e)}")
     
-    analysis_results = {
-        "is_tagged": False,
-        "image_info": {"images_without_alt": 5}
-    }
+    if meta["status"] != states.SUCCESS:
+        if meta["status"] in states.READY_STATES:
+            raise HTTPException(status_code=409, detail="Analiza zakończyła się błędem - brak wyników do rekomendacji.")
+        raise HTTPException(status_code=404, detail="Analiza nie została znaleziona lub nie jest jeszcze gotowa.")
     
-    recommendations = rules_service.get_rules_for_pdf_analysis(analysis_results)
-    return recommendations
\ No newline at end of file
+    recommendations = rules_service.get_rules_for_pdf_analysis(meta.get("result") or {})
+    await run_in_threadpool(redis_client.set_cache, cache_key, recommendations, RECOMMENDATIONS_CACHE_TTL)
+    return FastJSONResponse(recommendations)
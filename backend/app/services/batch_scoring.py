@@ -0,0 +1,217 @@
+"""
+Wsadowe przeliczanie wyników dostępności dla zapisanych raportów (NumPy).
+
+Raporty są oceniane skompilowanymi profilami oceny (app/services/scoring.py):
+cechy wyciągane są do kolumn, a punkty, wynik i poziom liczone wektorowo dla
+całej partii. Wyniki są identyczne z oceną w zadaniach Celery - domyślnie każdy
+raport oceniany jest profilem zapisanym w jego metadanych (albo domyślnym dla
+formatu raportu), a --profile pozwala przeliczyć archiwum innym profilem.
+
+Uruchomienie (z katalogu backend):
+    python -m app.services.batch_scoring archive.jsonl -o rescored.jsonl
+    python -m app.services.batch_scoring archive.db --table reports --column report -o rescored.jsonl
+    python -m app.services.batch_scoring archive.jsonl --profile balanced -o rescored.jsonl
+"""
+import argparse
+import sqlite3
+import sys
+import time
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.common import serialization
+from app.services.scoring import scoring_profiles, CLASSIC_PROFILE, DETAILED_PROFILE
+
+logger = logging.getLogger(__name__)
+
+LEGACY = "legacy"
+DETAILED = "detailed"
+DEFAULT_BATCH_SIZE = 10_000
+
+
+def report_format(report: Dict[str, Any]) -> Optional[str]:
+    """Format raportu (klasyczny albo wielopoziomowy); raporty QUICK nie mają wyniku"""
+    if "basic_analysis" in report:
+        return LEGACY
+    if report.get("analysis_level") in ("standard", "professional"):
+        return DETAILED
+    return None
+
+
+def legacy_source(report: Dict[str, Any]) -> Tuple[Dict, Optional[Dict]]:
+    """(wynik analizy, walidacja PDF/UA) tak, jak ocenia je tasks.run_full_pdf_analysis_task"""
+    return report.get("basic_analysis", {}), report.get("pdf_ua_validation") or {}
+
+
+def detailed_source(report: Dict[str, Any]) -> Tuple[Dict, Optional[Dict]]:
+    """Wynik analizy wielopoziomowej odtworzony z sekcji raportu tasks_enhanced._generate_report"""
+    basic = report.get("basic_results", {})
+    detailed = report.get("detailed_results", {})
+    analysis = {
+        "is_tagged": basic.get("is_tagged"),
+        "contains_text": basic.get("contains_text"),
+        "metadata": detailed.get("metadata", {}),
+        "image_info": detailed.get("image_info", {}),
+        "heading_info": detailed.get("heading_info", {}),
+    }
+    if "deep_scan" in report:
+        analysis["deep_scan"] = report["deep_scan"]
+    return analysis, report.get("pdf_ua_validation")
+
+
+# Format raportu -> (odczyt danych wejściowych oceny, domyślny profil)
+FORMATS: Dict[str, Tuple[Callable[[Dict], Tuple[Dict, Optional[Dict]]], str]] = {
+    LEGACY: (legacy_source, CLASSIC_PROFILE),
+    DETAILED: (detailed_source, DETAILED_PROFILE),
+}
+
+
+def _materialize(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Wyniki kolumnowe -> słowniki w formacie accessibility_score.
+
+    Wynik zależy wyłącznie od punktów za kryteria, a różnych kombinacji punktów jest
+    niewiele - słownik budowany jest raz na kombinację (np.unique) i współdzielony
+    przez wszystkie raporty z tą kombinacją. Wywołujący nie powinien ich modyfikować.
+    """
+    criteria = result["criteria"]
+    # Punkty kryterium nieobecnego w raporcie oznaczamy jako -1
+    points = np.stack([
+        values if present is None else np.where(present, values, -1)
+        for _, _, values, present in criteria
+    ], axis=1).astype(np.int64)
+    # Kombinacja punktów jako jedna liczba (pola bitowe wg maksimum kryterium) - np.unique na 1-D jest szybkie
+    widths = [int(max_points + 1).bit_length() for _, max_points, _, _ in criteria]
+    if sum(widths) < 63:
+        shifts = np.cumsum([0] + widths[:-1])
+        keys = ((points + 1) << shifts).sum(axis=1)
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    else:
+        _, first, inverse = np.unique(points, axis=0, return_index=True, return_inverse=True)
+
+    totals = result["total"].tolist()
+    percentages = result["percentage"].tolist()
+    templates = []
+    for index in first.tolist():
+        templates.append({
+            "total_score": totals[index],
+            "max_score": result["max_score"],
+            "percentage": percentages[index],
+            "level": str(result["level"][index]),
+            "details": [
+                {"criterion": name, "points": value, "max": max_points}
+                for (name, max_points, _, _), value in zip(criteria, points[index].tolist())
+                if value >= 0
+            ],
+        })
+    return [templates[i] for i in inverse.reshape(-1).tolist()]
+
+
+def rescore(reports: Sequence[Dict[str, Any]], profile: Optional[str] = None) -> List[Optional[Dict[str, Any]]]:
+    """
+    Nowe accessibility_score dla partii raportów (None dla raportów bez wyniku, np. QUICK).
+
+    Bez `profile` raport oceniany jest profilem z metadata.scoring_profile (albo domyślnym
+    dla formatu). Raport z profilem, którego już nie ma, jest pomijany (None) - jeden
+    taki raport nie przerywa przeliczania całego archiwum. Raporty z identycznymi
+    punktami dostają ten sam (współdzielony) słownik.
+    """
+    groups: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+    unknown: Dict[str, int] = defaultdict(int)
+    for position, report in enumerate(reports):
+        fmt = report_format(report)
+        if fmt is None:
+            continue
+        name = profile or report.get("metadata", {}).get("scoring_profile") or FORMATS[fmt][1]
+        if profile is None and name not in scoring_profiles.profiles:
+            unknown[name] += 1
+            continue
+        groups[(fmt, name)].append(position)
+    for name, count in unknown.items():
+        logger.warning(f"Skipped {count} report(s) with unknown scoring profile '{name}'")
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(reports)
+    for (fmt, name), positions in groups.items():
+        source = FORMATS[fmt][0]
+        scoring = scoring_profiles.get(name)
+        rows = [scoring.extract(*source(reports[i])) for i in positions]
+        for position, value in zip(positions, _materialize(scoring.score_columns(scoring.to_columns(rows)))):
+            results[position] = value
+    return results
+
+
+def _batched(records: Iterable[Tuple[Any, Dict]], size: int) -> Iterator[List[Tuple[Any, Dict]]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def read_jsonl(path: str) -> Iterator[Tuple[Any, Dict]]:
+    """Linie JSONL: raport albo {"id": ..., "report": {...}}"""
+    with open(path, "rb") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = serialization.loads(line)
+            if "report" in record and isinstance(record["report"], dict):
+                yield record.get("id", line_number), record["report"]
+            else:
+                yield record.get("id", line_number), record
+
+
+def read_sqlite(path: str, table: str, column: str, id_column: str = "rowid") -> Iterator[Tuple[Any, Dict]]:
+    connection = sqlite3.connect(path)
+    try:
+        # Nazwy tabel/kolumn pochodzą z argumentów CLI - cytujemy je jako identyfikatory
+        query = f'SELECT "{id_column}", "{column}" FROM "{table}"'
+        for row_id, raw in connection.execute(query):
+            yield row_id, serialization.loads(raw)
+    finally:
+        connection.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("archive", help="Plik JSONL albo baza SQLite (.db/.sqlite)")
+    parser.add_argument("-o", "--output", help="Wynikowy JSONL (domyślnie stdout)")
+    parser.add_argument("--table", default="reports", help="Tabela SQLite z raportami")
+    parser.add_argument("--column", default="report", help="Kolumna SQLite z raportem JSON")
+    parser.add_argument("--id-column", default="rowid", help="Kolumna SQLite z identyfikatorem")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--profile", choices=scoring_profiles.names(),
+                        help="Profil oceny dla wszystkich raportów (domyślnie profil zapisany w raporcie)")
+    args = parser.parse_args(argv)
+
+    if args.archive.endswith((".db", ".sqlite", ".sqlite3")):
+        records = read_sqlite(args.archive, args.table, args.column, args.id_column)
+    else:
+        records = read_jsonl(args.archive)
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    started = time.perf_counter()
+    rescored = skipped = 0
+    try:
+        for batch in _batched(records, args.batch_size):
+            for (record_id, report), score in zip(batch, rescore([report for _, report in batch], args.profile)):
+                if score is None:
+                    skipped += 1
+                    continue
+                out.write(serialization.dumps({"id": record_id, "accessibility_score": score}) + b"\n")
+                rescored += 1
+    finally:
+        if args.output:
+            out.close()
+    elapsed = time.perf_counter() - started
+    print(f"📊 Przeliczono {rescored} raportów (pominięto {skipped}) w {elapsed:.1f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
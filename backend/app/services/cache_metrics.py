@@ -0,0 +1,198 @@
+import os
+import socket
+import threading
+import time
+import logging
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Wspólny HASH z licznikami wszystkich procesów (API i workery Celery)
+METRICS_KEY = "metrics:cache"
+# HASH: etykieta procesu -> czas ostatniego zrzutu liczników
+PROCESSES_KEY = "metrics:cache:processes"
+# Liczniki są buforowane w procesie i zrzucane jednym pipeline co tyle sekund
+FLUSH_INTERVAL_SECONDS = 5.0
+# Proces bez zrzutu przez tyle sekund uznajemy za zakończony (restart, recykling workera prefork)
+PROCESS_TTL_SECONDS = 12 * FLUSH_INTERVAL_SECONDS
+
+# Prefiks klucza cache -> etykieta przestrzeni nazw w metrykach
+NAMESPACE_LABELS = {
+    "pdf_analysis": "analysis",
+    "rule": "rule",
+    "validation": "validation",
+    "pdf_stage": "stage",
+}
+# Granice kubełków histogramu czasu operacji (sekundy)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def namespace_of(key: str) -> str:
+    return NAMESPACE_LABELS.get(key.split(":", 1)[0], "other")
+
+
+def process_label() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class CacheMetrics:
+    """
+    Metryki cache współdzielone między procesami.
+
+    Każdy proces zlicza zdarzenia lokalnie i co FLUSH_INTERVAL_SECONDS dodaje je
+    (HINCRBY) do wspólnego HASH w Redis - dzięki temu /cache/status i /metrics
+    pokazują sumę ze wszystkich workerów uvicorn i Celery, a nie jednego procesu.
+
+    Pola HASH:
+    - `events|<namespace>|<tier>|<event>` - liczniki (hit, miss, error, set, recompute, stale_served)
+    - `latency|<namespace>|<operation>|<bucket>` - histogram czasu operacji
+    - `latency_sum_us|<namespace>|<operation>` - suma czasów w mikrosekundach
+    """
+
+    def __init__(self, client_getter: Callable[[], Any], flush_interval: float = FLUSH_INTERVAL_SECONDS):
+        self._client_getter = client_getter
+        self.flush_interval = flush_interval
+        self.process = process_label()
+        self._lock = threading.Lock()
+        self._pending: Dict[str, int] = defaultdict(int)
+        self._last_flush = time.monotonic()
+
+    def incr(self, key: str, event: str, tier: str = "redis", amount: int = 1) -> None:
+        self._add(f"events|{namespace_of(key)}|{tier}|{event}", amount)
+
+    def observe(self, key: str, operation: str, seconds: float) -> None:
+        """Rejestruje czas operacji na Redis w histogramie"""
+        namespace = namespace_of(key)
+        bucket = bisect_left(LATENCY_BUCKETS, seconds)
+        le = str(LATENCY_BUCKETS[bucket]) if bucket < len(LATENCY_BUCKETS) else "+Inf"
+        with self._lock:
+            self._pending[f"latency|{namespace}|{operation}|{le}"] += 1
+            self._pending[f"latency_sum_us|{namespace}|{operation}"] += int(seconds * 1_000_000)
+        self._maybe_flush()
+
+    def _add(self, field: str, amount: int) -> None:
+        with self._lock:
+            self._pending[field] += amount
+        self._maybe_flush()
+
+    def _maybe_flush(self) -> None:
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> bool:
+        """Zrzuca zbuforowane liczniki do Redis; przy błędzie zachowuje je do następnej próby"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+            self._last_flush = time.monotonic()
+        if not pending:
+            return True
+
+        client = self._client_getter()
+        try:
+            if client is None:
+                raise ConnectionError("Redis unavailable")
+            pipe = client.pipeline(transaction=False)
+            for field, amount in pending.items():
+                pipe.hincrby(METRICS_KEY, field, amount)
+            pipe.hset(PROCESSES_KEY, self.process, int(time.time()))
+            pipe.expire(PROCESSES_KEY, int(PROCESS_TTL_SECONDS))
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.debug(f"Cache metrics flush failed, keeping {len(pending)} counters: {e}")
+            with self._lock:
+                for field, amount in pending.items():
+                    self._pending[field] += amount
+            return False
+
+    def _collect(self) -> Dict[str, int]:
+        """Liczniki zbiorcze z Redis (lub lokalne, gdy Redis jest niedostępny)"""
+        if self.flush():
+            client = self._client_getter()
+            try:
+                return {field: int(value) for field, value in client.hgetall(METRICS_KEY).items()}
+            except Exception as e:
+                logger.debug(f"Reading shared cache metrics failed: {e}")
+        with self._lock:
+            return dict(self._pending)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Zbiorcze liczniki pogrupowane per przestrzeń nazw"""
+        counters = self._collect()
+        namespaces: Dict[str, Dict[str, Any]] = {}
+        for field, value in counters.items():
+            kind, namespace, *rest = field.split("|")
+            entry = namespaces.setdefault(namespace, {"events": {}, "latency_ms_avg": {}})
+            if kind == "events":
+                tier, event = rest
+                entry["events"][f"{tier}_{event}"] = value
+        for namespace, entry in namespaces.items():
+            for operation, (count, total_us) in self._latency_totals(counters, namespace).items():
+                entry["latency_ms_avg"][operation] = round(total_us / count / 1000, 3) if count else 0
+        return {"namespaces": namespaces, "processes": self._processes()}
+
+    @staticmethod
+    def _latency_totals(counters: Dict[str, int], namespace: str) -> Dict[str, tuple]:
+        totals: Dict[str, list] = {}
+        for field, value in counters.items():
+            kind, ns, *rest = field.split("|")
+            if ns != namespace:
+                continue
+            if kind == "latency":
+                totals.setdefault(rest[0], [0, 0])[0] += value
+            elif kind == "latency_sum_us":
+                totals.setdefault(rest[0], [0, 0])[1] += value
+        return {operation: tuple(values) for operation, values in totals.items()}
+
+    def _processes(self) -> Dict[str, int]:
+        """Procesy, które zrzucały liczniki w ostatnich PROCESS_TTL_SECONDS; starsze wpisy są usuwane"""
+        client = self._client_getter()
+        if client is None:
+            return {}
+        try:
+            processes = {label: int(ts) for label, ts in client.hgetall(PROCESSES_KEY).items()}
+            cutoff = time.time() - PROCESS_TTL_SECONDS
+            stale = [label for label, ts in processes.items() if ts < cutoff]
+            if stale:
+                client.hdel(PROCESSES_KEY, *stale)
+            return {label: ts for label, ts in processes.items() if ts >= cutoff}
+        except Exception:
+            return {}
+
+    def render_prometheus(self) -> str:
+        """Metryki w formacie tekstowym Prometheus"""
+        counters = self._collect()
+        lines = [
+            "# HELP pdf_audit_cache_events_total Cache events by namespace, tier and event type",
+            "# TYPE pdf_audit_cache_events_total counter",
+        ]
+        histograms: Dict[tuple, Dict[str, int]] = {}
+        sums: Dict[tuple, int] = {}
+        for field, value in sorted(counters.items()):
+            kind, namespace, *rest = field.split("|")
+            if kind == "events":
+                tier, event = rest
+                lines.append(
+                    f'pdf_audit_cache_events_total{{namespace="{namespace}",tier="{tier}",event="{event}"}} {value}'
+                )
+            elif kind == "latency":
+                operation, le = rest
+                histograms.setdefault((namespace, operation), {})[le] = value
+            elif kind == "latency_sum_us":
+                sums[(namespace, rest[0])] = value
+
+        lines += [
+            "# HELP pdf_audit_cache_operation_seconds Latency of Redis cache operations",
+            "# TYPE pdf_audit_cache_operation_seconds histogram",
+        ]
+        for (namespace, operation), buckets in sorted(histograms.items()):
+            labels = f'namespace="{namespace}",operation="{operation}"'
+            cumulative = 0
+            for bound in [str(b) for b in LATENCY_BUCKETS] + ["+Inf"]:
+                cumulative += buckets.get(bound, 0)
+                lines.append(f'pdf_audit_cache_operation_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"pdf_audit_cache_operation_seconds_sum{{{labels}}} {sums.get((namespace, operation), 0) / 1_000_000}")
+            lines.append(f"pdf_audit_cache_operation_seconds_count{{{labels}}} {cumulative}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,156 @@
+from typing import Any, Dict, List, Tuple
+
+# Stabilne kody ustaleń analizy -> (ID reguł WCAG, priorytet, opis z polami z `details`)
+FINDING_RULES: Dict[str, Tuple[Tuple[str, ...], str, str]] = {
+    "untagged": (("wcag_1.3.1", "wcag_1.3.2", "wcag_4.1.2"), "high",
+                 "Dokument nie posiada tagów struktury"),
+    "no_text": (("wcag_1.1.1",), "high",
+                "Dokument nie zawiera warstwy tekstowej"),
+    "scanned_pdf": (("wcag_1.1.1",), "high",
+                    "Dokument wygląda na skan bez rozpoznanego tekstu (OCR)"),
+    "images_without_alt": (("wcag_1.1.1",), "high",
+                           "Znaleziono {count} obrazów bez tekstu alternatywnego"),
+    "unlabeled_form_fields": (("wcag_3.3.2", "wcag_4.1.2"), "high",
+                              "{count} pól formularza bez etykiet"),
+    "missing_title": (("wcag_2.4.2",), "medium",
+                      "Brak tytułu dokumentu w metadanych"),
+    "missing_language": (("wcag_3.1.1",), "medium",
+                         "Brak zdefiniowanego języka dokumentu"),
+    "heading_no_h1": (("wcag_1.3.1", "wcag_2.4.6"), "medium",
+                      "Brak nagłówka H1"),
+    "heading_multiple_h1": (("wcag_1.3.1", "wcag_2.4.6"), "low",
+                            "Dokument zawiera {count} nagłówków H1"),
+    "heading_skipped_levels": (("wcag_1.3.1",), "medium",
+                               "Pominięte poziomy w hierarchii nagłówków"),
+    "contrast_issues": (("wcag_1.4.3",), "medium",
+                        "Wykryto {count} potencjalnych problemów z kontrastem"),
+}
+
+PRIORITY_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+
+def _first(report: Dict[str, Any], *paths: Tuple[str, ...]) -> Any:
+    """Pierwsza istniejąca wartość spośród ścieżek (raport klasyczny i wielopoziomowy mają inny układ)"""
+    for path in paths:
+        value: Any = report
+        for part in path:
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            return value
+    return None
+
+
+def extract_findings(report: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Ustalenia (kod -> szczegóły) z wyniku analizy.
+
+    Obsługuje raport klasyczny (`basic_analysis`), raport wielopoziomowy
+    (`basic_results`/`detailed_results`/`deep_scan`) i sam wynik analizy podstawowej.
+    """
+    findings: Dict[str, Dict[str, Any]] = {}
+
+    is_tagged = _first(report, ("basic_analysis", "is_tagged"), ("basic_results", "is_tagged"), ("is_tagged",))
+    if is_tagged is False:
+        findings["untagged"] = {}
+
+    contains_text = _first(report, ("basic_analysis", "contains_text"), ("basic_results", "contains_text"),
+                           ("contains_text",))
+    if _first(report, ("basic_results", "is_scanned_pdf"), ("is_scanned_pdf",)):
+        findings["scanned_pdf"] = {}
+    elif contains_text is False:
+        findings["no_text"] = {}
+
+    title_defined = _first(report, ("basic_analysis", "is_title_defined"),
+                           ("detailed_results", "metadata", "is_title_defined"), ("is_title_defined",))
+    if title_defined is False:
+        findings["missing_title"] = {}
+    lang_defined = _first(report, ("basic_analysis", "is_lang_defined"),
+                          ("detailed_results", "metadata", "is_lang_defined"), ("is_lang_defined",))
+    if lang_defined is False:
+        findings["missing_language"] = {}
+
+    image_info = _image_info(report)
+    if image_info.get("images_without_alt", 0) > 0:
+        findings["images_without_alt"] = {"count": image_info["images_without_alt"]}
+
+    # Nagłówki oceniamy tylko w otagowanych dokumentach (inaczej zgłaszamy brak tagów)
+    if is_tagged:
+        findings.update(_heading_findings(report))
+
+    unlabeled = _first(report, ("deep_scan", "forms", "unlabeled_fields")) or 0
+    if unlabeled > 0:
+        findings["unlabeled_form_fields"] = {"count": unlabeled}
+    contrast = _first(report, ("deep_scan", "contrast_issues")) or []
+    if contrast:
+        findings["contrast_issues"] = {"count": len(contrast)}
+
+    return findings
+
+
+def extract_report_findings(report: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Ustalenia, dla których raport podaje rekomendacje (app/services/recommendations.py).
+
+    Warunki jak w rekomendacjach raportu sprzed wprowadzenia szablonów: brak informacji
+    (np. brak `is_tagged`) traktujemy jak niespełnione wymaganie, nagłówki oceniamy
+    niezależnie od tagów, a brak tekstu zgłaszamy tylko jako skan (są obrazy).
+    Ustalenia z głębokiego skanu (formularze, kontrast) nie dają rekomendacji.
+    """
+    findings: Dict[str, Dict[str, Any]] = {}
+
+    if not _first(report, ("basic_analysis", "is_tagged"), ("basic_results", "is_tagged"), ("is_tagged",)):
+        findings["untagged"] = {}
+
+    if not _first(report, ("basic_analysis", "is_title_defined"), ("detailed_results", "metadata", "is_title_defined"),
+                  ("metadata", "is_title_defined"), ("is_title_defined",)):
+        findings["missing_title"] = {}
+    if not _first(report, ("basic_analysis", "is_lang_defined"), ("detailed_results", "metadata", "is_lang_defined"),
+                  ("metadata", "is_lang_defined"), ("is_lang_defined",)):
+        findings["missing_language"] = {}
+
+    findings.update(_heading_findings(report))
+
+    image_info = _image_info(report)
+    if image_info.get("images_without_alt", 0) > 0:
+        findings["images_without_alt"] = {"count": image_info["images_without_alt"]}
+
+    contains_text = _first(report, ("basic_analysis", "contains_text"), ("basic_results", "contains_text"),
+                           ("contains_text",))
+    if not contains_text and image_info.get("image_count", 0) > 0:
+        findings["scanned_pdf"] = {}
+
+    return findings
+
+
+def _image_info(report: Dict[str, Any]) -> Dict[str, Any]:
+    return _first(report, ("basic_analysis", "image_info"), ("detailed_results", "image_info"),
+                  ("image_info",)) or {}
+
+
+def _heading_findings(report: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    heading_info = _first(report, ("basic_analysis", "heading_info"), ("detailed_results", "heading_info"),
+                          ("heading_info",)) or {}
+    findings: Dict[str, Dict[str, Any]] = {}
+    if not heading_info:
+        return findings
+    h1_count = heading_info.get("h1_count", 0)
+    if h1_count == 0:
+        findings["heading_no_h1"] = {}
+    elif h1_count > 1:
+        findings["heading_multiple_h1"] = {"count": h1_count}
+    if heading_info.get("has_skipped_levels"):
+        findings["heading_skipped_levels"] = {}
+    return findings
+
+
+def failed_pdf_ua_rules(report: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Błędy veraPDF z raportu (pomija wpisy z błędem parsowania)"""
+    failed = _first(report, ("pdf_ua_validation", "failed_rules"), ("failed_rules",)) or []
+    return [rule for rule in failed if isinstance(rule, dict) and rule.get("clause")]
+
+
+def failed_checks_count(failed_rules: List[Dict[str, Any]]) -> int:
+    """Liczba wszystkich nieudanych sprawdzeń (wpisy bez `count` - sprzed agregacji - liczą się jako 1)"""
+    return sum(rule.get("count", 1) for rule in failed_rules if isinstance(rule, dict) and "error" not in rule)
@@ -0,0 +1,121 @@
+import hashlib
+import inspect
+import os
+import subprocess
+import time
+import logging
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Długość odcisku w kluczach cache (hex)
+FINGERPRINT_LENGTH = 12
+RULES_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "wcag_rules.json")
+# Po nieudanym odczycie wersji veraPDF (np. kontener jeszcze nie wstał) ponawiamy po tym czasie
+VERAPDF_VERSION_RETRY_SECONDS = 60.0
+# Wersja składnika, której nie udało się ustalić - wyników zależnych od niego nie cache'ujemy
+UNKNOWN_VERSION = "unknown"
+
+# Składniki niebędące kodem (wersja veraPDF, baza reguł) - rejestrowane jako funkcje,
+# żeby np. przeładowanie reguł mogło podmienić źródło wersji
+_components: Dict[str, Callable[[], str]] = {}
+
+
+def _digest(*parts: Any) -> str:
+    sha = hashlib.sha256()
+    for part in parts:
+        sha.update(part if isinstance(part, bytes) else str(part).encode())
+        sha.update(b"\0")
+    return sha.hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def source_fingerprint(*objects: Any) -> str:
+    """
+    Odcisk kodu źródłowego funkcji/metod/klas/modułów (zmiana kodu = nowy odcisk).
+    Dla logiki rozłożonej na funkcje pomocnicze podaje się cały moduł - zmiana
+    w dowolnej funkcji modułu zmienia wtedy odcisk.
+    """
+    parts = []
+    for obj in objects:
+        try:
+            parts.append(inspect.getsource(obj))
+        except (OSError, TypeError):
+            # Brak źródła (np. tylko .pyc) - bajtkod i stałe też zmieniają się razem z logiką
+            code = getattr(obj, "__code__", None)
+            parts.append(code.co_code + repr((code.co_consts, code.co_names)).encode()
+                         if code is not None else repr(obj))
+    return _digest(*parts)
+
+
+def register_component(name: str, version: Callable[[], str]) -> None:
+    """Rejestruje (lub podmienia) źródło wersji składnika, np. bazy reguł"""
+    _components[name] = version
+
+
+def component_version(name: str) -> str:
+    return _components[name]()
+
+
+_verapdf_version: Optional[str] = None
+_verapdf_retry_at = 0.0
+
+
+def _read_verapdf_version() -> Optional[str]:
+    version = os.getenv("VERAPDF_VERSION")
+    if version:
+        return version
+    from app.analysis import VERAPDF_CONTAINER_NAME
+
+    try:
+        result = subprocess.run(
+            ["docker", "exec", VERAPDF_CONTAINER_NAME, "/opt/verapdf/verapdf", "--version"],
+            capture_output=True, text=True, timeout=10, check=False
+        )
+        if result.returncode == 0 and result.stdout.strip():
+            return result.stdout.strip().splitlines()[0]
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"Could not determine veraPDF version: {e}")
+    return None
+
+
+def verapdf_version() -> str:
+    """
+    Wersja veraPDF (VERAPDF_VERSION albo `verapdf --version` w kontenerze).
+    Zapamiętywana raz na proces tylko po udanym odczycie; UNKNOWN_VERSION (kontener
+    niedostępny) jest ponownie sprawdzane po VERAPDF_VERSION_RETRY_SECONDS.
+    """
+    global _verapdf_version, _verapdf_retry_at
+    if _verapdf_version is not None:
+        return _verapdf_version
+    if time.monotonic() < _verapdf_retry_at:
+        return UNKNOWN_VERSION
+    version = _read_verapdf_version()
+    if version is None:
+        _verapdf_retry_at = time.monotonic() + VERAPDF_VERSION_RETRY_SECONDS
+        return UNKNOWN_VERSION
+    _verapdf_version = version
+    return version
+
+
+def reset_verapdf_version() -> None:
+    """Zapomina zapamiętaną wersję veraPDF (np. po aktualizacji kontenera)"""
+    global _verapdf_version, _verapdf_retry_at
+    _verapdf_version, _verapdf_retry_at = None, 0.0
+
+
+def rules_file_version() -> str:
+    """Odcisk pliku z bazą reguł WCAG/PDF-UA"""
+    try:
+        with open(RULES_FILE, "rb") as f:
+            return _digest(f.read())
+    except OSError:
+        return "missing"
+
+
+register_component("verapdf", verapdf_version)
+register_component("rules", rules_file_version)
+
+
+def combine(*fingerprints: str) -> str:
+    """Jeden odcisk z kilku (np. kod etapu + wersja veraPDF)"""
+    return _digest(*fingerprints)
@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TABLE = "knowledge_base_rules"
+# Po tylu sekundach od ostatniej synchronizacji wpisy są odświeżane przyrostowo (po updated_at)
+KNOWLEDGE_BASE_TTL_SECONDS = float(os.getenv("KNOWLEDGE_BASE_TTL_SECONDS", "600"))
+# Po nieudanej synchronizacji kolejna próba najwcześniej po tym czasie (do tego czasu - dane lokalne)
+RETRY_SECONDS = 30.0
+# Rozmiar strony przy pełnym wczytaniu tabeli (limit PostgREST)
+PAGE_SIZE = 1000
+
+
+class KnowledgeBaseCache:
+    """
+    Lokalna kopia tabeli `knowledge_base_rules` z Supabase w procesie workera.
+
+    - preload(): pełne wczytanie tabeli (stronicowane) przy starcie workera
+    - po KNOWLEDGE_BASE_TTL_SECONDS: dociągnięcie tylko wierszy z nowszym `updated_at`
+    - get_many(): odczyt lokalny; do Supabase trafiają tylko brakujące ID (jedno zapytanie `in_`),
+      a ID, których nie ma w bazie, są zapamiętywane na TTL
+    - gdy Supabase jest niedostępny, serwowane są dotychczasowe dane
+    """
+
+    def __init__(self, client=None, ttl: float = KNOWLEDGE_BASE_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.client = None
+        self.bind(client)
+
+    def bind(self, client) -> None:
+        """Ustawia klienta Supabase; zmiana klienta czyści lokalną kopię"""
+        with self._lock:
+            if client is self.client:
+                return
+            self.client = client
+            self._entries: Dict[str, Dict[str, Any]] = {}
+            self._missing: Dict[str, float] = {}
+            self._watermark: Optional[str] = None
+            self._synced_at: Optional[float] = None
+            self._next_attempt = 0.0
+            self.metrics = {"hits": 0, "misses": 0, "live_queries": 0, "refreshes": 0, "errors": 0}
+
+    def _select(self):
+        return self.client.table(TABLE).select("*")
+
+    def _store(self, rows: Iterable[Dict[str, Any]]) -> int:
+        count = 0
+        with self._lock:
+            for row in rows:
+                rule_id = row.get("rule_id")
+                if not rule_id:
+                    continue
+                self._entries[rule_id] = row
+                self._missing.pop(rule_id, None)
+                updated_at = row.get("updated_at")
+                if updated_at and (self._watermark is None or str(updated_at) > self._watermark):
+                    self._watermark = str(updated_at)
+                count += 1
+        return count
+
+    def preload(self) -> bool:
+        """Pełne wczytanie tabeli; zwraca False, gdy Supabase jest niedostępny"""
+        if self.client is None:
+            return False
+        try:
+            rows: List[Dict[str, Any]] = []
+            start = 0
+            while True:
+                page = self._select().range(start, start + PAGE_SIZE - 1).execute().data or []
+                rows.extend(page)
+                if len(page) < PAGE_SIZE:
+                    break
+                start += PAGE_SIZE
+        except Exception as e:
+            self._sync_failed(e)
+            return False
+
+        with self._lock:
+            self._entries = {}
+            self._missing = {}
+            self._watermark = None
+        loaded = self._store(rows)
+        self._synced()
+        logger.info(f"Knowledge base preloaded: {loaded} entries")
+        return True
+
+    def refresh(self) -> bool:
+        """Dociąga wiersze zmienione od ostatniej synchronizacji (bez updated_at - pełne wczytanie)"""
+        if self.client is None:
+            return False
+        if self._synced_at is None or self._watermark is None:
+            return self.preload()
+        try:
+            rows = self._select().gt("updated_at", self._watermark).execute().data or []
+        except Exception as e:
+            self._sync_failed(e)
+            return False
+        self._store(rows)
+        self.metrics["refreshes"] += 1
+        self._synced()
+        return True
+
+    def _synced(self) -> None:
+        with self._lock:
+            self._synced_at = self._clock()
+            self._next_attempt = self._synced_at + self.ttl
+
+    def _sync_failed(self, error: Exception) -> None:
+        logger.warning(f"Knowledge base sync failed, serving local copy: {error}")
+        with self._lock:
+            self.metrics["errors"] += 1
+            self._next_attempt = self._clock() + RETRY_SECONDS
+
+    def _maybe_refresh(self) -> None:
+        if self._clock() >= self._next_attempt:
+            self.refresh()
+
+    def get_many(self, rule_ids: Iterable[str], client=None) -> Dict[str, Dict[str, Any]]:
+        """
+        Wpisy bazy wiedzy dla podanych ID ('klauzula-numerTestu').
+        Zapytanie do Supabase tylko dla ID, których nie ma lokalnie.
+        """
+        if client is not None:
+            self.bind(client)
+        if self.client is None:
+            return {}
+        self._maybe_refresh()
+
+        now = self._clock()
+        found: Dict[str, Dict[str, Any]] = {}
+        to_fetch: List[str] = []
+        with self._lock:
+            for rule_id in dict.fromkeys(rule_ids):
+                entry = self._entries.get(rule_id)
+                if entry is not None:
+                    found[rule_id] = entry
+                elif self._missing.get(rule_id, 0) <= now:
+                    to_fetch.append(rule_id)
+            self.metrics["hits"] += len(found)
+            self.metrics["misses"] += len(to_fetch)
+
+        if to_fetch:
+            try:
+                self.metrics["live_queries"] += 1
+                rows = self._select().in_("rule_id", to_fetch).execute().data or []
+            except Exception as e:
+                self._sync_failed(e)
+                return found
+            self._store(rows)
+            with self._lock:
+                for rule_id in to_fetch:
+                    entry = self._entries.get(rule_id)
+                    if entry is not None:
+                        found[rule_id] = entry
+                    else:
+                        self._missing[rule_id] = now + self.ttl
+        return found
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.metrics,
+                "entries": len(self._entries),
+                "known_missing": len(self._missing),
+                "watermark": self._watermark,
+                "synced_seconds_ago": None if self._synced_at is None else round(self._clock() - self._synced_at, 1),
+            }
+
+
+# Singleton instance
+knowledge_base = KnowledgeBaseCache()
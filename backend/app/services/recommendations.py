@@ -0,0 +1,183 @@
+"""
+Rekomendacje dla raportów na podstawie kodów ustaleń (app/services/findings.py).
+
+Szablony (app/data/recommendations.json) są wczytywane raz na proces, w wariantach
+językowych. Szablony bez pól do podstawienia są renderowane od razu przy ładowaniu;
+każdy raport dostaje płytką kopię gotowego słownika, więc zmiana rekomendacji w jednym
+raporcie nie wpływa na inne. Kolejność priorytetów jest wyliczona z góry dla każdego szablonu.
+"""
+import os
+import logging
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from app.common import serialization
+from app.services.findings import FINDING_RULES, extract_report_findings
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATIONS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "recommendations.json")
+PRIORITY_RANK = {"high": 0, "medium": 1, "low": 2, "info": 3}
+# Bez bazy wiedzy tyle błędów PDF/UA jest opisywanych osobno, reszta - jedną zbiorczą rekomendacją
+MAX_PDF_UA_DETAILS = 3
+TEXT_FIELDS = ("issue", "recommendation", "wcag_reference")
+
+Text = Union[str, Tuple[str, str]]
+
+
+class _Placeholders(dict):
+    """Brakujące pole w szablonie -> pusty tekst zamiast KeyError"""
+
+    def __missing__(self, key: str) -> str:
+        return ""
+
+
+class RecommendationTemplate:
+    """Szablon jednej rekomendacji w jednym języku"""
+
+    __slots__ = ("code", "priority", "category", "rank", "texts", "static")
+
+    def __init__(self, code: str, priority: str, category: str, texts: Dict[str, Text]):
+        self.code = code
+        self.priority = priority
+        self.category = category
+        self.rank = PRIORITY_RANK[priority]
+        self.texts = texts
+        # Szablon bez pól do podstawienia i bez odmiany przez liczbę - gotowy słownik
+        self.static: Optional[Dict[str, str]] = None
+        if all(isinstance(text, str) and "{" not in text for text in texts.values()):
+            self.static = self._build(texts)
+
+    def _build(self, texts: Dict[str, str]) -> Dict[str, str]:
+        return {
+            "priority": self.priority,
+            "category": self.category,
+            "issue": texts["issue"],
+            "recommendation": texts["recommendation"],
+            "wcag_reference": texts["wcag_reference"],
+        }
+
+    def render(self, details: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+        if self.static is not None:
+            return self.static.copy()
+        values = _Placeholders(details or {})
+        count = values.get("count")
+        rendered = {}
+        for field, text in self.texts.items():
+            if isinstance(text, tuple):
+                text = text[0] if count == 1 else text[1]
+            rendered[field] = text.format_map(values)
+        return self._build(rendered)
+
+
+class RecommendationEngine:
+    """
+    Rekomendacje z ustaleń analizy i błędów PDF/UA.
+
+    Ta sama logika dla raportu klasycznego (z bazą wiedzy Supabase i bez niej)
+    i raportu wielopoziomowego; dodanie języka to dodanie wariantu tekstów w pliku.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or RECOMMENDATIONS_FILE
+        with open(self.path, "rb") as f:
+            data = serialization.loads(f.read())
+
+        self.default_locale: str = data["default_locale"]
+        definitions: Dict[str, Dict[str, Any]] = data["templates"]
+        locales = sorted({locale for d in definitions.values() for locale in d["text"]})
+        self.templates: Dict[str, Dict[str, RecommendationTemplate]] = {
+            locale: {code: self._template(code, d, locale) for code, d in definitions.items()}
+            for locale in locales
+        }
+        missing = [code for code in (*FINDING_RULES, "pdf_ua_failure", "pdf_ua_more", "pdf_ua_unknown", "no_issues")
+                   if code not in definitions]
+        if missing:
+            raise ValueError(f"Brak szablonów rekomendacji dla kodów: {', '.join(missing)}")
+        # Ustalenia w kolejności szablonów w pliku (kolejność w raporcie przy równym priorytecie)
+        self.finding_order: Tuple[str, ...] = tuple(code for code in definitions if code in FINDING_RULES)
+        logger.info(f"Loaded {len(definitions)} recommendation templates ({', '.join(locales)})")
+
+    def _template(self, code: str, definition: Dict[str, Any], locale: str) -> RecommendationTemplate:
+        if definition["priority"] not in PRIORITY_RANK:
+            raise ValueError(f"Nieznany priorytet rekomendacji '{code}': {definition['priority']}")
+        # Brakujące teksty w danym języku - z języka domyślnego
+        texts = {**definition["text"][self.default_locale], **definition["text"].get(locale, {})}
+        texts.setdefault("wcag_reference", definition.get("wcag_reference", ""))
+        return RecommendationTemplate(code, definition["priority"], definition["category"], {
+            field: (texts[field]["one"], texts[field]["other"]) if isinstance(texts[field], dict) else texts[field]
+            for field in TEXT_FIELDS
+        })
+
+    def locales(self) -> List[str]:
+        return list(self.templates)
+
+    def _for_locale(self, locale: Optional[str]) -> Dict[str, RecommendationTemplate]:
+        return self.templates.get(locale or self.default_locale) or self.templates[self.default_locale]
+
+    def recommend(self, analysis: Dict[str, Any], failed_rules: Iterable[Dict[str, Any]] = (),
+                  locale: Optional[str] = None,
+                  knowledge: Optional[Dict[str, Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """
+        Lista rekomendacji posortowana wg priorytetu (high -> info).
+
+        - analysis: wynik analizy albo zapisany raport (formaty obsługiwane przez extract_report_findings)
+        - knowledge: wpisy bazy wiedzy ('klauzula-numerTestu' -> wpis); z nią każdy błąd PDF/UA
+          dostaje własną rekomendację, bez niej - pierwsze MAX_PDF_UA_DETAILS (najczęstsze,
+          bo parse_verapdf_report sortuje po liczbie wystąpień) i podsumowanie reszty
+        """
+        templates = self._for_locale(locale)
+        findings = extract_report_findings(analysis)
+        ranked: List[Tuple[int, Dict[str, Any]]] = []
+        for code in self.finding_order:
+            if code in findings:
+                template = templates[code]
+                ranked.append((template.rank, template.render(findings[code])))
+
+        failed_rules = list(failed_rules)
+        if knowledge is None:
+            detail = templates["pdf_ua_failure"]
+            for rule in failed_rules[:MAX_PDF_UA_DETAILS]:
+                ranked.append((detail.rank, detail.render({
+                    "description": rule.get("description") or "Brak opisu",
+                    "clause": rule.get("clause") or "N/A",
+                    "count": rule.get("count", 1),
+                })))
+            remaining = len(failed_rules) - MAX_PDF_UA_DETAILS
+            if remaining > 0:
+                more = templates["pdf_ua_more"]
+                ranked.append((more.rank, more.render({"count": remaining})))
+        else:
+            unknown = templates["pdf_ua_unknown"]
+            for rule in failed_rules:
+                rule_id = f"{rule.get('clause')}-{rule.get('testNumber')}"
+                entry = knowledge.get(rule_id)
+                if entry:
+                    priority = entry.get("severity", "medium")
+                    ranked.append((PRIORITY_RANK.get(priority, len(PRIORITY_RANK)), {
+                        "priority": priority,
+                        "category": "pdf_ua",
+                        "issue": entry.get("explanation_why", ""),
+                        "recommendation": entry.get("solution_how", ""),
+                        "wcag_reference": entry.get("wcag_reference", "PDF/UA"),
+                    }))
+                else:
+                    ranked.append((unknown.rank, unknown.render({
+                        "rule_id": rule_id, "wcag_reference": wcag_reference_for(rule),
+                    })))
+
+        if not ranked:
+            return [templates["no_issues"].render()]
+        # Sortowanie stabilne - przy równym priorytecie zostaje kolejność szablonów
+        ranked.sort(key=itemgetter(0))
+        return [recommendation for _, recommendation in ranked]
+
+
+def wcag_reference_for(rule: Dict[str, Any]) -> str:
+    """Kryteria WCAG błędu PDF/UA (z indeksu klauzul) albo sama klauzula"""
+    criteria = rule.get("wcag_criteria") or []
+    return ", ".join(criteria) if criteria else f"PDF/UA {rule.get('clause', '')}"
+
+
+# Singleton instance
+recommendation_engine = RecommendationEngine()
@@ -1,63 +1,165 @@
 import redis
 import os
-import json
+import time
 import hashlib
 import logging
-from typing import Optional, Any, Dict
+import re
+import math
+import random
+import uuid
+from typing import Optional, Any, Dict, Callable, Iterator, List
 from datetime import datetime
+from app.common import serialization
+from app.common.circuit_breaker import CircuitBreaker
+from app.common.local_cache import LocalCache
+from app.services.cache_metrics import CacheMetrics
 
 # Konfiguracja logowania dla Redis
 logger = logging.getLogger(__name__)
 
+# Timeout połączenia i operacji (sekundy)
+SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', '0.5'))
+# Co ile sekund (przy braku innych operacji) potwierdzamy dostępność Redis przez PING
+HEALTH_CHECK_INTERVAL = 5.0
+
+# Przestrzenie nazw kluczy, które wolno czyścić przez API
+CACHE_NAMESPACES = ("pdf_analysis", "rule", "pdf_stage", "validation")
+# Dozwolone znaki we wzorcu czyszczenia (bez klas znaków [] i escapowania)
+SAFE_PATTERN_RE = re.compile(r"^[A-Za-z0-9_.:*?-]+$")
+# SCAN/UNLINK po tyle kluczy naraz
+SCAN_BATCH_SIZE = 500
+# Limit partii na sekundę przy czyszczeniu (10 000 kluczy/s)
+MAX_BATCHES_PER_SECOND = 20
+
+# Lokalna (w procesie) warstwa cache przed Redis
+LOCAL_CACHE_MAX_BYTES = int(os.getenv('LOCAL_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+# Górna granica nieaktualności lokalnego wpisu, gdyby powiadomienie pub/sub nie dotarło
+LOCAL_CACHE_TTL_SECONDS = float(os.getenv('LOCAL_CACHE_TTL_SECONDS', '60'))
+# Kanał, którym procesy rozgłaszają unieważnione klucze / wzorce
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# Jak długo po wygaśnięciu wpis może być serwowany, gdy inny proces go przelicza
+STALE_GRACE_SECONDS = 300
+# Czas życia blokady przeliczenia (powinien przekraczać najdłuższą analizę)
+RECOMPUTE_LOCK_SECONDS = 300
+
 class RedisClient:
     def __init__(self):
         self.client = None
+        # Osobny klient bez dekodowania odpowiedzi - wpisy cache są binarne (serialization.pack)
+        self.raw_client = None
         self.cache_version = "v1.0"  # Zwiększaj przy zmianach w logice analizy
         self.max_file_size_for_cache = 50 * 1024 * 1024  # 50MB limit
         self.metrics = {
             'cache_hits': 0,
             'cache_misses': 0,
-            'cache_errors': 0
+            'cache_errors': 0,
+            'redis_hits': 0,
+            'redis_misses': 0,
+            'recomputes': 0,
+            'stale_served': 0,
+            'lock_waits': 0
         }
+        # Gorące wpisy obsługiwane z pamięci procesu; unieważnienia przychodzą przez pub/sub
+        self.local_cache = LocalCache(max_bytes=LOCAL_CACHE_MAX_BYTES, ttl=LOCAL_CACHE_TTL_SECONDS)
+        self._instance_id = uuid.uuid4().hex
+        # Liczniki per przestrzeń nazw, sumowane w Redis ze wszystkich procesów
+        self.shared_metrics = CacheMetrics(lambda: self.client if self.is_available() else None)
+        self._invalidation_thread = None
+        # Zamiast PING przed każdą operacją: wyłącznik awaryjny + okresowo odświeżany stan zdrowia
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv('REDIS_BREAKER_FAILURES', '3')),
+            reset_timeout=float(os.getenv('REDIS_BREAKER_RESET_SECONDS', '30'))
+        )
+        self.health_check_interval = HEALTH_CHECK_INTERVAL
+        self._last_healthy_at = 0.0
         
         try:
             redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
-            self.client = redis.from_url(redis_url, decode_responses=True)
+            # Krótkie timeouty - niedostępny Redis nie może wstrzymywać żądań
+            timeouts = {'socket_timeout': SOCKET_TIMEOUT, 'socket_connect_timeout': SOCKET_TIMEOUT}
+            self.client = redis.from_url(redis_url, decode_responses=True, **timeouts)
+            self.raw_client = redis.from_url(redis_url, **timeouts)
+        except Exception as e:
+            logger.warning(f"Invalid Redis configuration, will work without cache: {e}")
+            return
+        
+        try:
             # Test połączenia
             self.client.ping()
+            self._record_success()
             logger.info("Redis client initialized successfully")
-        except Exception as e:
-            logger.warning(f"Redis connection failed, will work without cache: {e}")
-            self.client = None
+        except redis.RedisError as e:
+            # Obwód otwarty - wyłącznik sam spróbuje ponownie po reset_timeout
+            self.breaker.trip()
+            logger.warning(f"Redis connection failed, will work without cache until it recovers: {e}")
     
     def is_available(self) -> bool:
-        """Sprawdza czy Redis jest dostępny"""
+        """
+        Sprawdza czy Redis jest dostępny.
+        
+        Nie wysyła PING przy każdym wywołaniu: przy zamkniętym obwodzie ufa ostatniej
+        udanej operacji przez `health_check_interval` sekund, przy otwartym od razu
+        zwraca False.
+        """
         if not self.client:
             return False
+        if not self.breaker.allow_request():
+            return False
+        if (self.breaker.state == CircuitBreaker.CLOSED
+                and time.monotonic() - self._last_healthy_at < self.health_check_interval):
+            return True
         try:
             self.client.ping()
-            return True
-        except Exception:
+        except redis.RedisError as e:
+            self._record_failure(e)
             return False
+        self._record_success()
+        return True
+    
+    def _record_success(self) -> None:
+        self.breaker.record_success()
+        self._last_healthy_at = time.monotonic()
+    
+    def _record_failure(self, error: Exception) -> None:
+        # Błędy połączenia otwierają obwód; błędy danych (np. zły typ klucza) nie.
+        # Wyjątek: w stanie half-open każdy błąd (np. ResponseError MISCONF) kończy wywołanie
+        # próbne porażką - inaczej wyłącznik czekałby na jego wynik w nieskończoność.
+        if (isinstance(error, (redis.ConnectionError, redis.TimeoutError))
+                or self.breaker.state == CircuitBreaker.HALF_OPEN):
+            self.breaker.record_failure()
+            self._last_healthy_at = 0.0
     
     def should_cache_file(self, file_size: int) -> bool:
         """Określa czy plik powinien być cache'owany na podstawie rozmiaru"""
         return file_size <= self.max_file_size_for_cache
     
-    def generate_file_key(self, file_content: bytes) -> str:
-        """Generuj klucz na podstawie hash pliku z wersją"""
+    def generate_file_key(self, file_content: bytes, fingerprint: Optional[str] = None) -> str:
+        """
+        Generuj klucz na podstawie hash pliku z wersją.
+        `fingerprint` - odcisk kodu/danych, od których zależy wynik (fingerprints.py);
+        po jego zmianie stare wpisy przestają być trafiane i wygasają same.
+        """
         try:
             if not file_content:
                 raise ValueError("File content is empty")
             
             hash_val = hashlib.md5(file_content).hexdigest()
+            if fingerprint:
+                return f"pdf_analysis:{self.cache_version}:{fingerprint}:{hash_val}"
             return f"pdf_analysis:{self.cache_version}:{hash_val}"
         except Exception as e:
             logger.error(f"Failed to generate cache key: {e}")
             raise
     
-    def set_cache(self, key: str, value: Any, expire: int = 3600) -> bool:
-        """Cache wyniku analizy"""
+    def set_cache(self, key: str, value: Any, expire: int = 3600, compute_time: float = 0.0) -> bool:
+        """
+        Cache wyniku analizy.
+        
+        Wpis jest logicznie ważny przez `expire` sekund, ale fizycznie trzymany
+        dodatkowe STALE_GRACE_SECONDS - w tym czasie get_or_compute może serwować
+        poprzednią wartość, gdy inny proces ją przelicza.
+        """
         if not self.is_available():
             return False
             
@@ -66,70 +168,289 @@ class RedisClient:
             cache_data = {
                 'data': value,
                 'cached_at': datetime.now().isoformat(),
-                'version': self.cache_version
+                'version': self.cache_version,
+                'expires_at': time.time() + expire,
+                'delta': compute_time  # czas przeliczenia - steruje wcześniejszym odświeżaniem
             }
             
-            serialized = json.dumps(cache_data)
-            result = self.client.setex(key, expire, serialized)
+            serialized = serialization.pack(cache_data)
+            started = time.perf_counter()
+            result = self.raw_client.setex(key, expire + STALE_GRACE_SECONDS, serialized)
+            self.shared_metrics.observe(key, 'set', time.perf_counter() - started)
+            self.shared_metrics.incr(key, 'set')
+            self._record_success()
             
             if result:
+                # Inne procesy mogą trzymać poprzednią wartość lokalnie
+                self._publish_invalidation(key)
+                self._store_local(key, cache_data, len(serialized), expire)
                 logger.info(f"Successfully cached result for key: {key}")
             return result
             
         except Exception as e:
             self.metrics['cache_errors'] += 1
+            self.shared_metrics.incr(key, 'error')
+            self._record_failure(e)
             logger.error(f"Redis cache set error for key {key}: {e}")
             return False
     
     def get_cache(self, key: str) -> Optional[Any]:
-        """Pobierz z cache"""
+        """Pobierz z cache (najpierw z pamięci procesu, potem z Redis)"""
+        entry = self._get_entry(key)
+        if entry is None or self._is_expired(entry):
+            self.metrics['cache_misses'] += 1
+            return None
+        self.metrics['cache_hits'] += 1
+        return entry['data']
+    
+    def get_or_compute(self, key: str, compute: Callable[[], Any], expire: int = 3600,
+                       beta: float = 1.0, wait_timeout: float = RECOMPUTE_LOCK_SECONDS) -> Any:
+        """
+        Zwraca wartość z cache albo wylicza ją przez `compute()` - bez efektu stada.
+        
+        - Wcześniejsze odświeżanie (XFetch): im bliżej wygaśnięcia i im dłużej trwa
+          przeliczenie, tym większa szansa, że pojedyncze żądanie odświeży wpis zawczasu.
+        - Blokada przeliczenia: tylko proces, który zdobędzie blokadę, wywołuje compute();
+          pozostali dostają poprzednią wartość (w oknie STALE_GRACE_SECONDS) albo czekają
+          na wynik, jeśli wartości jeszcze nie było.
+        """
+        entry = self._get_entry(key)
+        if entry is not None and not self._should_refresh(entry, beta):
+            self.metrics['cache_hits'] += 1
+            return entry['data']
+        self.metrics['cache_misses'] += 1
+        
+        if not self.is_available():
+            return compute()
+        
+        token = self._acquire_lock(key)
+        if token is None:
+            if entry is not None:
+                # Ktoś inny już przelicza - serwujemy poprzednią wartość
+                self.metrics['stale_served'] += 1
+                self.shared_metrics.incr(key, 'stale_served')
+                return entry['data']
+            self.metrics['lock_waits'] += 1
+            value = self._wait_for_value(key, wait_timeout)
+            if value is not None:
+                return value
+            logger.warning(f"Timed out waiting for recompute of {key}, computing locally")
+            return self._compute_and_store(key, compute, expire)
+        
+        try:
+            return self._compute_and_store(key, compute, expire)
+        finally:
+            self._release_lock(key, token)
+    
+    def _compute_and_store(self, key: str, compute: Callable[[], Any], expire: int) -> Any:
+        started = time.monotonic()
+        value = compute()
+        self.metrics['recomputes'] += 1
+        self.shared_metrics.incr(key, 'recompute')
+        self.shared_metrics.observe(key, 'compute', time.monotonic() - started)
+        self.set_cache(key, value, expire, compute_time=time.monotonic() - started)
+        return value
+    
+    def _get_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        """Wpis cache razem z metadanymi (także przeterminowany, ale w oknie łaski)"""
+        entry = self.local_cache.get(key)
+        if entry is not None:
+            self.shared_metrics.incr(key, 'hit', tier='local')
+            return entry
+        self.shared_metrics.incr(key, 'miss', tier='local')
+        
         if not self.is_available():
             return None
             
         try:
-            cached = self.client.get(key)
+            # GET i TTL w jednym przebiegu - TTL ogranicza czas życia kopii lokalnej
+            started = time.perf_counter()
+            pipe = self.raw_client.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.ttl(key)
+            cached, ttl = pipe.execute()
+            self.shared_metrics.observe(key, 'get', time.perf_counter() - started)
+            self._record_success()
             if not cached:
-                self.metrics['cache_misses'] += 1
+                self.metrics['redis_misses'] += 1
+                self.shared_metrics.incr(key, 'miss')
                 return None
             
-            cache_data = json.loads(cached)
+            cache_data = serialization.unpack(cached)
             
             # Sprawdź wersję cache
             if cache_data.get('version') != self.cache_version:
                 logger.info(f"Cache version mismatch for key {key}, invalidating")
                 self.client.delete(key)
-                self.metrics['cache_misses'] += 1
+                self.metrics['redis_misses'] += 1
+                self.shared_metrics.incr(key, 'miss')
                 return None
             
-            self.metrics['cache_hits'] += 1
+            self.metrics['redis_hits'] += 1
+            self.shared_metrics.incr(key, 'hit')
             logger.info(f"Cache hit for key: {key}")
-            return cache_data['data']
+            self._store_local(key, cache_data, len(cached), ttl)
+            return cache_data
             
         except Exception as e:
             self.metrics['cache_errors'] += 1
+            self.shared_metrics.incr(key, 'error')
+            self._record_failure(e)
             logger.error(f"Redis cache get error for key {key}: {e}")
             return None
     
-    def invalidate_cache(self, pattern: str = None) -> int:
-        """Usuń cache według wzorca lub wszystkie"""
+    @staticmethod
+    def _is_expired(entry: Dict[str, Any]) -> bool:
+        expires_at = entry.get('expires_at')
+        return expires_at is not None and time.time() >= expires_at
+    
+    @staticmethod
+    def _should_refresh(entry: Dict[str, Any], beta: float) -> bool:
+        """Probabilistyczne wcześniejsze wygaśnięcie (XFetch): delta * beta * -ln(U) przed terminem"""
+        expires_at = entry.get('expires_at')
+        if expires_at is None:
+            return False
+        early = entry.get('delta', 0.0) * beta * -math.log(1.0 - random.random())
+        return time.time() + early >= expires_at
+    
+    def _acquire_lock(self, key: str) -> Optional[str]:
+        token = uuid.uuid4().hex
+        try:
+            if self.client.set(f"lock:{key}", token, nx=True, ex=RECOMPUTE_LOCK_SECONDS):
+                return token
+            return None
+        except redis.RedisError as e:
+            self._record_failure(e)
+            # Bez Redis nie ma koordynacji - liczymy sami
+            return token
+    
+    def _release_lock(self, key: str, token: str) -> None:
+        """Zwalnia blokadę tylko jeśli nadal należy do nas (mogła wygasnąć i zostać przejęta)"""
+        def release(pipe):
+            if pipe.get(f"lock:{key}") == token:
+                pipe.multi()
+                pipe.delete(f"lock:{key}")
+        try:
+            self.client.transaction(release, f"lock:{key}")
+        except redis.RedisError as e:
+            logger.warning(f"Failed to release recompute lock for {key}: {e}")
+    
+    def _wait_for_value(self, key: str, timeout: float) -> Optional[Any]:
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            entry = self._get_entry(key)
+            if entry is not None and not self._is_expired(entry):
+                return entry['data']
+            if not self.client.exists(f"lock:{key}"):
+                # Przeliczenie się nie udało (blokada zwolniona bez wyniku)
+                return None
+            delay = min(delay * 2, 1.0)
+        return None
+    
+    def _store_local(self, key: str, value: Any, size: int, ttl: Optional[int]) -> None:
+        """Zapisuje wpis w lokalnej warstwie, o ile działa nasłuch unieważnień"""
+        if value is None or not self._ensure_invalidation_listener():
+            return
+        self.local_cache.set(key, value, size, ttl if ttl and ttl > 0 else None)
+    
+    def _publish_invalidation(self, pattern: str) -> None:
+        try:
+            self.client.publish(INVALIDATION_CHANNEL, f"{self._instance_id}|{pattern}")
+        except redis.RedisError as e:
+            logger.warning(f"Failed to publish cache invalidation for {pattern}: {e}")
+    
+    def _ensure_invalidation_listener(self) -> bool:
+        """Uruchamia (raz na proces) wątek odbierający unieważnienia z innych procesów"""
+        if self._invalidation_thread is not None and self._invalidation_thread.is_alive():
+            return True
+        try:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: self._on_invalidation})
+            self._invalidation_thread = pubsub.run_in_thread(
+                sleep_time=0.2, daemon=True, exception_handler=self._on_listener_error
+            )
+            return True
+        except redis.RedisError as e:
+            logger.warning(f"Cache invalidation listener unavailable, local cache disabled: {e}")
+            self._invalidation_thread = None
+            return False
+    
+    def _on_invalidation(self, message: Dict[str, Any]) -> None:
+        sender, _, pattern = message["data"].partition("|")
+        if sender != self._instance_id:
+            self.local_cache.invalidate(pattern)
+    
+    def _on_listener_error(self, error: Exception, pubsub, thread) -> None:
+        # Bez nasłuchu lokalne wpisy mogłyby być nieaktualne - czyścimy je
+        logger.warning(f"Cache invalidation listener stopped: {error}")
+        thread.stop()
+        pubsub.close()
+        self.local_cache.clear()
+        self._invalidation_thread = None
+    
+    def is_safe_pattern(self, pattern: str) -> bool:
+        """
+        Czy wzorzec z żądania HTTP może zostać użyty do czyszczenia cache.
+        Dopuszcza tylko klucze w przestrzeniach nazw cache (nie np. wyniki Celery czy webhooki).
+        """
+        if not pattern or not SAFE_PATTERN_RE.match(pattern):
+            return False
+        namespace = pattern.split(":", 1)[0]
+        return namespace in CACHE_NAMESPACES and ":" in pattern
+    
+    def invalidate_cache(self, pattern: str = None,
+                         progress: Optional[Callable[[int, int], None]] = None) -> int:
+        """
+        Usuń cache według wzorca lub wszystkie.
+        
+        Klucze są wyszukiwane przyrostowo (SCAN) i usuwane partiami przez UNLINK
+        (zwalnianie pamięci w tle), z limitem partii na sekundę - bez blokowania serwera.
+        `progress(scanned, deleted)` jest wywoływane po każdej partii.
+        """
         if not self.is_available():
             return 0
-            
+        
+        pattern = pattern or f"pdf_analysis:{self.cache_version}:*"
+        self.local_cache.invalidate(pattern)
+        self._publish_invalidation(pattern)
+        scanned = deleted = 0
         try:
-            if pattern:
-                keys = self.client.keys(pattern)
-            else:
-                keys = self.client.keys(f"pdf_analysis:{self.cache_version}:*")
+            for batch in self._scan_batches(pattern):
+                started = time.monotonic()
+                deleted += self.client.unlink(*batch)
+                scanned += len(batch)
+                if progress:
+                    progress(scanned, deleted)
+                self._throttle(started)
             
-            if keys:
-                deleted = self.client.delete(*keys)
-                logger.info(f"Invalidated {deleted} cache entries")
-                return deleted
-            return 0
+            self._record_success()
+            logger.info(f"Invalidated {deleted} cache entries matching {pattern}")
+            return deleted
             
         except Exception as e:
+            self._record_failure(e)
             logger.error(f"Cache invalidation error: {e}")
-            return 0
+            return deleted
+    
+    def _scan_batches(self, pattern: str) -> Iterator[List[str]]:
+        """Klucze pasujące do wzorca w partiach po SCAN_BATCH_SIZE"""
+        batch = []
+        for key in self.client.scan_iter(match=pattern, count=SCAN_BATCH_SIZE):
+            batch.append(key)
+            if len(batch) >= SCAN_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
+    @staticmethod
+    def _throttle(batch_started: float) -> None:
+        """Limit partii na sekundę - masowe czyszczenie nie zagłodzi innych klientów Redis"""
+        remaining = 1.0 / MAX_BATCHES_PER_SECOND - (time.monotonic() - batch_started)
+        if remaining > 0:
+            time.sleep(remaining)
     
     def get_metrics(self) -> Dict[str, Any]:
         """Pobierz metryki cache"""
@@ -140,42 +461,61 @@ class RedisClient:
             **self.metrics,
             'hit_rate_percent': round(hit_rate, 2),
             'total_requests': total_requests,
-            'redis_available': self.is_available()
+            'redis_available': self.is_available(),
+            'circuit_breaker': self.breaker.snapshot(),
+            'tiers': {
+                'local': self.local_cache.stats(),
+                'redis': {'hits': self.metrics['redis_hits'], 'misses': self.metrics['redis_misses']}
+            },
+            # Sumy ze wszystkich procesów (API + workery), per przestrzeń nazw
+            'shared': self.shared_metrics.snapshot()
         }
     
     def cleanup_old_cache(self, max_age_hours: int = 24) -> int:
-        """Usuń stare wpisy cache (opcjonalne maintenance)"""
+        """
+        Usuń stare wpisy cache (opcjonalne maintenance).
+        
+        Nie pobiera wartości: wpisy bez TTL (starsze wersje) nieużywane dłużej niż
+        max_age_hours (OBJECT IDLETIME) są usuwane, a pozostałym TTL jest skracany
+        do max_age_hours. Zwraca liczbę usuniętych wpisów.
+        """
         if not self.is_available():
             return 0
-            
+        
+        max_age = int(max_age_hours * 3600)
+        deleted = capped = 0
         try:
-            # To jest prosty cleanup - w produkcji można użyć Redis TTL
-            pattern = f"pdf_analysis:*"
-            keys = self.client.keys(pattern)
-            deleted = 0
-            
-            for key in keys:
-                try:
-                    cached = self.client.get(key)
-                    if cached:
-                        cache_data = json.loads(cached)
-                        cached_at = datetime.fromisoformat(cache_data.get('cached_at', ''))
-                        age_hours = (datetime.now() - cached_at).total_seconds() / 3600
-                        
-                        if age_hours > max_age_hours:
-                            self.client.delete(key)
-                            deleted += 1
-                except Exception:
-                    # Jeśli nie można sparsować, usuń
-                    self.client.delete(key)
-                    deleted += 1
+            for batch in self._scan_batches("pdf_analysis:*"):
+                started = time.monotonic()
+                pipe = self.client.pipeline(transaction=False)
+                for key in batch:
+                    pipe.ttl(key)
+                    pipe.object("idletime", key)
+                replies = pipe.execute(raise_on_error=False)
+                
+                stale, pipe = [], self.client.pipeline(transaction=False)
+                for key, ttl, idle in zip(batch, replies[::2], replies[1::2]):
+                    if isinstance(ttl, Exception) or ttl == -2:
+                        continue  # klucz zdążył wygasnąć
+                    if ttl == -1 and isinstance(idle, int) and idle > max_age:
+                        stale.append(key)
+                    elif ttl == -1 or ttl > max_age:
+                        pipe.expire(key, max_age)
+                        capped += 1
+                if stale:
+                    pipe.unlink(*stale)
+                    deleted += len(stale)
+                pipe.execute()
+                self._throttle(started)
             
-            logger.info(f"Cleaned up {deleted} old cache entries")
+            self._record_success()
+            logger.info(f"Cleaned up {deleted} old cache entries, capped TTL of {capped}")
             return deleted
             
         except Exception as e:
+            self._record_failure(e)
             logger.error(f"Cache cleanup error: {e}")
-            return 0
+            return deleted
 
 # Singleton instance
 redis_client = RedisClient()
\ No newline at end of file
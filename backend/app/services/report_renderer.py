@@ -0,0 +1,278 @@
+import asyncio
+import hashlib
+import io
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from app.common import serialization
+
+logger = logging.getLogger(__name__)
+
+REPORT_FORMATS = ("json", "html", "pdf")
+# Zwiększaj przy zmianach szablonu - unieważnia cache i ETagi wyrenderowanych raportów
+RENDER_VERSION = "2"
+MAX_CACHED_REPORTS = 500
+# Silniki renderowania PDF: WeasyPrint (domyślny, otagowany PDF/UA-1) lub PyMuPDF
+# (Story, bez zależności systemowych, ale bez drzewa tagów - wybór przez REPORT_PDF_RENDERER)
+PDF_RENDERERS = ("weasyprint", "pymupdf")
+DEFAULT_PDF_RENDERER = "weasyprint"
+REPORT_TITLE = "Raport Dostępności PDF"
+REPORT_LANGUAGE = "pl-PL"
+
+
+_template_env = Environment(
+    loader=FileSystemLoader(Path(__file__).parent.parent / "templates"),
+    autoescape=select_autoescape(["html"]),
+    auto_reload=False
+)
+# Szablon kompilujemy raz przy imporcie modułu
+_report_template = _template_env.get_template("report.html")
+
+LEVEL_COLORS = {
+    "Wysoki": "#10B981",
+    "Średni": "#F59E0B",
+    "Niski": "#EF4444"
+}
+
+
+def _report_context(report_data: dict) -> dict:
+    """Przygotowuje dane raportu dla szablonu"""
+    metadata = report_data.get('metadata', {})
+    score_data = report_data.get('accessibility_score', {})
+    level = score_data.get('level', 'Niski')
+    return {
+        "filename": metadata.get('filename', 'Brak nazwy'),
+        "analysis_date": metadata.get('analysis_date', 'Brak daty'),
+        "percentage": score_data.get('percentage', 0),
+        "level": level,
+        "level_color": LEVEL_COLORS.get(level, LEVEL_COLORS["Niski"]),
+        "details": score_data.get('details', []),
+        "pdf_ua": report_data.get('pdf_ua_validation'),
+        "deep_scan": report_data.get('deep_scan'),
+        "recommendations": report_data.get('recommendations', [])
+    }
+
+
+def iter_html_report(report_data: dict, chunk_size: int = 16 * 1024) -> Iterator[str]:
+    """
+    Strumieniowo generuje raport HTML fragmentami ok. chunk_size znaków.
+    Pierwszy fragment (nagłówek) powstaje od razu, niezależnie od rozmiaru raportu.
+    """
+    buffer = []
+    buffered = 0
+    for piece in _report_template.generate(**_report_context(report_data)):
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= chunk_size:
+            yield "".join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def generate_html_report(report_data: dict) -> str:
+    """
+    Generuje raport w formacie HTML na podstawie danych JSON.
+    """
+    return "".join(iter_html_report(report_data))
+
+
+def _render_pdf_pymupdf(html_content: str) -> bytes:
+    """
+    Renderuje HTML do PDF silnikiem Story z PyMuPDF (bez pango/cairo).
+    Story nie tworzy drzewa tagów, więc wynik NIE jest otagowanym PDF - ustawiamy
+    tylko tytuł i język dokumentu. Do użycia tam, gdzie WeasyPrint jest niedostępny.
+    """
+    import pymupdf as fitz
+
+    buffer = io.BytesIO()
+    writer = fitz.DocumentWriter(buffer)
+    story = fitz.Story(html=html_content)
+    mediabox = fitz.paper_rect("a4")
+    where = mediabox + (36, 36, -36, -36)
+    more = True
+    while more:
+        device = writer.begin_page(mediabox)
+        more, _ = story.place(where)
+        story.draw(device)
+        writer.end_page()
+    writer.close()
+
+    doc = fitz.open("pdf", buffer.getvalue())
+    try:
+        doc.set_metadata({"title": REPORT_TITLE, "producer": "PDF A11y Audit Server"})
+        catalog_xref = doc.pdf_catalog()
+        doc.xref_set_key(catalog_xref, "Lang", fitz.get_pdf_str(REPORT_LANGUAGE))
+        doc.xref_set_key(catalog_xref, "ViewerPreferences", "<</DisplayDocTitle true>>")
+        return doc.tobytes(garbage=3, deflate=True)
+    finally:
+        doc.close()
+
+
+def _render_pdf_weasyprint(html_content: str) -> bytes:
+    """Renderuje HTML do PDF WeasyPrintem - wariant PDF/UA-1 daje otagowany dokument"""
+    try:
+        from weasyprint import HTML
+    except (ImportError, OSError) as e:
+        raise RuntimeError(f"Silnik WeasyPrint jest niedostępny: {e}")
+    return HTML(string=html_content).write_pdf(pdf_variant="pdf/ua-1")
+
+
+def render_report(report_data: dict, format: str, pdf_renderer: str = DEFAULT_PDF_RENDERER) -> bytes:
+    """
+    Renderuje raport do wskazanego formatu.
+    Wykonywane w osobnym procesie - biblioteki PDF importujemy dopiero tutaj.
+    """
+    if format == "json":
+        return serialization.dumps(report_data, indent=True)
+
+    html_content = generate_html_report(report_data)
+    if format == "html":
+        return html_content.encode()
+
+    if format == "pdf":
+        if pdf_renderer == "pymupdf":
+            return _render_pdf_pymupdf(html_content)
+        return _render_pdf_weasyprint(html_content)
+
+    raise ValueError(f"Nieobsługiwany format raportu: {format}")
+
+
+def report_hash(report_data: dict) -> str:
+    """Stabilny skrót treści raportu (niezależny od kolejności kluczy)"""
+    return hashlib.sha256(serialization.dumps(report_data, sort_keys=True)).hexdigest()
+
+
+class ReportRenderer:
+    """
+    Renderowanie raportów poza pętlą zdarzeń z cache na dysku.
+
+    Generowanie PDF (WeasyPrint) trwa nawet kilka sekund, dlatego odbywa się
+    w puli procesów. Wynik zapisujemy per (skrót raportu, format), więc ponowne
+    pobranie tego samego raportu jest tylko odczytem pliku. Równoległe żądania
+    o ten sam raport czekają na jedno renderowanie.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_workers: Optional[int] = None,
+                 pdf_renderer: Optional[str] = None):
+        self.cache_dir = Path(cache_dir or os.getenv('REPORT_CACHE_DIR', '/tmp/report_cache'))
+        self.max_workers = max_workers or int(os.getenv('REPORT_RENDER_WORKERS', '2'))
+        self.pdf_renderer = pdf_renderer or os.getenv('REPORT_PDF_RENDERER', DEFAULT_PDF_RENDERER)
+        if self.pdf_renderer not in PDF_RENDERERS:
+            logger.warning(f"Nieznany silnik PDF '{self.pdf_renderer}', używam {DEFAULT_PDF_RENDERER}")
+            self.pdf_renderer = DEFAULT_PDF_RENDERER
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.metrics = {'renders': 0, 'cache_hits': 0}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn - nie dziedziczymy stanu pętli zdarzeń i połączeń serwera
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def artifact_version(self, format: str) -> str:
+        """Wersja artefaktu (szablon + silnik PDF) - część klucza cache i ETagu"""
+        if format == "pdf":
+            return f"r{RENDER_VERSION}-{self.pdf_renderer}"
+        return f"r{RENDER_VERSION}"
+
+    def _cache_path(self, digest: str, format: str) -> Path:
+        return self.cache_dir / f"{digest}.{format}"
+
+    def _read_cached(self, path: Path) -> Optional[bytes]:
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _write_cached(self, path: Path, content: bytes) -> None:
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(path.suffix + f".{os.getpid()}.tmp")
+            tmp_path.write_bytes(content)
+            os.replace(tmp_path, path)
+            self._prune()
+        except OSError as e:
+            logger.warning(f"Nie udało się zapisać raportu w cache: {e}")
+
+    def _prune(self) -> None:
+        """Utrzymuje cache w limicie MAX_CACHED_REPORTS (usuwa najstarsze pliki)"""
+        entries = list(self.cache_dir.iterdir())
+        if len(entries) <= MAX_CACHED_REPORTS:
+            return
+        entries.sort(key=lambda p: p.stat().st_mtime)
+        for path in entries[:len(entries) - MAX_CACHED_REPORTS]:
+            path.unlink(missing_ok=True)
+
+    async def render(self, report_data: dict, format: str, digest: Optional[str] = None) -> bytes:
+        """
+        Zwraca wyrenderowany raport z cache lub renderuje go w puli procesów.
+        `digest` pozwala podać gotowy klucz (np. dla niezmiennych wyników zadań) i pominąć hashowanie.
+        """
+        if format not in REPORT_FORMATS:
+            raise ValueError(f"Nieobsługiwany format raportu: {format}")
+
+        if digest is None:
+            # Skrót liczymy w wątku - dla dużych raportów serializacja trwa zauważalnie
+            digest = await run_in_threadpool(report_hash, report_data)
+        digest = f"{digest}-{self.artifact_version(format)}"
+        key = f"{digest}.{format}"
+        path = self._cache_path(digest, format)
+
+        cached = await run_in_threadpool(self._read_cached, path)
+        if cached is not None:
+            self.metrics['cache_hits'] += 1
+            return cached
+
+        in_flight = self._in_flight.get(key)
+        while in_flight is not None:
+            try:
+                return await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                # Anulowano żądanie prowadzące, a nie nasze - przejmujemy renderowanie
+                if not in_flight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            in_flight = self._in_flight.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            content = await asyncio.get_running_loop().run_in_executor(
+                self._get_pool(), render_report, report_data, format, self.pdf_renderer
+            )
+            self.metrics['renders'] += 1
+            await run_in_threadpool(self._write_cached, path, content)
+            future.set_result(content)
+            return content
+        except Exception as e:
+            future.set_exception(e)
+            # Oczekujący dostaną wyjątek; nie zostawiamy "nieodebranego" błędu
+            future.exception()
+            raise
+        except BaseException:
+            # Anulowanie (rozłączenie klienta, zamykanie aplikacji) też musi obudzić oczekujących
+            future.cancel()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    def shutdown(self) -> None:
+        """Zamyka pulę procesów (wywoływane przy zamykaniu aplikacji)"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Singleton instance
+report_renderer = ReportRenderer()
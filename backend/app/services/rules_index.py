@@ -0,0 +1,205 @@
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.models.rules import WCAGRule
+
+# Słowa, identyfikatory (wcag_1.4.3 -> "wcag", "1.4.3") i numery klauzul
+TOKEN_RE = re.compile(r"[^\W_]+(?:\.[^\W_]+)*")
+# Znaki, których NFKD nie rozkłada na literę bazową + znak diakrytyczny
+_FOLD = str.maketrans({"ł": "l", "Ł": "l"})
+# Wagi pól w rankingu wyszukiwania
+FIELD_WEIGHTS = (("id", 8), ("title", 4), ("pdf_ua_mapping", 2), ("description", 1))
+# Minimalna długość tokenu zapytania dopasowywanego jako prefiks ("obraz" -> "obrazów", "obrazy")
+MIN_PREFIX_LENGTH = 3
+# Klauzula PDF/UA ("7.18") lub klauzula z numerem testu veraPDF ("7.18.1-2")
+CLAUSE_RE = re.compile(r"\d+(?:\.\d+)*(?:-\d+)?")
+
+
+def normalize(text: str) -> str:
+    """Małe litery bez polskich znaków diakrytycznych ("Treść" -> "tresc")"""
+    decomposed = unicodedata.normalize("NFKD", text.translate(_FOLD).lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_RE.findall(normalize(text)) if text else []
+
+
+def _iter_bits(mask: int) -> Iterator[int]:
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class RulesIndex:
+    """
+    Niezmienny indeks bazy reguł budowany raz przy ładowaniu.
+
+    - indeks odwrócony: token -> {pozycja reguły: waga}, z posortowanym słownikiem
+      do dopasowań prefiksowych (polska fleksja: "obraz" znajduje "obrazów")
+    - maski bitowe (int) dla poziomu, kategorii i pdf_specific - filtrowanie to AND masek
+    - paginacja odbywa się na pozycjach w indeksie, reguły są materializowane tylko dla strony wyników
+    """
+
+    def __init__(self, rules: Sequence[WCAGRule], postings: Optional[Dict[str, Dict[int, int]]] = None):
+        self.rules: Tuple[WCAGRule, ...] = tuple(rules)
+        self.all_mask = (1 << len(self.rules)) - 1
+        self.level_masks: Dict[str, int] = defaultdict(int)
+        self.category_masks: Dict[str, int] = defaultdict(int)
+        self.pdf_specific_mask = 0
+
+        for position, rule in enumerate(self.rules):
+            bit = 1 << position
+            self.level_masks[_value(rule.level)] |= bit
+            self.category_masks[_value(rule.category)] |= bit
+            if rule.pdf_specific:
+                self.pdf_specific_mask |= bit
+
+        # Tokenizacja (najdroższa część budowy) jest pomijana, gdy indeks pochodzi ze snapshotu
+        self.postings: Dict[str, Dict[int, int]] = postings if postings is not None else self._build_postings()
+        self.vocabulary: List[str] = sorted(self.postings)
+        self.level_masks = dict(self.level_masks)
+        self.category_masks = dict(self.category_masks)
+
+    def _build_postings(self) -> Dict[str, Dict[int, int]]:
+        postings: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        for position, rule in enumerate(self.rules):
+            for field, weight in FIELD_WEIGHTS:
+                for token in tokenize(getattr(rule, field)):
+                    postings[token][position] += weight
+        return {token: dict(p) for token, p in postings.items()}
+
+    def to_state(self) -> Dict[str, List[List[int]]]:
+        """Indeks odwrócony w postaci do zapisania w snapshocie (token -> [[pozycja, waga], ...])"""
+        return {token: [[position, weight] for position, weight in p.items()] for token, p in self.postings.items()}
+
+    @classmethod
+    def from_state(cls, rules: Sequence[WCAGRule], state: Dict[str, List[List[int]]]) -> "RulesIndex":
+        return cls(rules, {token: {position: weight for position, weight in p} for token, p in state.items()})
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def filter_mask(self, level: Optional[str] = None, category: Optional[str] = None,
+                    pdf_specific: Optional[bool] = None) -> int:
+        mask = self.all_mask
+        if level:
+            mask &= self.level_masks.get(level, 0)
+        if category:
+            mask &= self.category_masks.get(category, 0)
+        if pdf_specific is not None:
+            mask &= self.pdf_specific_mask if pdf_specific else ~self.pdf_specific_mask
+        return mask
+
+    def _token_scores(self, token: str) -> Dict[int, int]:
+        """Wagi reguł dla tokenu zapytania: dokładne trafienie + (dla dłuższych) prefiksy"""
+        exact = self.postings.get(token, {})
+        if len(token) < MIN_PREFIX_LENGTH:
+            return exact
+        scores = dict(exact)
+        i = bisect_left(self.vocabulary, token)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(token):
+            candidate = self.vocabulary[i]
+            if candidate != token:
+                # Trafienie prefiksowe liczy się słabiej niż dokładne
+                for position, weight in self.postings[candidate].items():
+                    scores[position] = max(scores.get(position, 0), weight // 2 or 1)
+            i += 1
+        return scores
+
+    def search(self, query: Optional[str] = None, level: Optional[str] = None,
+               category: Optional[str] = None, pdf_specific: Optional[bool] = None,
+               limit: Optional[int] = None, offset: int = 0) -> Tuple[int, List[WCAGRule]]:
+        """
+        Zwraca (liczba wszystkich trafień, reguły ze strony [offset, offset+limit)).
+
+        Bez zapytania - reguły w kolejności bazy; z zapytaniem - wszystkie tokeny muszą
+        pasować, wyniki posortowane malejąco po sumie wag pól.
+        """
+        mask = self.filter_mask(level, category, pdf_specific)
+        end = None if limit is None else offset + limit
+        tokens = tokenize(query)
+
+        if not tokens:
+            if query:
+                return 0, []
+            total = mask.bit_count()
+            page = []
+            for n, position in enumerate(_iter_bits(mask)):
+                if end is not None and n >= end:
+                    break
+                if n >= offset:
+                    page.append(self.rules[position])
+            return total, page
+
+        scores: Optional[Dict[int, int]] = None
+        for token in dict.fromkeys(tokens):
+            token_scores = self._token_scores(token)
+            if scores is None:
+                scores = {p: w for p, w in token_scores.items() if mask >> p & 1}
+            else:
+                scores = {p: w + token_scores[p] for p, w in scores.items() if p in token_scores}
+            if not scores:
+                return 0, []
+
+        ranked = sorted(scores, key=lambda p: (-scores[p], p))
+        return len(ranked), [self.rules[p] for p in ranked[offset:end]]
+
+
+def _value(field) -> str:
+    return getattr(field, "value", field)
+
+
+class ClauseIndex:
+    """
+    Mapowanie klauzula PDF/UA (lub klauzula-numerTestu) -> ID reguł WCAG.
+
+    Budowane z pól `pdf_ua_mapping` przy ładowaniu reguł. Wyszukiwanie próbuje
+    kolejno "klauzula-test", klauzulę i klauzule nadrzędne ("7.18.1" -> "7.18" -> "7"),
+    a wynik dla każdej pary jest zapamiętywany - kolejne wywołania to jeden odczyt ze słownika.
+    """
+
+    def __init__(self, table: Dict[str, Tuple[str, ...]]):
+        self.table = table
+        self._resolved: Dict[Tuple[str, str], Tuple[str, ...]] = {}
+
+    @classmethod
+    def from_rules(cls, rules: Sequence[WCAGRule]) -> "ClauseIndex":
+        table: Dict[str, List[str]] = defaultdict(list)
+        for rule in rules:
+            for clause in CLAUSE_RE.findall(rule.pdf_ua_mapping or ""):
+                if rule.id not in table[clause]:
+                    table[clause].append(rule.id)
+        return cls({clause: tuple(ids) for clause, ids in table.items()})
+
+    def to_dict(self) -> Dict[str, List[str]]:
+        return {clause: list(ids) for clause, ids in self.table.items()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, List[str]]) -> "ClauseIndex":
+        return cls({clause: tuple(ids) for clause, ids in data.items()})
+
+    def lookup(self, clause: Optional[str], test_number: Optional[str] = None) -> Tuple[str, ...]:
+        if not clause:
+            return ()
+        key = (clause, str(test_number or ""))
+        resolved = self._resolved.get(key)
+        if resolved is None:
+            resolved = self._resolve(clause, key[1])
+            self._resolved[key] = resolved
+        return resolved
+
+    def _resolve(self, clause: str, test_number: str) -> Tuple[str, ...]:
+        if test_number and f"{clause}-{test_number}" in self.table:
+            return self.table[f"{clause}-{test_number}"]
+        parts = clause.split(".")
+        while parts:
+            ids = self.table.get(".".join(parts))
+            if ids:
+                return ids
+            parts.pop()
+        return ()
@@ -1,43 +1,141 @@
-import json
+import functools
 import os
-from typing import Dict, List, Optional
+import threading
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
+from fastapi.concurrency import run_in_threadpool
 from app.models.rules import WCAGRule, RuleNotFoundError
+from app.services import fingerprints
+from app.services import findings as findings_module
+from app.services.findings import FINDING_RULES, PRIORITY_ORDER, extract_findings, failed_pdf_ua_rules
+from app.services.rules_index import RulesIndex
+from app.services.rules_snapshot import RulesSnapshot, load_snapshot, parse_rules, snapshot_path
 from app.services.redis_client import redis_client
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Co ile sekund sprawdzać mtime pliku z regułami (0 - bez przeładowywania)
+RULES_RELOAD_INTERVAL_SECONDS = float(os.getenv("RULES_RELOAD_INTERVAL_SECONDS", "5"))
+
+
 class RulesService:
     """Serwis zarządzający bazą wiedzy WCAG/PDF-UA"""
     
-    def __init__(self):
-        self.rules_cache: Dict[str, WCAGRule] = {}
-        self.data_path = Path(__file__).parent.parent / "data" / "wcag_rules.json"
-        self._load_rules()
+    def __init__(self, data_path: Optional[Path] = None):
+        self.data_path = data_path or Path(__file__).parent.parent / "data" / "wcag_rules.json"
+        self.snapshot = self._load_rules()
+        # mtime pliku przy ostatnim sprawdzeniu - trzymany w serwisie, bo snapshoty są niezmienne
+        self._seen_mtime = self.snapshot.mtime
+        self.reload_errors = 0
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+    
+    @property
+    def rules_cache(self) -> Dict[str, WCAGRule]:
+        return self.snapshot.rules
     
-    def _load_rules(self) -> None:
+    @property
+    def index(self) -> RulesIndex:
+        return self.snapshot.index
+    
+    def _load_rules(self) -> RulesSnapshot:
         """Ładuje reguły z pliku JSON do pamięci"""
         try:
             if not self.data_path.exists():
                 logger.warning(f"Brak pliku z regułami: {self.data_path}")
-                self._create_sample_rules()
-                return
+                return self._create_sample_rules()
             
-            with open(self.data_path, 'r', encoding='utf-8') as f:
-                rules_data = json.load(f)
-                
-            for rule_dict in rules_data.get('rules', []):
-                rule = WCAGRule(**rule_dict)
-                self.rules_cache[rule.id] = rule
-                
-            logger.info(f"Załadowano {len(self.rules_cache)} reguł WCAG/PDF-UA")
+            snapshot = self._read_snapshot()
+            logger.info(f"Załadowano {len(snapshot.rules)} reguł WCAG/PDF-UA")
+            return snapshot
             
         except Exception as e:
             logger.error(f"Błąd ładowania reguł: {e}")
-            self._create_sample_rules()
+            return self._create_sample_rules()
+    
+    def _read_snapshot(self) -> RulesSnapshot:
+        mtime = self.data_path.stat().st_mtime
+        raw = self.data_path.read_bytes()
+        version = fingerprints.combine(raw)
+        # Szybka ścieżka: gotowy snapshot binarny (rules_snapshot.py) z tej samej wersji pliku
+        snapshot = self._load_binary_snapshot(version, mtime)
+        if snapshot is not None:
+            return snapshot
+        # Bez snapshotu tablica klauzul PDF/UA jest budowana w pamięci (nic nie zapisujemy w app/data)
+        return RulesSnapshot(parse_rules(raw), version, mtime)
+    
+    def _load_binary_snapshot(self, version: str, mtime: float) -> Optional[RulesSnapshot]:
+        path = snapshot_path(self.data_path)
+        try:
+            snapshot = load_snapshot(path.read_bytes(), version, mtime)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Nieprawidłowy snapshot reguł {path}, używam JSON: {e}")
+            return None
+        if snapshot is None:
+            logger.info(f"Snapshot reguł {path} jest nieaktualny, używam JSON")
+        return snapshot
     
-    def _create_sample_rules(self) -> None:
+    def reload(self) -> bool:
+        """
+        Przeładowuje reguły, jeśli plik się zmienił.
+        
+        Nowy snapshot jest budowany obok bieżącego i podmieniany jednym przypisaniem;
+        przy błędnym pliku zostaje poprzednia wersja.
+        
+        Returns:
+            True, gdy załadowano nową wersję
+        """
+        try:
+            if self.data_path.stat().st_mtime == self._seen_mtime:
+                return False
+            snapshot = self._read_snapshot()
+        except Exception as e:
+            self.reload_errors += 1
+            logger.error(f"Przeładowanie reguł nie powiodło się, zostaje wersja {self.snapshot.version}: {e}")
+            return False
+        
+        if snapshot.version == self.snapshot.version:
+            # Zmienił się tylko mtime (np. touch) - zachowujemy bieżący snapshot
+            self._seen_mtime = snapshot.mtime
+            return False
+        
+        previous, self.snapshot = self.snapshot, snapshot
+        self._seen_mtime = snapshot.mtime
+        logger.info(f"Przeładowano reguły: {previous.version} -> {snapshot.version} ({len(snapshot.rules)} reguł)")
+        return True
+    
+    def start_watcher(self, interval: float = RULES_RELOAD_INTERVAL_SECONDS) -> None:
+        """Uruchamia w tle wątek sprawdzający zmiany pliku z regułami"""
+        if interval <= 0 or (self._watcher and self._watcher.is_alive()):
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="rules-watcher", daemon=True)
+        self._watcher.start()
+    
+    def stop_watcher(self) -> None:
+        self._stop.set()
+        if self._watcher:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+    
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.reload()
+    
+    def status(self) -> Dict:
+        snapshot = self.snapshot
+        return {
+            "version": snapshot.version,
+            "rules_count": len(snapshot.rules),
+            "loaded_at": snapshot.loaded_at,
+            "reload_errors": self.reload_errors,
+            "watcher_running": bool(self._watcher and self._watcher.is_alive()),
+        }
+    
+    def _create_sample_rules(self) -> RulesSnapshot:
         """Tworzy przykładowe reguły dla demonstracji"""
         sample_rules = [
             WCAGRule(
@@ -75,8 +173,7 @@ class RulesService:
             )
         ]
         
-        for rule in sample_rules:
-            self.rules_cache[rule.id] = rule
+        return RulesSnapshot(sample_rules, version="sample")
     
     async def get_rule(self, rule_id: str) -> WCAGRule:
         """
@@ -91,13 +188,14 @@ class RulesService:
         Raises:
             RuleNotFoundError: Gdy reguła nie istnieje
         """
+        snapshot = self.snapshot
         # Najpierw sprawdź lokalny cache
-        if rule_id in self.rules_cache:
-            return self.rules_cache[rule_id]
+        if rule_id in snapshot.rules:
+            return snapshot.rules[rule_id]
         
-        # Sprawdź Redis cache
-        cache_key = f"rule:{rule_id}"
-        cached_rule = redis_client.get_cache(cache_key)
+        # Sprawdź Redis cache (klucz z wersją bazy reguł - po jej zmianie stare wpisy nie są trafiane)
+        cache_key = f"rule:{snapshot.version}:{rule_id}"
+        cached_rule = await run_in_threadpool(redis_client.get_cache, cache_key)
         
         if cached_rule:
             logger.info(f"Pobrano regułę {rule_id} z Redis cache")
@@ -121,74 +219,120 @@ class RulesService:
         Returns:
             Lista reguł spełniających kryteria
         """
-        rules = list(self.rules_cache.values())
-        
-        if level:
-            rules = [r for r in rules if r.level == level]
-        
-        if category:
-            rules = [r for r in rules if r.category == category]
-            
-        if pdf_specific is not None:
-            rules = [r for r in rules if r.pdf_specific == pdf_specific]
-        
+        _, rules = self.index.search(level=level, category=category, pdf_specific=pdf_specific)
         return rules
     
     async def search_rules(self, query: str) -> List[WCAGRule]:
         """
-        Wyszukuje reguły po tekście
+        Wyszukuje reguły po tekście (ID, tytuł, opis, mapowanie PDF/UA)
         
         Args:
-            query: Tekst do wyszukania
+            query: Tekst do wyszukania (wielkość liter i polskie znaki bez znaczenia)
             
         Returns:
-            Lista pasujących reguł
+            Lista pasujących reguł, od najlepiej dopasowanej
         """
-        query_lower = query.lower()
-        results = []
-        
-        for rule in self.rules_cache.values():
-            if (query_lower in rule.title.lower() or 
-                query_lower in rule.description.lower() or
-                query_lower in rule.id.lower()):
-                results.append(rule)
+        _, rules = self.index.search(query)
+        return rules
+    
+    def query_rules(self,
+                    search: Optional[str] = None,
+                    level: Optional[str] = None,
+                    category: Optional[str] = None,
+                    pdf_specific: Optional[bool] = None,
+                    limit: int = 100,
+                    offset: int = 0) -> Tuple[int, List[WCAGRule]]:
+        """
+        Wyszukiwanie + filtry + paginacja w jednym przejściu po indeksie
         
-        return results
+        Returns:
+            (liczba wszystkich pasujących reguł, reguły z żądanej strony)
+        """
+        return self.index.search(search, level=level, category=category,
+                                 pdf_specific=pdf_specific, limit=limit, offset=offset)
+    
+    def wcag_criteria_for(self, clause: Optional[str], test_number: Optional[str] = None) -> List[str]:
+        """ID reguł WCAG powiązanych z klauzulą PDF/UA (np. '7.1', test '3')"""
+        return list(self.snapshot.clauses.lookup(clause, test_number))
+    
+    def attach_wcag_criteria(self, failed_rules: List[Dict]) -> List[Dict]:
+        """
+        Kopie błędów veraPDF z polem `wcag_criteria` (lokalny indeks, bez sieci).
+        Wejściowe słowniki nie są modyfikowane - mogą pochodzić ze współdzielonego cache.
+        """
+        clauses = self.snapshot.clauses
+        return [
+            {**rule, "wcag_criteria": list(clauses.lookup(rule.get("clause"), rule.get("testNumber")))}
+            if isinstance(rule, dict) and rule.get("clause") else rule
+            for rule in failed_rules
+        ]
+    
+    def recommendations_version(self) -> str:
+        """Wersja wyniku get_rules_for_pdf_analysis: baza reguł + mapa FINDING_RULES i kod mapowania"""
+        return fingerprints.combine(self.snapshot.version, _findings_fingerprint())
     
     def get_rules_for_pdf_analysis(self, analysis_results: dict) -> List[Dict]:
         """
         Zwraca reguły relevantne dla wyników analizy PDF
         
+        Każde ustalenie analizy (findings.extract_findings) jest mapowane na reguły
+        przez stałą tablicę FINDING_RULES, a błędy PDF/UA - przez indeks klauzul.
+        
         Args:
-            analysis_results: Wyniki analizy z pdf_analyzer
+            analysis_results: Zapisany raport (klasyczny lub wielopoziomowy) albo wynik analizy podstawowej
             
         Returns:
-            Lista rekomendowanych reguł z priorytetem
+            Lista rekomendowanych reguł z priorytetem, od najważniejszych
         """
-        relevant_rules = []
-        
-        # Jeśli brak tagów - priorytet dla reguł struktury
-        if not analysis_results.get('is_tagged'):
-            rule = self.rules_cache.get('wcag_1.3.1')
-            if rule:
-                relevant_rules.append({
-                    'rule': rule.dict(),
-                    'priority': 'high',
-                    'reason': 'Dokument nie posiada tagów struktury'
-                })
-        
-        # Jeśli są obrazy bez alt tekstów
-        image_info = analysis_results.get('image_info', {})
-        if image_info.get('images_without_alt', 0) > 0:
-            rule = self.rules_cache.get('wcag_1.1.1')
-            if rule:
-                relevant_rules.append({
-                    'rule': rule.dict(),
-                    'priority': 'high',
-                    'reason': f"Znaleziono {image_info['images_without_alt']} obrazów bez tekstu alternatywnego"
-                })
-        
-        return relevant_rules
+        snapshot = self.snapshot
+        relevant: Dict[str, Dict] = {}
+        
+        def add(rule_id: str, priority: str, reason: str, finding: str) -> None:
+            entry = relevant.get(rule_id)
+            if entry is None:
+                entry = relevant[rule_id] = {
+                    'rule': snapshot.rule_dicts[rule_id], 'priority': priority, 'reasons': [], 'findings': []
+                }
+            elif PRIORITY_ORDER[priority] < PRIORITY_ORDER[entry['priority']]:
+                entry['priority'] = priority
+            entry['reasons'].append(reason)
+            entry['findings'].append(finding)
+        
+        for code, details in extract_findings(analysis_results).items():
+            _, priority, template = FINDING_RULES[code]
+            reason = template.format(**details)
+            for rule_id in snapshot.finding_rules[code]:
+                add(rule_id, priority, reason, code)
+        
+        # Błędy PDF/UA grupowane per reguła WCAG (przez klauzule z pdf_ua_mapping)
+        pdf_ua: Dict[str, List[str]] = {}
+        for failed in failed_pdf_ua_rules(analysis_results):
+            for rule_id in snapshot.clauses.lookup(failed.get('clause'), failed.get('testNumber')):
+                pdf_ua.setdefault(rule_id, []).append(failed['clause'])
+        for rule_id, clauses in pdf_ua.items():
+            if rule_id in snapshot.rules:
+                reason = f"Błędy PDF/UA: {len(clauses)} (klauzule: {', '.join(sorted(set(clauses)))})"
+                add(rule_id, 'medium', reason, 'pdf_ua_failure')
+        
+        ranked = sorted(relevant.values(), key=lambda entry: PRIORITY_ORDER[entry['priority']])
+        return [
+            {'rule': e['rule'], 'priority': e['priority'], 'reason': '; '.join(e['reasons']), 'findings': e['findings']}
+            for e in ranked
+        ]
+
+@functools.lru_cache(maxsize=1)
+def _findings_fingerprint() -> str:
+    """
+    Odcisk mapy ustalenie -> reguły i kodu, który ją stosuje (zmienia się tylko z wdrożeniem).
+    Moduł findings jest hashowany w całości, razem z funkcjami pomocniczymi extract_findings.
+    """
+    return fingerprints.combine(
+        repr(sorted(FINDING_RULES.items())),
+        repr(sorted(PRIORITY_ORDER.items())),
+        fingerprints.source_fingerprint(findings_module, RulesService.get_rules_for_pdf_analysis)
+    )
 
 # Singleton instance
-rules_service = RulesService()
\ No newline at end of file
+rules_service = RulesService()
+# Odciski cache (fingerprints) używają wersji aktualnie załadowanego snapshotu
+fingerprints.register_component("rules", lambda: rules_service.snapshot.version)
\ No newline at end of file
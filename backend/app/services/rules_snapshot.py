@@ -0,0 +1,125 @@
+"""
+Binarny snapshot bazy reguł: zwalidowane reguły + gotowe indeksy.
+
+Budowany przy budowie obrazu (lub ręcznie):
+    python -m app.services.rules_snapshot [--rules app/data/wcag_rules.json] [--output ...]
+
+Przy starcie procesu snapshot jest wczytywany bez ponownej walidacji pydantic
+(WCAGRule.model_construct) i bez tokenizacji, o ile powstał z tej samej wersji
+pliku JSON (odcisk treści). W przeciwnym razie używany jest JSON.
+"""
+import argparse
+import functools
+import json
+import logging
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.common import serialization
+from app.models.rules import RuleCategory, RuleLevel, WCAGRule
+from app.services import fingerprints
+from app.services.findings import FINDING_RULES
+from app.services.rules_index import ClauseIndex, RulesIndex
+
+logger = logging.getLogger(__name__)
+
+# Zmień przy zmianie struktury snapshotu lub modelu WCAGRule - stare pliki zostaną pominięte
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_SUFFIX = ".snapshot"
+
+
+class RulesSnapshot:
+    """
+    Niezmienny stan bazy reguł: reguły, indeks i wersja (odcisk treści pliku).
+    Podmieniany w całości - zapytanie, które pobrało snapshot, widzi spójne dane.
+    """
+
+    def __init__(self, rules: List[WCAGRule], version: str, mtime: float = 0.0,
+                 clauses: Optional[ClauseIndex] = None, index: Optional[RulesIndex] = None):
+        self.rules: Dict[str, WCAGRule] = {rule.id: rule for rule in rules}
+        # Indeks wyszukiwania i filtrów budowany raz - zapytania nie przeglądają całej bazy
+        self.index = index or RulesIndex(list(self.rules.values()))
+        # Klauzula PDF/UA -> reguły WCAG (wzbogacanie wyników veraPDF bez zapytań sieciowych)
+        self.clauses = clauses or ClauseIndex.from_rules(list(self.rules.values()))
+        self.version = version
+        self.mtime = mtime
+        self.loaded_at = datetime.now().isoformat()
+
+    @functools.cached_property
+    def rule_dicts(self) -> Dict[str, Dict]:
+        """Reguły w postaci JSON - serializowane raz na snapshot, nie przy każdym żądaniu"""
+        return {rule_id: rule.model_dump(mode="json") for rule_id, rule in self.rules.items()}
+
+    @functools.cached_property
+    def finding_rules(self) -> Dict[str, Tuple[str, ...]]:
+        """Kod ustalenia -> ID reguł obecnych w tej wersji bazy"""
+        return {code: tuple(rule_id for rule_id in rule_ids if rule_id in self.rules)
+                for code, (rule_ids, _, _) in FINDING_RULES.items()}
+
+
+def parse_rules(raw: bytes) -> List[WCAGRule]:
+    """Parsuje i waliduje zawartość wcag_rules.json; rzuca ValueError przy błędach"""
+    rules_data = json.loads(raw)
+    rules = [WCAGRule(**rule_dict) for rule_dict in rules_data.get('rules', [])]
+    if not rules:
+        raise ValueError("Plik nie zawiera żadnych reguł")
+    duplicates = sorted(rule_id for rule_id, count in Counter(rule.id for rule in rules).items() if count > 1)
+    if duplicates:
+        raise ValueError(f"Zduplikowane ID reguł: {duplicates}")
+    return rules
+
+
+def snapshot_path(rules_path: Path) -> Path:
+    return rules_path.with_suffix(SNAPSHOT_SUFFIX)
+
+
+def build_snapshot(raw: bytes) -> bytes:
+    """Waliduje reguły i zwraca snapshot (serialization.pack) z indeksami"""
+    snapshot = RulesSnapshot(parse_rules(raw), fingerprints.combine(raw))
+    return serialization.pack({
+        "format": SNAPSHOT_FORMAT,
+        "rules_version": snapshot.version,
+        "rules": [rule.model_dump(mode="json") for rule in snapshot.index.rules],
+        "index": snapshot.index.to_state(),
+        "clauses": snapshot.clauses.to_dict(),
+    })
+
+
+def load_snapshot(data: bytes, version: str, mtime: float = 0.0) -> Optional[RulesSnapshot]:
+    """Snapshot bez ponownej walidacji; None, gdy powstał z innej wersji reguł lub w innym formacie"""
+    payload = serialization.unpack(data)
+    if payload.get("format") != SNAPSHOT_FORMAT or payload.get("rules_version") != version:
+        return None
+    # Dane były zwalidowane przy budowie snapshotu - odtwarzamy tylko typy enum
+    rules = [
+        WCAGRule.model_construct(**{**rule, "level": RuleLevel(rule["level"]), "category": RuleCategory(rule["category"])})
+        for rule in payload["rules"]
+    ]
+    return RulesSnapshot(
+        rules, version, mtime,
+        clauses=ClauseIndex.from_dict(payload["clauses"]),
+        index=RulesIndex.from_state(rules, payload["index"]),
+    )
+
+
+def write_snapshot(rules_path: Path, output: Optional[Path] = None) -> Path:
+    output = output or snapshot_path(rules_path)
+    output.write_bytes(build_snapshot(rules_path.read_bytes()))
+    return output
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    default_rules = Path(__file__).parent.parent / "data" / "wcag_rules.json"
+    parser = argparse.ArgumentParser(description="Buduje binarny snapshot bazy reguł WCAG/PDF-UA")
+    parser.add_argument("--rules", type=Path, default=default_rules)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args(argv)
+
+    output = write_snapshot(args.rules, args.output)
+    print(f"📦 Zapisano snapshot reguł: {output} ({output.stat().st_size} B)")
+
+
+if __name__ == "__main__":
+    main()
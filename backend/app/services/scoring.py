@@ -0,0 +1,350 @@
+"""
+Profile oceny dostępności definiowane w danych (app/data/scoring_profiles.json).
+
+Profil to lista kryteriów (maksimum punktów + wyrażenie liczące punkty z cech
+dokumentu) i progi poziomów. Przy ładowaniu definicja jest walidowana i kompilowana
+raz do funkcji: skalarnej (jeden raport w zadaniu Celery) i wektorowej (NumPy,
+wsadowe przeliczanie archiwum) - obie dają identyczne wyniki.
+
+Wyrażenia punktów:
+    15                                             stała
+    {"if": WARUNEK, "then": W, "else": W}          else domyślnie 0
+    {"sum": [W, ...]}
+    {"ratio": [licznik, mianownik], "scale": 20, "empty": 20}   int(scale * l/m), m == 0 -> empty
+    {"deduct": cecha, "from": 30, "per": 1}        max(0, from - per * cecha)
+Warunki:
+    {"feature": cecha}                             prawdziwość cechy
+    {"feature": cecha, "op": ">", "value": 50}
+    {"not": WARUNEK}, {"all": [...]}, {"any": [...]}
+"""
+import operator
+import os
+import logging
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from pydantic import ValidationError
+
+from app.common import serialization
+from app.models.scoring import (
+    FeatureSpec, ScoringProfileError, ScoringProfileNotFoundError, ScoringProfileSpec, ScoringProfilesFile
+)
+
+logger = logging.getLogger(__name__)
+
+PROFILES_FILE = os.getenv(
+    "SCORING_PROFILES_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "scoring_profiles.json")
+)
+# Profile domyślne obu ścieżek analizy
+CLASSIC_PROFILE = "classic"
+DETAILED_PROFILE = "detailed"
+
+_OPERATORS: Dict[str, Callable[[Any, Any], Any]] = {
+    ">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le, "==": operator.eq, "!=": operator.ne,
+}
+_MISSING = object()
+
+
+class _Node(NamedTuple):
+    """Skompilowane wyrażenie: wersja skalarna, wektorowa i zakres możliwych punktów"""
+    scalar: Callable[[Dict[str, Any]], Any]
+    vector: Callable[[Dict[str, np.ndarray]], np.ndarray]
+    low: float
+    high: float
+
+
+class _Criterion(NamedTuple):
+    name: str
+    max: int
+    points: _Node
+    when: Optional[_Node]
+
+
+def _compile_extractor(specs: Sequence[FeatureSpec]) -> Callable[[Dict[str, Any], Optional[Dict[str, Any]]], Tuple]:
+    """
+    Buduje jedną funkcję odczytu wszystkich cech profilu.
+
+    Ścieżki cech są rozkładane na kroki (węzeł nadrzędny, klucz), więc każdy wspólny
+    prefiks (np. analysis -> image_info) odczytywany jest raz na raport. Cecha to
+    pierwsza istniejąca ścieżka (jak findings._first).
+    """
+    nodes: Dict[Tuple[str, ...], int] = {(): 0}
+    steps: List[Tuple[int, str]] = []
+
+    def node(path: Sequence[str]) -> int:
+        for depth in range(1, len(path) + 1):
+            prefix = tuple(path[:depth])
+            if prefix not in nodes:
+                nodes[prefix] = len(nodes)
+                steps.append((nodes[prefix[:-1]], prefix[-1]))
+        return nodes[tuple(path)]
+
+    features = []
+    for spec in specs:
+        default = int(spec.default) if float(spec.default).is_integer() else spec.default
+        features.append((tuple(node(path) for path in spec.paths), spec.type == "flag", default))
+
+    def extract(analysis: Optional[Dict[str, Any]], pdf_ua: Optional[Dict[str, Any]]) -> Tuple:
+        values = [{"analysis": analysis or {}, "pdf_ua": pdf_ua}]
+        for parent, key in steps:
+            container = values[parent]
+            values.append(container.get(key, _MISSING) if isinstance(container, dict) else _MISSING)
+
+        result = []
+        for candidates, flag, default in features:
+            value = _MISSING
+            for candidate in candidates:
+                value = values[candidate]
+                if value is not _MISSING:
+                    break
+            if flag:
+                result.append(value is not _MISSING and bool(value))
+            else:
+                result.append(default if value is _MISSING or value is None else value)
+        return tuple(result)
+
+    return extract
+
+
+class _Compiler:
+    """Walidacja i kompilacja wyrażeń jednego profilu; zbiera użyte cechy"""
+
+    def __init__(self, features: Dict[str, FeatureSpec], profile: str):
+        self.features = features
+        self.profile = profile
+        self.used: Set[str] = set()
+
+    def error(self, where: str, message: str) -> ScoringProfileError:
+        return ScoringProfileError(f"Profil '{self.profile}', {where}: {message}")
+
+    def feature(self, name: Any, where: str) -> str:
+        if name not in self.features:
+            raise self.error(where, f"nieznana cecha {name!r}")
+        self.used.add(name)
+        return name
+
+    def condition(self, spec: Any, where: str) -> _Node:
+        if not isinstance(spec, dict) or len(spec.keys() & {"feature", "not", "all", "any"}) != 1:
+            raise self.error(where, f"niepoprawny warunek {spec!r}")
+        if "not" in spec:
+            inner = self.condition(spec["not"], where)
+            return _Node(lambda v: not inner.scalar(v), lambda c: ~inner.vector(c), 0, 1)
+        if "all" in spec or "any" in spec:
+            parts = [self.condition(part, where) for part in spec.get("all", spec.get("any")) or []]
+            if not parts:
+                raise self.error(where, "pusta lista warunków")
+            if "all" in spec:
+                return _Node(lambda v: all(p.scalar(v) for p in parts),
+                             lambda c: np.logical_and.reduce([p.vector(c) for p in parts]), 0, 1)
+            return _Node(lambda v: any(p.scalar(v) for p in parts),
+                         lambda c: np.logical_or.reduce([p.vector(c) for p in parts]), 0, 1)
+
+        name = self.feature(spec["feature"], where)
+        if "op" not in spec:
+            return _Node(lambda v: bool(v[name]), lambda c: c[name] != 0, 0, 1)
+        op = _OPERATORS.get(spec["op"])
+        value = spec.get("value")
+        if op is None or not isinstance(value, (int, float)) or isinstance(value, bool):
+            raise self.error(where, f"niepoprawne porównanie {spec!r}")
+        return _Node(lambda v: op(v[name], value), lambda c: op(c[name], value), 0, 1)
+
+    def points(self, spec: Any, where: str) -> _Node:
+        if _is_int(spec):
+            return _Node(lambda v: spec, lambda c: np.full(_rows(c), spec, dtype=np.float64), spec, spec)
+        if not isinstance(spec, dict):
+            raise self.error(where, f"niepoprawne wyrażenie {spec!r}")
+
+        if "if" in spec:
+            test = self.condition(spec["if"], where)
+            then = self.points(spec.get("then", 0), where)
+            otherwise = self.points(spec.get("else", 0), where)
+            return _Node(lambda v: then.scalar(v) if test.scalar(v) else otherwise.scalar(v),
+                         lambda c: np.where(test.vector(c), then.vector(c), otherwise.vector(c)),
+                         min(then.low, otherwise.low), max(then.high, otherwise.high))
+        if "sum" in spec:
+            parts = [self.points(part, where) for part in spec["sum"] or []]
+            if not parts:
+                raise self.error(where, "pusta suma")
+            return _Node(lambda v: sum(p.scalar(v) for p in parts),
+                         lambda c: sum(p.vector(c) for p in parts),
+                         sum(p.low for p in parts), sum(p.high for p in parts))
+        if "ratio" in spec:
+            pair = spec["ratio"]
+            if not isinstance(pair, list) or len(pair) != 2:
+                raise self.error(where, "ratio wymaga [licznik, mianownik]")
+            numerator, denominator = (self.feature(name, where) for name in pair)
+            scale, empty = spec.get("scale", 1), spec.get("empty", 0)
+            if not _is_int(scale) or not _is_int(empty):
+                raise self.error(where, "ratio wymaga całkowitych 'scale' i 'empty'")
+
+            def ratio(v):
+                # int(scale * (l / m)) - kolejność działań jak w dotychczasowych funkcjach oceny
+                return int(scale * (v[numerator] / v[denominator])) if v[denominator] > 0 else empty
+
+            def ratio_vector(c):
+                den = c[denominator]
+                share = np.divide(c[numerator], den, out=np.zeros_like(den), where=den > 0)
+                return np.where(den > 0, np.trunc(scale * share), empty)
+            return _Node(ratio, ratio_vector, min(0, empty), max(scale, empty))
+        if "deduct" in spec:
+            name = self.feature(spec["deduct"], where)
+            start, per = spec.get("from"), spec.get("per", 1)
+            if not _is_int(start) or not _is_int(per) or per <= 0:
+                raise self.error(where, "deduct wymaga całkowitego 'from' i dodatniego 'per'")
+            return _Node(lambda v: max(0, start - per * v[name]),
+                         lambda c: np.maximum(0, start - per * c[name]), 0, start)
+        raise self.error(where, f"nieznane wyrażenie {sorted(spec)}")
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _rows(columns: Dict[str, np.ndarray]) -> int:
+    return len(next(iter(columns.values()))) if columns else 0
+
+
+class ScoringProfile:
+    """
+    Skompilowany profil oceny.
+
+    - score(): ocena jednego wyniku analizy (słownik accessibility_score)
+    - extract() + score_columns(): ocena kolumnowa partii raportów (batch_scoring)
+    """
+
+    def __init__(self, name: str, spec: ScoringProfileSpec, features: Dict[str, FeatureSpec]):
+        self.name = name
+        self.description = spec.description
+        compiler = _Compiler(features, name)
+
+        criteria = []
+        for position, criterion in enumerate(spec.criteria, start=1):
+            where = f"kryterium {position} ({criterion.name})"
+            points = compiler.points(criterion.points, where)
+            if points.low < 0 or points.high > criterion.max:
+                raise compiler.error(where, f"punkty w zakresie [{points.low}, {points.high}], "
+                                            f"dozwolone [0, {criterion.max}]")
+            when = compiler.condition(criterion.when, where) if criterion.when is not None else None
+            criteria.append(_Criterion(criterion.name, criterion.max, points, when))
+        self.criteria: Tuple[_Criterion, ...] = tuple(criteria)
+        self.max_score = sum(c.max for c in self.criteria)
+        if self.max_score <= 0:
+            raise compiler.error("kryteria", "maksymalny wynik musi być dodatni")
+
+        thresholds = [level.min for level in spec.levels]
+        if thresholds != sorted(thresholds, reverse=True) or len(set(thresholds)) != len(thresholds) \
+                or thresholds[-1] != 0:
+            raise compiler.error("poziomy", "progi muszą być malejące i kończyć się na 0")
+        self.levels: Tuple[Tuple[float, str], ...] = tuple((level.min, level.label) for level in spec.levels)
+        # Progi rosnąco dla np.searchsorted (bez zerowego - poniżej pierwszego progu jest najniższy poziom)
+        self._thresholds = np.array(thresholds[-2::-1], dtype=np.float64)
+        self._labels = np.array([label for _, label in reversed(self.levels)])
+
+        # Odczytywane są tylko cechy używane przez profil
+        self.features: Tuple[str, ...] = tuple(name for name in features if name in compiler.used)
+        self._extract = _compile_extractor([features[name] for name in self.features])
+
+    def extract(self, analysis: Optional[Dict[str, Any]], pdf_ua: Optional[Dict[str, Any]] = None) -> Tuple:
+        """Wartości cech profilu (w kolejności self.features)"""
+        return self._extract(analysis, pdf_ua)
+
+    def level_for(self, percentage: float) -> str:
+        for minimum, label in self.levels:
+            if percentage >= minimum:
+                return label
+        return self.levels[-1][1]
+
+    def score(self, analysis: Optional[Dict[str, Any]], pdf_ua: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Wynik dostępności dla wyniku analizy i (opcjonalnie) walidacji PDF/UA"""
+        values = dict(zip(self.features, self.extract(analysis, pdf_ua)))
+        total = 0
+        details = []
+        for criterion in self.criteria:
+            if criterion.when is not None and not criterion.when.scalar(values):
+                continue
+            points = criterion.points.scalar(values)
+            total += points
+            details.append({"criterion": criterion.name, "points": points, "max": criterion.max})
+
+        percentage = round((total / self.max_score) * 100)
+        return {
+            "total_score": total,
+            "max_score": self.max_score,
+            "percentage": percentage,
+            "level": self.level_for(percentage),
+            "details": details
+        }
+
+    def to_columns(self, rows: Sequence[Tuple]) -> Dict[str, np.ndarray]:
+        if not rows:
+            return {name: np.zeros(0) for name in self.features}
+        matrix = np.array(rows, dtype=np.float64).reshape(len(rows), len(self.features))
+        return {name: matrix[:, i] for i, name in enumerate(self.features)}
+
+    def score_columns(self, columns: Dict[str, np.ndarray]) -> Dict[str, Any]:
+        """
+        Wektorowa ocena partii: punkty kryteriów (z maską obecności), suma, procent i poziom.
+        Kryteria: krotki (nazwa, max, punkty, maska obecności albo None).
+        """
+        criteria = [
+            (c.name, c.max, c.points.vector(columns), None if c.when is None else c.when.vector(columns))
+            for c in self.criteria
+        ]
+        total = sum(points if present is None else np.where(present, points, 0)
+                    for _, _, points, present in criteria)
+        total = np.asarray(total, dtype=np.float64).astype(np.int64)
+        # np.rint zaokrągla połówki do parzystej - tak samo jak round()
+        percentage = np.rint((total / self.max_score) * 100).astype(np.int64)
+        level = self._labels[np.searchsorted(self._thresholds, percentage, side="right")]
+        return {"criteria": criteria, "total": total, "percentage": percentage, "level": level,
+                "max_score": self.max_score}
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "description": self.description,
+            "max_score": self.max_score,
+            "criteria": [{"criterion": c.name, "max": c.max} for c in self.criteria],
+            "levels": [{"min": minimum, "label": label} for minimum, label in self.levels],
+        }
+
+
+def compile_profiles(data: Dict[str, Any]) -> Dict[str, ScoringProfile]:
+    """Walidacja i kompilacja zawartości pliku profili; błąd -> ScoringProfileError"""
+    try:
+        parsed = ScoringProfilesFile.model_validate(data)
+    except ValidationError as e:
+        raise ScoringProfileError(f"Niepoprawny plik profili oceny: {e}") from e
+    return {name: ScoringProfile(name, spec, parsed.features) for name, spec in parsed.profiles.items()}
+
+
+class ScoringProfiles:
+    """Rejestr profili oceny - plik wczytywany i kompilowany raz na proces"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or PROFILES_FILE
+        with open(self.path, "rb") as f:
+            self.profiles = compile_profiles(serialization.loads(f.read()))
+        for required in (CLASSIC_PROFILE, DETAILED_PROFILE):
+            if required not in self.profiles:
+                raise ScoringProfileError(f"Brak wymaganego profilu oceny '{required}' w {self.path}")
+        logger.info(f"Loaded {len(self.profiles)} scoring profiles from {self.path}")
+
+    def names(self) -> List[str]:
+        return list(self.profiles)
+
+    def get(self, name: Optional[str], default: str = CLASSIC_PROFILE) -> ScoringProfile:
+        profile = self.profiles.get(name or default)
+        if profile is None:
+            raise ScoringProfileNotFoundError(
+                f"Nieznany profil oceny '{name}'. Dostępne: {', '.join(self.profiles)}"
+            )
+        return profile
+
+    def describe(self) -> List[Dict[str, Any]]:
+        return [profile.describe() for profile in self.profiles.values()]
+
+
+# Singleton instance
+scoring_profiles = ScoringProfiles()
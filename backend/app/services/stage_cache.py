@@ -0,0 +1,152 @@
+import functools
+import hashlib
+import os
+import time
+import uuid
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app import analysis as analysis_module
+from app import analysis_enhanced as analysis_enhanced_module
+from app.analysis import validate_pdf_ua, parse_verapdf_report
+from app.analysis_enhanced import EnhancedPdfAnalysis, LEVEL_STAGES
+from app.models.analysis_levels import AnalysisLevel
+from app.services import fingerprints
+from app.services.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+
+def run_pdf_ua_validation(file_bytes: bytes, storage_path: str) -> Dict[str, Any]:
+    """Walidacja PDF/UA (veraPDF) - pełna lista błędów, bez przycinania pod poziom analizy"""
+    unique_filename = f"{uuid.uuid4()}.pdf"
+    file_path = os.path.join(storage_path, unique_filename)
+    with open(file_path, "wb") as buffer:
+        buffer.write(file_bytes)
+    try:
+        is_compliant, report_xml = validate_pdf_ua(unique_filename)
+        return {"is_compliant": is_compliant, "failed_rules": parse_verapdf_report(report_xml)}
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+# Kod, od którego zależy wynik etapu - jego odcisk trafia do klucza cache.
+# Moduły analizy są hashowane w całości, więc zmiana w funkcji pomocniczej też unieważnia etapy
+_PDF_MODULES = (analysis_module, analysis_enhanced_module)
+STAGE_DEPENDENCIES: Dict[str, Tuple[Any, ...]] = {
+    "security": (analysis_module,),
+    "basic": _PDF_MODULES,
+    "quick_metrics": _PDF_MODULES,
+    "metadata": _PDF_MODULES,
+    "images": _PDF_MODULES,
+    "headings": _PDF_MODULES,
+    "text_preview": _PDF_MODULES,
+    "deep_scan": _PDF_MODULES,
+    "validation": (run_pdf_ua_validation, analysis_module),
+}
+# Zależności spoza kodu (fingerprints.register_component)
+STAGE_COMPONENTS: Dict[str, Tuple[str, ...]] = {
+    "validation": ("verapdf",),
+}
+# Wyniki etapów zależą tylko od treści pliku - mogą żyć dłużej niż wynik całej analizy
+STAGE_CACHE_TTL = 24 * 3600
+
+
+@functools.lru_cache(maxsize=None)
+def _code_fingerprint(stage: str) -> str:
+    return fingerprints.source_fingerprint(*STAGE_DEPENDENCIES[stage])
+
+
+def stage_fingerprint(stage: str) -> Optional[str]:
+    """
+    Odcisk etapu: kod + wersje składników (np. veraPDF); kod liczony raz na proces.
+    None, gdy wersja któregoś składnika jest nieznana - wynik etapu nie trafia wtedy do cache.
+    """
+    components = [fingerprints.component_version(name) for name in STAGE_COMPONENTS.get(stage, ())]
+    if fingerprints.UNKNOWN_VERSION in components:
+        return None
+    return fingerprints.combine(_code_fingerprint(stage), *components) if components else _code_fingerprint(stage)
+
+
+def all_stage_fingerprints() -> Dict[str, Optional[str]]:
+    return {stage: stage_fingerprint(stage) for stage in STAGE_DEPENDENCIES}
+
+
+class StagedAnalysis:
+    """
+    Analiza PDF złożona z etapów cache'owanych osobno.
+
+    Klucz etapu to hash treści pliku + nazwa i odcisk etapu (stage_fingerprint), więc analiza
+    na wyższym poziomie (np. QUICK -> PROFESSIONAL) liczy tylko brakujące etapy.
+    Dokument jest otwierany dopiero, gdy któryś etap trzeba policzyć.
+    """
+
+    def __init__(self, file_bytes: bytes, storage_path: str = "/tmp/pdfs", cache=redis_client):
+        self.file_bytes = file_bytes
+        self.storage_path = storage_path
+        self.cache = cache
+        self.digest = hashlib.sha256(file_bytes).hexdigest()
+        self.computed: List[str] = []
+        self.reused: List[str] = []
+        self._analysis: Optional[EnhancedPdfAnalysis] = None
+
+    @property
+    def analysis(self) -> EnhancedPdfAnalysis:
+        if self._analysis is None:
+            self._analysis = EnhancedPdfAnalysis(self.file_bytes)
+        return self._analysis
+
+    def stage_key(self, stage: str) -> Optional[str]:
+        """Klucz cache etapu albo None, gdy etapu nie można bezpiecznie cache'ować"""
+        fingerprint = stage_fingerprint(stage)
+        if fingerprint is None:
+            return None
+        # Walidacja ma własną przestrzeń nazw (osobne metryki cache)
+        prefix = "validation" if stage == "validation" else "pdf_stage"
+        return f"{prefix}:{self.digest}:{stage}:{fingerprint}"
+
+    def _stage(self, stage: str, compute: Callable[[], Any]) -> Any:
+        computed = []
+
+        def run():
+            computed.append(stage)
+            return compute()
+
+        key = self.stage_key(stage) if self.file_bytes and self.cache.should_cache_file(len(self.file_bytes)) else None
+        if key is not None:
+            value = self.cache.get_or_compute(key, run, expire=STAGE_CACHE_TTL)
+        else:
+            value = run()
+        (self.computed if computed else self.reused).append(stage)
+        return value
+
+    def contains_javascript(self) -> bool:
+        return self._stage(
+            "security", lambda: {"contains_javascript": self.analysis.contains_javascript()}
+        )["contains_javascript"]
+
+    def analyze(self, level: AnalysisLevel) -> Dict[str, Any]:
+        """Wynik jak EnhancedPdfAnalysis.analyze, ale etapy są brane z cache, gdy to możliwe"""
+        start_time = time.time()
+        config = level.get_config()
+        results = {"analysis_level": level.value, "analysis_config": config}
+        for stage in LEVEL_STAGES[level]:
+            if stage == "basic":
+                # W cache dane niezależne od poziomu - limit stron poziomu nakładany po odczycie
+                facts = self._stage(stage, lambda: self.analysis.basic_facts())
+                results.update(EnhancedPdfAnalysis.basic_for_level(facts, config))
+                continue
+            results.update(self._stage(stage, lambda stage=stage: self.analysis.run_stage(stage, level)))
+        results["analysis_time"] = round(time.time() - start_time, 2)
+        logger.info(f"Etapy policzone: {self.computed}, z cache: {self.reused}")
+        return results
+
+    def validate(self) -> Dict[str, Any]:
+        """Walidacja PDF/UA współdzielona przez wszystkie poziomy i zadania"""
+        return self._stage("validation", lambda: run_pdf_ua_validation(self.file_bytes, self.storage_path))
+
+    def close(self) -> None:
+        if self._analysis is not None:
+            self._analysis.close()
+            self._analysis = None
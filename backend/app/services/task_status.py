@@ -0,0 +1,168 @@
+import asyncio
+import os
+import logging
+from typing import Any, Dict, Optional, Set
+
+import redis.asyncio as aioredis
+from celery import states
+
+from app.common import serialization
+
+logger = logging.getLogger(__name__)
+
+# Prefiks kluczy (i kanałów pub/sub), pod którymi backend Redis Celery zapisuje wyniki
+TASK_META_PREFIX = "celery-task-meta-"
+# Maksymalny czas parkowania żądania long-poll
+MAX_WAIT_SECONDS = 60
+# Górny limit połączeń - tysiące czekających klientów kolejkują się do puli zamiast otwierać sockety
+MAX_CONNECTIONS = 50
+
+
+class TaskStatusWatcher:
+    """
+    Nieblokujący odczyt statusu zadań Celery prosto z backendu wyników w Redis.
+
+    Zastępuje synchroniczne AsyncResult.ready()/.get() w endpointach async.
+    Klienci long-poll czekają na obiektach Future, a powiadomienia o zmianie
+    stanu przychodzą jednym wspólnym połączeniem pub/sub - bez wątku na klienta.
+    """
+
+    def __init__(self, client: Optional[aioredis.Redis] = None):
+        self.client = client
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._waiters: Dict[str, Set[asyncio.Future]] = {}
+
+    def _get_client(self) -> aioredis.Redis:
+        """Leniwie tworzy klienta - pula połączeń wiąże się z pętlą zdarzeń serwera"""
+        if self.client is None:
+            redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+            # Bez decode_responses - wyniki Celery są zapisywane binarnie (serialization.pack)
+            pool = aioredis.BlockingConnectionPool.from_url(redis_url, max_connections=MAX_CONNECTIONS)
+            self.client = aioredis.Redis(connection_pool=pool)
+        return self.client
+
+    async def get_meta(self, task_id: str) -> Dict[str, Any]:
+        """Pobiera metadane zadania (status, wynik) bez blokowania pętli zdarzeń"""
+        raw = await self._get_client().get(f"{TASK_META_PREFIX}{task_id}")
+        if not raw:
+            # Celery traktuje nieznane zadania jako PENDING
+            return {"status": states.PENDING, "result": None, "task_id": task_id}
+        return serialization.unpack(raw)
+
+    async def wait_for_meta(self, task_id: str, timeout: float) -> Dict[str, Any]:
+        """
+        Czeka (maksymalnie timeout sekund) aż zadanie się zakończy.
+
+        Zwraca metadane zakończonego zadania lub aktualny stan po upływie czasu.
+        """
+        meta = await self.get_meta(task_id)
+        if timeout <= 0 or meta.get("status") in states.READY_STATES:
+            return meta
+
+        future = asyncio.get_running_loop().create_future()
+        await self._add_waiter(task_id, future)
+        try:
+            # Ponowny odczyt po subskrypcji - wynik mógł zostać zapisany w międzyczasie
+            meta = await self.get_meta(task_id)
+            if meta.get("status") in states.READY_STATES:
+                return meta
+            try:
+                meta = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                meta = None
+            return meta or await self.get_meta(task_id)
+        finally:
+            await self._remove_waiter(task_id, future)
+
+    async def _add_waiter(self, task_id: str, future: asyncio.Future) -> None:
+        waiters = self._waiters.get(task_id)
+        if waiters is None:
+            waiters = self._waiters[task_id] = set()
+            if self._pubsub is None:
+                self._pubsub = self._get_client().pubsub()
+            await self._pubsub.subscribe(f"{TASK_META_PREFIX}{task_id}")
+        waiters.add(future)
+
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _remove_waiter(self, task_id: str, future: asyncio.Future) -> None:
+        waiters = self._waiters.get(task_id)
+        if waiters is None:
+            return
+        waiters.discard(future)
+        if not waiters:
+            del self._waiters[task_id]
+            if self._pubsub is None:
+                return
+            try:
+                await self._pubsub.unsubscribe(f"{TASK_META_PREFIX}{task_id}")
+            except Exception as e:
+                logger.debug(f"Unsubscribe error for task {task_id}: {e}")
+
+    async def _listen(self) -> None:
+        """Jedna pętla odbierająca powiadomienia dla wszystkich czekających klientów"""
+        try:
+            while self._waiters:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message and message.get("type") == "message":
+                    self._dispatch(message["channel"], message["data"])
+        except Exception as e:
+            logger.error(f"Task status listener error: {e}")
+            # Zerwane połączenie pub/sub odrzucamy - następny czekający otworzy nowe
+            pubsub, self._pubsub = self._pubsub, None
+            waiting, self._waiters = self._waiters, {}
+            try:
+                await pubsub.aclose()
+            except Exception as close_error:
+                logger.debug(f"Pub/sub close error: {close_error}")
+            # Budzimy czekających - endpoint odczyta aktualny stan sam
+            for waiters in waiting.values():
+                for future in waiters:
+                    if not future.done():
+                        future.set_result(None)
+
+    def _dispatch(self, channel, data) -> None:
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        task_id = channel[len(TASK_META_PREFIX):]
+        waiters = self._waiters.get(task_id)
+        if not waiters:
+            return
+        try:
+            meta = serialization.unpack(data)
+        except Exception:
+            return
+        if meta.get("status") not in states.READY_STATES:
+            return
+        for future in waiters:
+            if not future.done():
+                future.set_result(meta)
+
+    async def close(self) -> None:
+        """Zamyka listener i połączenia (wywoływane przy zamykaniu aplikacji)"""
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+
+def describe_failure(meta: Dict[str, Any]) -> str:
+    """Odtwarza komunikat błędu zadania tak, jak str(AsyncResult.info)"""
+    result = meta.get("result")
+    if isinstance(result, dict) and "exc_message" in result:
+        message = result["exc_message"]
+        if isinstance(message, (list, tuple)):
+            return str(message[0]) if len(message) == 1 else str(tuple(message))
+        return str(message)
+    return str(result)
+
+
+# Singleton instance
+task_status_watcher = TaskStatusWatcher()
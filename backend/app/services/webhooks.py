@@ -0,0 +1,333 @@
+import hashlib
+import hmac
+import ipaddress
+import os
+import random
+import socket
+import time
+import uuid
+import logging
+from enum import Enum
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from app.common import serialization
+from app.services.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_KEY = "webhook:outbox"            # ZSET: delivery_id -> czas następnej próby
+DELIVERY_KEY_PREFIX = "webhook:delivery:"
+CLAIM_KEY_PREFIX = "webhook:claim:"      # znacznik przejęcia doręczenia przez workera
+DEAD_LETTER_KEY = "webhook:dead"         # LIST: doręczenia po wyczerpaniu prób
+METRICS_KEY = "webhook:metrics"          # HASH: liczniki doręczeń
+
+MAX_ATTEMPTS = 8
+BASE_BACKOFF_SECONDS = 30
+MAX_BACKOFF_SECONDS = 3600
+DELIVERY_TIMEOUT_SECONDS = 10
+DELIVERY_TTL_SECONDS = 3 * 24 * 3600
+# Po tym czasie doręczenie przejęte przez workera, który padł, wraca do kolejki
+CLAIM_TIMEOUT_SECONDS = 60
+# Dead-letter przechowuje tylko najnowsze wpisy
+MAX_DEAD_LETTERS = 1000
+
+
+class CallbackPayload(str, Enum):
+    """Zawartość wysyłana na callback_url po zakończeniu analizy"""
+    summary = "summary"
+    full = "full"
+
+
+def _resolve_host(host: str, port: int) -> List[str]:
+    """Wszystkie adresy IP, na które wskazuje host (pusta lista gdy nazwa się nie rozwiązuje)"""
+    try:
+        return [info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)]
+    except (socket.gaierror, UnicodeError):
+        return []
+
+
+def _is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    # Adresy IPv4 zapisane jako IPv6 (::ffff:127.0.0.1) sprawdzamy jako IPv4
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return not (ip.is_loopback or ip.is_private or ip.is_link_local or ip.is_reserved
+                or ip.is_multicast or ip.is_unspecified)
+
+
+def resolve_callback_address(url: str, allow_private: bool = False) -> Optional[str]:
+    """
+    Zwraca sprawdzony adres IP hosta z callback_url albo None, gdy adres jest niedozwolony.
+
+    Akceptowane są tylko absolutne adresy http(s). Host jest rozwiązywany,
+    a adresy lokalne, prywatne (RFC1918), link-local (w tym metadane chmury
+    169.254.169.254), zarezerwowane i multicast są odrzucane - callback nie
+    może posłużyć do wysyłania żądań do sieci wewnętrznej (redis, verapdf).
+    Doręczenie łączy się z tym samym adresem, więc ponowne rozwiązanie nazwy
+    (DNS rebinding) nie ominie sprawdzenia.
+    """
+    try:
+        parsed = urlparse(url)
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    except ValueError:
+        return None
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        return None
+    addresses = _resolve_host(parsed.hostname, port)
+    if not addresses:
+        return None
+    if not allow_private and not all(_is_public_address(address) for address in addresses):
+        return None
+    return addresses[0].split("%", 1)[0]
+
+
+def is_valid_callback_url(url: str, allow_private: bool = False) -> bool:
+    """Czy callback_url wskazuje na publiczny host (wywoływane przy przyjęciu adresu)"""
+    return resolve_callback_address(url, allow_private=allow_private) is not None
+
+
+def sign_payload(body: bytes, timestamp: str, secret: str) -> str:
+    """Podpis HMAC-SHA256 z '<timestamp>.<body>' (znacznik czasu chroni przed powtórzeniem)"""
+    message = timestamp.encode() + b"." + body
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def build_callback_payload(task_id: str, status: str, report: Optional[dict] = None,
+                           error: Optional[str] = None,
+                           mode: CallbackPayload = CallbackPayload.summary) -> Dict[str, Any]:
+    """Buduje treść powiadomienia: pełny raport albo zwięzłe podsumowanie"""
+    payload = {"task_id": task_id, "status": status, "report_url": f"/report/{task_id}"}
+    if error is not None:
+        payload["error_message"] = error
+    if report is None:
+        return payload
+
+    if CallbackPayload(mode) == CallbackPayload.full:
+        payload["report"] = report
+        return payload
+
+    score = report.get("accessibility_score", {})
+    pdf_ua = report.get("pdf_ua_validation", {})
+    payload["summary"] = {
+        "filename": report.get("metadata", {}).get("filename"),
+        "percentage": score.get("percentage"),
+        "level": score.get("level"),
+        "is_pdf_ua_compliant": pdf_ua.get("is_compliant"),
+        "failed_rules_count": pdf_ua.get("failed_rules_count", 0),
+        "recommendations_count": len(report.get("recommendations", []))
+    }
+    return payload
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Wykładnicze opóźnienie kolejnej próby z losowym rozrzutem ±10%"""
+    delay = min(BASE_BACKOFF_SECONDS * (2 ** max(attempts - 1, 0)), MAX_BACKOFF_SECONDS)
+    return delay * random.uniform(0.9, 1.1)
+
+
+class WebhookOutbox:
+    """
+    Kolejka wychodzących webhooków przechowywana w Redis.
+
+    Doręczenia czekają w ZSET posortowanym po czasie następnej próby, dzięki
+    czemu przeżywają restart workera. Nieudane próby wracają do kolejki
+    z wykładniczym opóźnieniem, a po MAX_ATTEMPTS trafiają do dead-letter.
+
+    Wpis opuszcza kolejkę dopiero po udanym wysłaniu albo ostatecznej rezygnacji.
+    Na czas próby worker przejmuje go na CLAIM_TIMEOUT_SECONDS - jeśli w tym
+    czasie padnie, doręczenie zostanie ponowione (at-least-once; odbiorca może
+    odrzucać duplikaty po X-Webhook-Id).
+    """
+
+    def __init__(self, client=None, secret: Optional[str] = None, http_client: Optional[httpx.Client] = None,
+                 allow_private_targets: bool = False):
+        self._client = client
+        # Bez sekretu webhooki są wyłączone - nie wysyłamy niepodpisanych powiadomień
+        self.secret = secret if secret is not None else os.getenv("WEBHOOK_SECRET", "")
+        if not self.secret:
+            logger.warning("WEBHOOK_SECRET is not set - callback_url will be rejected")
+        self.http_client = http_client
+        # Tylko do testów i środowisk deweloperskich - wyłącza blokadę adresów wewnętrznych
+        self.allow_private_targets = allow_private_targets
+
+    @property
+    def client(self):
+        if self._client is not None:
+            return self._client
+        return redis_client.client if redis_client.is_available() else None
+
+    @property
+    def enabled(self) -> bool:
+        """Czy doręczenia mogą być podpisane (skonfigurowany WEBHOOK_SECRET)"""
+        return bool(self.secret)
+
+    def enqueue(self, callback_url: str, payload: Dict[str, Any]) -> Optional[str]:
+        """Dodaje doręczenie do kolejki; zwraca jego ID albo None gdy Redis lub sekret są niedostępne"""
+        if not self.enabled:
+            logger.error(f"WEBHOOK_SECRET is not set, dropping callback to {callback_url}")
+            return None
+        if self.client is None:
+            logger.error(f"Webhook outbox unavailable, dropping callback to {callback_url}")
+            return None
+
+        delivery_id = uuid.uuid4().hex
+        delivery = {
+            "id": delivery_id,
+            "url": callback_url,
+            "body": serialization.dumps(payload).decode(),
+            "attempts": 0,
+            "created_at": time.time()
+        }
+        pipe = self.client.pipeline()
+        pipe.setex(f"{DELIVERY_KEY_PREFIX}{delivery_id}", DELIVERY_TTL_SECONDS, serialization.dumps(delivery))
+        pipe.zadd(OUTBOX_KEY, {delivery_id: time.time()})
+        pipe.hincrby(METRICS_KEY, "enqueued", 1)
+        pipe.execute()
+        return delivery_id
+
+    def process_due(self, limit: int = 100) -> int:
+        """Wysyła doręczenia, których czas nadszedł. Zwraca liczbę udanych doręczeń."""
+        if self.client is None:
+            return 0
+
+        delivered = 0
+        for delivery_id in self.client.zrangebyscore(OUTBOX_KEY, 0, time.time(), start=0, num=limit):
+            if not self._claim(delivery_id):
+                continue
+            raw = self.client.get(f"{DELIVERY_KEY_PREFIX}{delivery_id}")
+            if not raw:
+                # Wpis wygasł (DELIVERY_TTL_SECONDS) - nie ma czego wysyłać
+                self._release(self.client.pipeline(), delivery_id, remove=True).execute()
+                continue
+            if self._attempt(serialization.loads(raw)):
+                delivered += 1
+        return delivered
+
+    def _claim(self, delivery_id: str) -> bool:
+        """
+        Atomowe przejęcie doręczenia (SET NX) - równoległe workery nie wyślą go dwa razy.
+        Wpis zostaje w kolejce z terminem przesuniętym o CLAIM_TIMEOUT_SECONDS.
+        """
+        if not self.client.set(f"{CLAIM_KEY_PREFIX}{delivery_id}", 1, nx=True, ex=CLAIM_TIMEOUT_SECONDS):
+            return False
+        self.client.zadd(OUTBOX_KEY, {delivery_id: time.time() + CLAIM_TIMEOUT_SECONDS}, xx=True)
+        return True
+
+    @staticmethod
+    def _release(pipe, delivery_id: str, remove: bool = False):
+        """Zwalnia przejęcie; z remove=True usuwa doręczenie z kolejki"""
+        if remove:
+            pipe.zrem(OUTBOX_KEY, delivery_id)
+        pipe.delete(f"{CLAIM_KEY_PREFIX}{delivery_id}")
+        return pipe
+
+    def _attempt(self, delivery: Dict[str, Any]) -> bool:
+        # Ponowne sprawdzenie adresu - rekord DNS mógł się zmienić od przyjęcia zadania
+        address = resolve_callback_address(delivery["url"], allow_private=self.allow_private_targets)
+        if address is None:
+            return self._give_up(delivery, "callback_url does not resolve to a public address")
+
+        if not self.enabled:
+            return self._give_up(delivery, "WEBHOOK_SECRET is not set")
+
+        body = delivery["body"].encode()
+        timestamp = str(int(time.time()))
+        headers = {
+            "Content-Type": "application/json",
+            "X-Webhook-Id": delivery["id"],
+            "X-Webhook-Timestamp": timestamp,
+            "X-Webhook-Signature": f"sha256={sign_payload(body, timestamp, self.secret)}"
+        }
+
+        started = time.perf_counter()
+        try:
+            http = self.http_client or httpx.Client(timeout=DELIVERY_TIMEOUT_SECONDS)
+            try:
+                response = http.send(self._pinned_request(http, delivery["url"], address, body, headers))
+            finally:
+                if http is not self.http_client:
+                    http.close()
+            success = 200 <= response.status_code < 300
+            error = None if success else f"HTTP {response.status_code}"
+        except httpx.HTTPError as e:
+            success, error = False, str(e)
+        latency_ms = int((time.perf_counter() - started) * 1000)
+
+        delivery_key = f"{DELIVERY_KEY_PREFIX}{delivery['id']}"
+        pipe = self.client.pipeline()
+        pipe.hincrby(METRICS_KEY, "attempts", 1)
+        pipe.hincrby(METRICS_KEY, "latency_ms_total", latency_ms)
+
+        if success:
+            pipe.hincrby(METRICS_KEY, "delivered", 1)
+            pipe.delete(delivery_key)
+            self._release(pipe, delivery["id"], remove=True)
+            pipe.execute()
+            logger.info(f"Webhook {delivery['id']} delivered to {delivery['url']}")
+            return True
+
+        delivery["attempts"] += 1
+        delivery["last_error"] = error
+        pipe.hincrby(METRICS_KEY, "failed_attempts", 1)
+        if delivery["attempts"] >= MAX_ATTEMPTS:
+            self._dead_letter(pipe, delivery)
+        else:
+            pipe.hincrby(METRICS_KEY, "retried", 1)
+            pipe.setex(delivery_key, DELIVERY_TTL_SECONDS, serialization.dumps(delivery))
+            pipe.zadd(OUTBOX_KEY, {delivery["id"]: time.time() + backoff_seconds(delivery["attempts"])})
+            self._release(pipe, delivery["id"])
+            logger.warning(f"Webhook {delivery['id']} failed ({error}), attempt {delivery['attempts']}/{MAX_ATTEMPTS}")
+        pipe.execute()
+        return False
+
+    @staticmethod
+    def _pinned_request(http: httpx.Client, url: str, address: str, body: bytes,
+                        headers: Dict[str, str]) -> httpx.Request:
+        """
+        Żądanie kierowane na sprawdzony adres IP zamiast ponownie rozwiązywanej nazwy.
+        Oryginalny host trafia do nagłówka Host i SNI, więc certyfikat jest weryfikowany dla niego.
+        """
+        original = httpx.URL(url)
+        return http.build_request(
+            "POST", original.copy_with(host=address), content=body,
+            headers={**headers, "Host": original.netloc.decode("ascii")},
+            extensions={"sni_hostname": original.raw_host.decode("ascii")}
+        )
+
+    def _give_up(self, delivery: Dict[str, Any], error: str) -> bool:
+        """Kończy doręczenie bez wysyłania (trafia od razu do dead-letter)"""
+        delivery["last_error"] = error
+        pipe = self.client.pipeline()
+        self._dead_letter(pipe, delivery)
+        pipe.execute()
+        return False
+
+    def _dead_letter(self, pipe, delivery: Dict[str, Any]) -> None:
+        pipe.hincrby(METRICS_KEY, "dead_lettered", 1)
+        pipe.delete(f"{DELIVERY_KEY_PREFIX}{delivery['id']}")
+        self._release(pipe, delivery["id"], remove=True)
+        pipe.lpush(DEAD_LETTER_KEY, serialization.dumps(delivery))
+        pipe.ltrim(DEAD_LETTER_KEY, 0, MAX_DEAD_LETTERS - 1)
+        logger.error(f"Webhook {delivery['id']} dead-lettered after {delivery['attempts']} attempts: "
+                     f"{delivery.get('last_error')}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Liczniki doręczeń oraz aktualny rozmiar kolejki"""
+        if self.client is None:
+            return {"available": False}
+        counters = {k: int(v) for k, v in self.client.hgetall(METRICS_KEY).items()}
+        attempts = counters.get("attempts", 0)
+        return {
+            "available": True,
+            **counters,
+            "pending": self.client.zcard(OUTBOX_KEY),
+            "dead_letter": self.client.llen(DEAD_LETTER_KEY),
+            "avg_latency_ms": round(counters.get("latency_ms_total", 0) / attempts, 1) if attempts else 0
+        }
+
+
+# Singleton instance
+webhook_outbox = WebhookOutbox()
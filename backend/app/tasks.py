@@ -1,12 +1,28 @@
+import functools
+import inspect
 import os
-import uuid
 from datetime import datetime
+from typing import Optional
 from celery import Celery
-from app.analysis import PdfAnalysis, validate_pdf_ua, parse_verapdf_report
-from app.common.exceptions import PDFAnalysisError
+from celery.signals import worker_process_init
+from app import analysis as analysis_module
+from app.analysis import PdfAnalysis
+from app.common.serialization import register_celery_serializer
+from app.services.webhooks import webhook_outbox, build_callback_payload, CallbackPayload
+from app.services.knowledge_base import knowledge_base
+from app.services.redis_client import redis_client
+from app.services.rules_service import rules_service
+from app.services.scoring import scoring_profiles, CLASSIC_PROFILE
+from app.services.recommendations import recommendation_engine, wcag_reference_for
+from app.services.findings import failed_checks_count
+from app.services import fingerprints
+from app.services.stage_cache import StagedAnalysis, stage_fingerprint
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+# Zwarty zapis wyników w Redis (msgpack + zstd/zlib); dekoder czyta też starsze wpisy JSON
+RESULT_SERIALIZER = register_celery_serializer()
+
 # Konfiguracja Celery
 REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
 celery_app = Celery(
@@ -16,6 +32,15 @@ celery_app = Celery(
 )
 celery_app.conf.update(
     task_track_started=True,
+    result_serializer=RESULT_SERIALIZER,
+    result_accept_content=[RESULT_SERIALIZER, 'json'],
+    beat_schedule={
+        # Dosyłanie webhooków, których ponowienie przypada na teraz
+        'deliver-due-webhooks': {
+            'task': 'app.tasks.deliver_webhooks',
+            'schedule': 15.0,
+        },
+    },
 )
 
 # Konfiguracja Supabase dla worker
@@ -28,102 +53,36 @@ if not url or not key:
 else:
     supabase_client: Client = create_client(url, key)
     print("✅ Worker Celery połączony z Supabase!")
+knowledge_base.bind(supabase_client)
+
+@worker_process_init.connect
+def preload_knowledge_base(**kwargs):
+    """Każdy proces workera startuje z pełną kopią bazy wiedzy (bez zapytań przy każdym zadaniu)"""
+    if knowledge_base.preload():
+        print(f"📚 Baza wiedzy w pamięci workera: {knowledge_base.stats()['entries']} wpisów")
+
+@worker_process_init.connect
+def start_rules_watcher(**kwargs):
+    """Przeładowywanie bazy reguł po zmianie pliku także w procesach workera (jak w API)"""
+    rules_service.start_watcher()
 
 PDF_STORAGE_PATH = "/tmp/pdfs"
+# Jak długo wynik analizy pliku (wg hash treści) jest serwowany z cache
+ANALYSIS_CACHE_TTL = 3600
 
-def calculate_accessibility_score(analysis: dict, is_pdf_ua_compliant: bool) -> dict:
+def calculate_accessibility_score(analysis: dict, is_pdf_ua_compliant: bool,
+                                  profile: str = CLASSIC_PROFILE, failed_rules_count: int = None) -> dict:
     """
     Oblicza wynik dostępności uwzględniając wszystkie aspekty analizy.
-    Maksymalnie 100 punktów rozdzielonych na kategorie.
+    Kryteria i progi pochodzą z profilu oceny (domyślnie 'classic' - maksymalnie 100 punktów).
     """
-    score = 0
-    max_score = 100
-    details = []
-    
-    # 1. STRUKTURA TAGÓW (15 pkt)
-    if analysis.get("is_tagged"):
-        score += 15
-        details.append({"criterion": "Dokument otagowany", "points": 15, "max": 15})
-    else:
-        details.append({"criterion": "Dokument otagowany", "points": 0, "max": 15})
-    
-    # 2. ZAWARTOŚĆ TEKSTOWA (10 pkt)
-    if analysis.get("contains_text"):
-        score += 10
-        details.append({"criterion": "Zawiera tekst", "points": 10, "max": 10})
-    else:
-        details.append({"criterion": "Zawiera tekst", "points": 0, "max": 10})
-    
-    # 3. METADANE (10 pkt)
-    metadata_points = 0
-    # Tytuł dokumentu (5 pkt)
-    if analysis.get("is_title_defined"):
-        metadata_points += 5
-    # Język dokumentu (5 pkt)
-    if analysis.get("is_lang_defined"):
-        metadata_points += 5
-    score += metadata_points
-    details.append({"criterion": "Metadane dokumentu", "points": metadata_points, "max": 10})
-    
-    # 4. NAGŁÓWKI (15 pkt)
-    heading_points = 0
-    heading_info = analysis.get("heading_info", {})
-    if heading_info:
-        # Pojedynczy H1 (7 pkt)
-        if heading_info.get("has_single_h1"):
-            heading_points += 7
-        elif heading_info.get("h1_count", 0) > 0:
-            heading_points += 3  # Częściowe punkty za H1
-        
-        # Poprawna hierarchia (8 pkt)
-        if not heading_info.get("has_skipped_levels"):
-            heading_points += 8
-        elif heading_info.get("heading_structure"):
-            heading_points += 4  # Częściowe punkty za jakąkolwiek strukturę
-    
-    score += heading_points
-    details.append({"criterion": "Struktura nagłówków", "points": heading_points, "max": 15})
-    
-    # 5. OPISY ALTERNATYWNE OBRAZÓW (20 pkt)
-    image_points = 0
-    image_info = analysis.get("image_info", {})
-    if image_info.get("image_count", 0) > 0:
-        alt_ratio = image_info.get("images_with_alt", 0) / image_info.get("image_count", 1)
-        image_points = int(20 * alt_ratio)
-        score += image_points
-        details.append({"criterion": "Opisy alternatywne obrazów", "points": image_points, "max": 20})
-    else:
-        # Brak obrazów = pełne punkty (nie ma czego sprawdzać)
-        score += 20
-        details.append({"criterion": "Opisy alternatywne obrazów", "points": 20, "max": 20})
-    
-    # 6. ZGODNOŚĆ Z PDF/UA (30 pkt)
-    if is_pdf_ua_compliant:
-        score += 30
-        details.append({"criterion": "Zgodność z PDF/UA", "points": 30, "max": 30})
-    else:
-        details.append({"criterion": "Zgodność z PDF/UA", "points": 0, "max": 30})
-    
-    # Określenie poziomu dostępności
-    percentage = round((score / max_score) * 100)
-    if percentage >= 85:
-        level = "Wysoki"
-    elif percentage >= 60:
-        level = "Średni"
-    elif percentage >= 40:
-        level = "Niski"
-    else:
-        level = "Bardzo niski"
-    
-    return {
-        "total_score": score,
-        "max_score": max_score,
-        "percentage": percentage,
-        "level": level,
-        "details": details
-    }
+    pdf_ua = {"is_compliant": is_pdf_ua_compliant}
+    if failed_rules_count is not None:
+        pdf_ua["failed_rules_count"] = failed_rules_count
+    return scoring_profiles.get(profile).score(analysis, pdf_ua)
 
-def build_enriched_legacy_report(basic_analysis: dict, failed_rules: list, supabase_client) -> dict:
+def build_enriched_legacy_report(basic_analysis: dict, failed_rules: list, supabase_client,
+                                 locale: str = None) -> dict:
     """
     Wzbogaca raport o dane z Bazy Wiedzy Supabase.
     Używa klucza 'klauzula-numerTestu' do wyszukiwania w knowledge_base_rules.
@@ -131,7 +90,6 @@ def build_enriched_legacy_report(basic_analysis: dict, failed_rules: list, supab
     Ta funkcja ZASTĘPUJE twoje statyczne rekomendacje dynamicznymi z bazy!
     """
     enriched_failed_rules = []
-    enriched_recommendations = []
     
     # Krok 1: Pobierz dane z Bazy Wiedzy za jednym razem
     knowledge_base_entries = {}
@@ -144,243 +102,168 @@ def build_enriched_legacy_report(basic_analysis: dict, failed_rules: list, supab
         ]))
         
         if rule_ids:
-            try:
-                import locale
-                import sys
-            
-                #UTF-8 
-                if sys.platform.startswith('win'):
-                    import codecs
-                    sys.stdout = codecs.getwriter('utf-8')(sys.stdout.detach())
-                response = supabase_client.table('knowledge_base_rules').select('*').in_('rule_id', rule_ids).execute()
-                knowledge_base_entries = {item['rule_id']: item for item in response.data}
-                print(f"🎯 Pobrano {len(knowledge_base_entries)} wpisów z bazy wiedzy")
-            except Exception as e:
-                print(f"❌ Błąd podczas pobierania z Supabase: {e}")
-
-    # Krok 2: Podstawowe rekomendacje (NASZE)
-    if not basic_analysis.get("is_tagged"):
-        enriched_recommendations.append({
-            "priority": "high", 
-            "category": "structure",
-            "issue": "Krytyczny błąd: Dokument nie jest otagowany", 
-            "recommendation": "Dodaj tagi struktury używając Adobe Acrobat Pro. To podstawa dostępności!",
-            "wcag_reference": "WCAG 1.3.1"
-        })
-
-    images_without_alt = basic_analysis.get("image_info", {}).get("images_without_alt", 0)
-    if images_without_alt > 0:
-        enriched_recommendations.append({
-            "priority": "high", 
-            "category": "images",
-            "issue": f"Krytyczny błąd: {images_without_alt} obraz(ów) bez tekstu alternatywnego", 
-            "recommendation": "Dodaj opisy alternatywne (alt text) do wszystkich znaczących obrazów.",
-            "wcag_reference": "WCAG 1.1.1"
-        })
-
-    # Krok 3: MAGIA! Wzbogacenie błędów PDF/UA danymi z bazy
+            # Lokalna kopia bazy wiedzy; do Supabase idą tylko ID, których jeszcze nie znamy
+            knowledge_base_entries = knowledge_base.get_many(rule_ids, client=supabase_client)
+            print(f"🎯 Pobrano {len(knowledge_base_entries)} wpisów z bazy wiedzy")
+
+    # Krok 2: Wzbogacenie błędów PDF/UA danymi z bazy
     for rule in failed_rules:
-        rule_id = f"{rule.get('clause')}-{rule.get('testNumber')}"
-        entry = knowledge_base_entries.get(rule_id)
-        
+        entry = knowledge_base_entries.get(f"{rule.get('clause')}-{rule.get('testNumber')}")
         new_failed_rule = rule.copy()
 
         if entry:
-            # 🎉 MAMY DANE Z BAZY! Wzbogacamy opis
             new_failed_rule['description'] = f"{entry.get('title', '')}: {entry.get('explanation_what', rule['description'])}"
             new_failed_rule['wcag_reference'] = entry.get('wcag_reference', 'N/A')
-            
-            # Dodaj inteligentną rekomendację z bazy
-            enriched_recommendations.append({
-                "priority": entry.get('severity', 'medium'),
-                "category": "pdf_ua",
-                "issue": entry.get('explanation_why', ''),
-                "recommendation": entry.get('solution_how', ''),
-                "wcag_reference": entry.get('wcag_reference', 'PDF/UA')
-            })
-        else:
-            # Fallback - podstawowa rekomendacja
-            enriched_recommendations.append({
-                "priority": "low",
-                "category": "pdf_ua", 
-                "issue": f"Błąd techniczny (kod: {rule_id}) - brak opisu w bazie wiedzy",
-                "recommendation": "Sprawdź specyfikację PDF/UA lub skontaktuj się z administratorem.",
-                "wcag_reference": f"PDF/UA {rule.get('clause', '')}"
-            })
-        
+        elif rule.get('wcag_criteria'):
+            # Kryteria WCAG z lokalnego indeksu klauzul
+            new_failed_rule['wcag_reference'] = wcag_reference_for(rule)
+
         enriched_failed_rules.append(new_failed_rule)
 
-    # Krok 4: Zwróć wzbogacony raport w Twoim formacie
+    # Krok 3: Rekomendacje - ustalenia analizy + rekomendacje z bazy dla każdego błędu PDF/UA
     return {
         "enhanced_failed_rules": enriched_failed_rules,
-        "enhanced_recommendations": enriched_recommendations,
+        "enhanced_recommendations": recommendation_engine.recommend(
+            basic_analysis, failed_rules, locale, knowledge=knowledge_base_entries
+        ),
         "knowledge_base_used": len(knowledge_base_entries) > 0
     }
 
-def generate_recommendations(analysis: dict, failed_rules: list) -> list:
+def generate_recommendations(analysis: dict, failed_rules: list, locale: str = None) -> list:
     """
     Generuje spersonalizowane rekomendacje na podstawie wszystkich aspektów analizy.
     Priorytetyzacja: high = krytyczne, medium = ważne, low = dobre praktyki
     """
-    recommendations = []
-    
-    # 1. STRUKTURA TAGÓW (krytyczne)
-    if not analysis.get("is_tagged"):
-        recommendations.append({
-            "priority": "high",
-            "issue": "Brak tagów struktury",
-            "recommendation": "Dodaj tagi struktury do dokumentu PDF używając Adobe Acrobat Pro lub podobnego narzędzia. To podstawa dostępności!",
-            "wcag_reference": "WCAG 1.3.1"
-        })
-    
-    # 2. METADANE DOKUMENTU
-    # Tytuł (ważne)
-    if not analysis.get("is_title_defined"):
-        recommendations.append({
-            "priority": "medium",
-            "issue": "Brak tytułu dokumentu",
-            "recommendation": "Ustaw opisowy tytuł dokumentu we właściwościach PDF. Tytuł pomaga użytkownikom zidentyfikować dokument.",
-            "wcag_reference": "WCAG 2.4.2"
-        })
-    
-    # Język (ważne)
-    if not analysis.get("is_lang_defined"):
-        recommendations.append({
-            "priority": "medium",
-            "issue": "Niezdefiniowany język dokumentu",
-            "recommendation": "Ustaw język dokumentu we właściwościach PDF (np. 'pl-PL' dla polskiego). Czytniki ekranu potrzebują tej informacji.",
-            "wcag_reference": "WCAG 3.1.1"
-        })
-    
-    # 3. STRUKTURA NAGŁÓWKÓW
-    heading_info = analysis.get("heading_info", {})
-    if heading_info:
-        # Brak H1 (ważne)
-        if heading_info.get("h1_count", 0) == 0:
-            recommendations.append({
-                "priority": "medium",
-                "issue": "Brak głównego nagłówka H1",
-                "recommendation": "Dodaj dokładnie jeden nagłówek H1 na początku dokumentu. To tytuł główny całego dokumentu.",
-                "wcag_reference": "WCAG 1.3.1, 2.4.6"
-            })
-        # Wiele H1 (średnie)
-        elif heading_info.get("h1_count", 0) > 1:
-            recommendations.append({
-                "priority": "low",
-                "issue": f"Za dużo nagłówków H1 ({heading_info.get('h1_count')})",
-                "recommendation": "Użyj tylko jednego H1 jako głównego tytułu. Pozostałe nagłówki zamień na H2.",
-                "wcag_reference": "WCAG 1.3.1"
-            })
-        
-        # Pominięte poziomy (średnie)
-        if heading_info.get("has_skipped_levels"):
-            recommendations.append({
-                "priority": "medium",
-                "issue": "Nieprawidłowa hierarchia nagłówków",
-                "recommendation": "Zachowaj logiczną kolejność nagłówków (H1→H2→H3). Nie pomijaj poziomów.",
-                "wcag_reference": "WCAG 1.3.1"
-            })
-    
-    # 4. OBRAZY BEZ ALT-TEKSTÓW (krytyczne)
-    image_info = analysis.get("image_info", {})
-    if image_info.get("images_without_alt", 0) > 0:
-        count = image_info['images_without_alt']
-        recommendations.append({
-            "priority": "high",
-            "issue": f"Brakuje opisów alternatywnych dla {count} {'obrazu' if count == 1 else 'obrazów'}",
-            "recommendation": "Dodaj opisy alternatywne (alt text) do wszystkich znaczących obrazów. Dla obrazów dekoracyjnych użyj pustego alt=\"\".",
-            "wcag_reference": "WCAG 1.1.1"
-        })
-    
-    # 5. BRAK TEKSTU (krytyczne dla zeskanowanych PDF)
-    if not analysis.get("contains_text") and image_info.get("image_count", 0) > 0:
-        recommendations.append({
-            "priority": "high",
-            "issue": "Dokument zeskanowany bez warstwy tekstowej",
-            "recommendation": "Przeprowadź OCR (rozpoznawanie tekstu) na dokumencie. Zeskanowane obrazy bez tekstu są niedostępne.",
-            "wcag_reference": "WCAG 1.4.5"
-        })
-    
-    # 6. BŁĘDY PDF/UA (grupowane)
-    if len(failed_rules) > 0:
-        # Pokaż max 3 najważniejsze błędy
-        for rule in failed_rules[:3]:
-            recommendations.append({
-                "priority": "medium",
-                "issue": f"Naruszenie PDF/UA: {rule.get('description', 'Brak opisu')}",
-                "recommendation": f"Napraw błąd związany z klauzulą {rule.get('clause', 'N/A')}",
-                "wcag_reference": f"PDF/UA {rule.get('clause', '')}"
-            })
-        
-        # Jeśli jest więcej błędów, dodaj zbiorczą rekomendację
-        if len(failed_rules) > 3:
-            recommendations.append({
-                "priority": "low",
-                "issue": f"Pozostałe {len(failed_rules) - 3} błędy zgodności PDF/UA",
-                "recommendation": "Przeprowadź pełną walidację PDF/UA używając narzędzia PAC 3 lub Adobe Acrobat Pro.",
-                "wcag_reference": "ISO 14289-1"
-            })
-    
-    # 7. POZYTYWNE WSKAZÓWKI (gdy dokument jest dobry)
-    if not recommendations:
-        recommendations.append({
-            "priority": "info",
-            "issue": "Gratulacje! Dokument spełnia podstawowe wymogi dostępności",
-            "recommendation": "Rozważ przeprowadzenie testów z użytkownikami korzystającymi z technologii asystujących dla pełnej weryfikacji.",
-            "wcag_reference": "WCAG 2.1 AA"
-        })
-    
-    # Sortuj rekomendacje według priorytetu
-    priority_order = {"high": 0, "medium": 1, "low": 2, "info": 3}
-    recommendations.sort(key=lambda x: priority_order.get(x["priority"], 3))
-    
-    return recommendations
+    return recommendation_engine.recommend(analysis, failed_rules, locale)
 
-@celery_app.task(name='app.tasks.run_full_pdf_analysis')
-def run_full_pdf_analysis_task(file_bytes: bytes, filename: str):
+def _notify_callback(task_id: str, callback_url: str, callback_payload: str, status: str,
+                     report: dict = None, error: str = None) -> None:
+    """Wrzuca powiadomienie o zakończeniu zadania do kolejki webhooków"""
+    if not callback_url:
+        return
+    try:
+        payload = build_callback_payload(task_id, status, report=report, error=error, mode=callback_payload)
+        if webhook_outbox.enqueue(callback_url, payload):
+            deliver_webhooks_task.delay()
+    except Exception as e:
+        # Błąd powiadomienia nie może zepsuć samej analizy
+        print(f"⚠️ Nie udało się zakolejkować webhooka: {e}")
+
+class CallbackTask(celery_app.Task):
     """
-    ZACHOWANA - Twoja główna funkcja z dodaną MAGIĄ Supabase!
+    Zadanie powiadamiające callback_url o stanie końcowym.
+
+    Celery wywołuje on_success/on_failure dopiero po zapisaniu wyniku w backendzie,
+    więc odbiorca może od razu pobrać raport spod report_url. on_failure obejmuje
+    każdy wyjątek (także timeout veraPDF czy błąd Redis), nie tylko PDFAnalysisError.
+    """
+
+    def _callback_options(self, args, kwargs) -> tuple:
+        arguments = inspect.signature(self.run).bind_partial(*args, **kwargs).arguments
+        return arguments.get("callback_url"), arguments.get("callback_payload", CallbackPayload.summary.value)
+
+    def on_success(self, retval, task_id, args, kwargs):
+        _notify_callback(task_id, *self._callback_options(args, kwargs), "SUCCESS", report=retval)
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        _notify_callback(task_id, *self._callback_options(args, kwargs), "FAILURE", error=str(exc))
+
+@celery_app.task(name='app.tasks.deliver_webhooks')
+def deliver_webhooks_task():
+    """
+    Doręcza zaległe webhooki z kolejki w Redis (uruchamiane po zakolejkowaniu i cyklicznie przez beat).
+    """
+    return webhook_outbox.process_due()
+
+@celery_app.task(bind=True, name='app.tasks.invalidate_cache')
+def invalidate_cache_task(self, pattern: str = None):
+    """
+    Czyści cache w tle (SCAN + UNLINK), raportując postęp w stanie PROGRESS.
+    """
+    def report_progress(scanned: int, deleted: int):
+        self.update_state(state='PROGRESS', meta={'pattern': pattern, 'scanned': scanned, 'deleted': deleted})
+
+    deleted = redis_client.invalidate_cache(pattern, progress=report_progress)
+    print(f"🧹 Wyczyszczono {deleted} wpisów cache ({pattern or 'domyślny wzorzec'})")
+    return {'pattern': pattern, 'deleted_count': deleted}
+
+def _run_pdf_analysis(file_bytes: bytes) -> dict:
+    """
+    Najdroższa część zadania: analiza podstawowa (PyMuPDF) i walidacja PDF/UA (veraPDF).
     """
     analysis = None
     try:
         # 1. ZACHOWANA - Twoja analiza podstawowa
         analysis = PdfAnalysis(file_bytes)
         basic_analysis_result = analysis.run_basic_analysis()
-
-        # 2. ZACHOWANA - Walidacja PDF/UA
-        unique_filename = f"{uuid.uuid4()}.pdf"
-        file_path = os.path.join(PDF_STORAGE_PATH, unique_filename)
-        
-        with open(file_path, "wb") as buffer:
-            buffer.write(file_bytes)
-        
-        is_compliant, report_xml = validate_pdf_ua(unique_filename)
-        failed_rules = parse_verapdf_report(report_xml)
-
-    except PDFAnalysisError as e:
-        raise e  
     finally:
         if analysis:
             analysis.close() 
-        if 'file_path' in locals() and os.path.exists(file_path):
-            os.remove(file_path)
+
+    # 2. ZACHOWANA - Walidacja PDF/UA (etap współdzielony z analizą wielopoziomową)
+    validation = StagedAnalysis(file_bytes, storage_path=PDF_STORAGE_PATH).validate()
+
+    return {
+        "basic_analysis": basic_analysis_result,
+        "is_compliant": validation["is_compliant"],
+        "failed_rules": validation["failed_rules"]
+    }
+
+@functools.lru_cache(maxsize=1)
+def _analysis_code_fingerprint() -> str:
+    # Cały moduł analizy - zmiana funkcji pomocniczej też zmienia wynik
+    return fingerprints.source_fingerprint(_run_pdf_analysis, analysis_module)
+
+def analysis_fingerprint() -> Optional[str]:
+    """
+    Odcisk wyniku _run_pdf_analysis: kod analizy podstawowej + etap walidacji (z wersją veraPDF).
+    None, gdy wersja veraPDF jest nieznana - wynik nie jest wtedy cache'owany.
+    """
+    validation = stage_fingerprint("validation")
+    return fingerprints.combine(_analysis_code_fingerprint(), validation) if validation is not None else None
+
+@celery_app.task(base=CallbackTask, name='app.tasks.run_full_pdf_analysis')
+def run_full_pdf_analysis_task(file_bytes: bytes, filename: str, callback_url: str = None,
+                               callback_payload: str = CallbackPayload.summary.value,
+                               scoring_profile: str = CLASSIC_PROFILE, locale: str = None):
+    """
+    ZACHOWANA - Twoja główna funkcja z dodaną MAGIĄ Supabase!
+    Opcjonalnie powiadamia callback_url o zakończeniu analizy (CallbackTask).
+    Wynik dostępności liczony jest wg wybranego profilu oceny (scoring_profile),
+    rekomendacje - w wybranym języku (locale).
+    """
+    # 1-2. Analiza podstawowa + walidacja PDF/UA - współdzielona przez cache (jedno przeliczenie naraz)
+    fingerprint = analysis_fingerprint() if file_bytes and redis_client.should_cache_file(len(file_bytes)) else None
+    if fingerprint is not None:
+        analysis_result = redis_client.get_or_compute(
+            redis_client.generate_file_key(file_bytes, fingerprint),
+            lambda: _run_pdf_analysis(file_bytes),
+            expire=ANALYSIS_CACHE_TTL
+        )
+    else:
+        analysis_result = _run_pdf_analysis(file_bytes)
+
+    basic_analysis_result = analysis_result["basic_analysis"]
+    is_compliant = analysis_result["is_compliant"]
+    # Kryteria WCAG dla błędów PDF/UA z lokalnego indeksu klauzul (bez zapytań sieciowych)
+    failed_rules = rules_service.attach_wcag_criteria(analysis_result["failed_rules"])
 
     # 3. NOWE - Wzbogacenie raportu Supabase
     if supabase_client:
         try:
-            enriched_data = build_enriched_legacy_report(basic_analysis_result, failed_rules, supabase_client)
+            enriched_data = build_enriched_legacy_report(basic_analysis_result, failed_rules, supabase_client, locale)
             # Użyj wzbogaconych rekomendacji
-            final_recommendations = enriched_data["enriched_recommendations"]
-            final_failed_rules = enriched_data["enriched_failed_rules"]
+            final_recommendations = enriched_data["enhanced_recommendations"]
+            final_failed_rules = enriched_data["enhanced_failed_rules"]
             print("🎉 Użyto wzbogaconych rekomendacji z bazy wiedzy!")
         except Exception as e:
             print(f"⚠️ Błąd wzbogacania - używam statycznych rekomendacji: {e}")
             # Fallback - Twoje oryginalne rekomendacje
-            final_recommendations = generate_recommendations(basic_analysis_result, failed_rules)
+            final_recommendations = generate_recommendations(basic_analysis_result, failed_rules, locale)
             final_failed_rules = failed_rules
     else:
         # Brak Supabase - używaj Twoich oryginalnych funkcji
-        final_recommendations = generate_recommendations(basic_analysis_result, failed_rules)
+        final_recommendations = generate_recommendations(basic_analysis_result, failed_rules, locale)
         final_failed_rules = failed_rules
 
     # 4. ZACHOWANY - Twój format raportu
@@ -389,16 +272,20 @@ def run_full_pdf_analysis_task(file_bytes: bytes, filename: str):
             "filename": filename,
             "analysis_date": datetime.now().isoformat(),
             "file_size": len(file_bytes),
-            "enhanced_with_supabase": supabase_client is not None
+            "enhanced_with_supabase": supabase_client is not None,
+            "scoring_profile": scoring_profile
         },
         "basic_analysis": basic_analysis_result,
         "pdf_ua_validation": {
             "is_compliant": is_compliant,
             "failed_rules_count": len(final_failed_rules),
+            "failed_checks_count": failed_checks_count(final_failed_rules),
             "failed_rules": final_failed_rules
         },
-        "accessibility_score": calculate_accessibility_score(basic_analysis_result, is_compliant),
+        "accessibility_score": calculate_accessibility_score(
+            basic_analysis_result, is_compliant, scoring_profile, failed_rules_count=len(final_failed_rules)
+        ),
         "recommendations": final_recommendations
     }
-    
+
     return report
\ No newline at end of file
@@ -1,11 +1,15 @@
 import os
-import uuid
 from datetime import datetime
 from celery import Celery
-from app.analysis_enhanced import EnhancedPdfAnalysis
-from app.analysis import validate_pdf_ua, parse_verapdf_report
+from celery.signals import worker_process_init
 from app.models.analysis_levels import AnalysisLevel
 from app.common.exceptions import PDFAnalysisError, PotentiallyUnsafePDFError
+from app.common.serialization import register_celery_serializer
+from app.services.rules_service import rules_service
+from app.services.scoring import scoring_profiles, DETAILED_PROFILE
+from app.services.recommendations import recommendation_engine
+from app.services.findings import failed_checks_count
+from app.services.stage_cache import StagedAnalysis
 
 REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
 celery_app = Celery(
@@ -13,17 +17,32 @@ celery_app = Celery(
     broker=REDIS_URL,
     backend=REDIS_URL
 )
+RESULT_SERIALIZER = register_celery_serializer()
+celery_app.conf.update(
+    result_serializer=RESULT_SERIALIZER,
+    result_accept_content=[RESULT_SERIALIZER, 'json'],
+)
+
+@worker_process_init.connect
+def start_rules_watcher(**kwargs):
+    """Przeładowywanie bazy reguł po zmianie pliku w każdym procesie workera"""
+    rules_service.start_watcher()
 
 PDF_STORAGE_PATH = "/tmp/pdfs"
+# Poziom STANDARD pokazuje tylko tyle błędów PDF/UA (pełne liczniki zostają w raporcie)
+STANDARD_MAX_FAILED_RULES = 5
 
 @celery_app.task(name='app.tasks.run_enhanced_pdf_analysis')
 def run_enhanced_pdf_analysis_task(
     file_bytes: bytes, 
     filename: str,
-    analysis_level: str = "standard"
+    analysis_level: str = "standard",
+    scoring_profile: str = DETAILED_PROFILE,
+    locale: str = None
 ):
     """
-    Zadanie Celery wykonujące analizę PDF z wybranym poziomem szczegółowości.
+    Zadanie Celery wykonujące analizę PDF z wybranym poziomem szczegółowości
+    i wynikiem dostępności wg wybranego profilu oceny (rekomendacje w języku `locale`).
     """
     analysis = None
     level = AnalysisLevel(analysis_level)
@@ -33,8 +52,8 @@ def run_enhanced_pdf_analysis_task(
         # Update stanu zadania
         celery_app.current_task.update_state(state='ANALYZING', meta={'progress': 10})
         
-        # 1. Analiza z wybranym poziomem
-        analysis = EnhancedPdfAnalysis(file_bytes)
+        # 1. Analiza z wybranym poziomem - etapy policzone wcześniej (np. na niższym poziomie) są brane z cache
+        analysis = StagedAnalysis(file_bytes, storage_path=PDF_STORAGE_PATH)
         
         # Sprawdzamy, czy odziedziczona metoda wykryje skrypt
         if analysis.contains_javascript():
@@ -49,24 +68,16 @@ def run_enhanced_pdf_analysis_task(
         if not config["skip_verapdf"]:
             celery_app.current_task.update_state(state='ANALYZING', meta={'progress': 50})
             
-            unique_filename = f"{uuid.uuid4()}.pdf"
-            file_path = os.path.join(PDF_STORAGE_PATH, unique_filename)
-            
-            with open(file_path, "wb") as buffer:
-                buffer.write(file_bytes)
-            
-            try:
-                is_compliant, report_xml = validate_pdf_ua(unique_filename)
-                failed_rules = parse_verapdf_report(report_xml)
-                
-                pdf_ua_result = {
-                    "is_compliant": is_compliant,
-                    "failed_rules_count": len(failed_rules),
-                    "failed_rules": failed_rules[:5] if level == AnalysisLevel.STANDARD else failed_rules
-                }
-            finally:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
+            validation = analysis.validate()
+            failed_rules = rules_service.attach_wcag_criteria(validation["failed_rules"])
+            # Błędy są zagregowane per (klauzula, test) i posortowane po liczbie wystąpień;
+            # STANDARD dostaje STANDARD_MAX_FAILED_RULES najczęstszych, bez przykładowych kontekstów
+            pdf_ua_result = {
+                "is_compliant": validation["is_compliant"],
+                "failed_rules_count": len(failed_rules),
+                "failed_checks_count": failed_checks_count(failed_rules),
+                "failed_rules": _standard_failed_rules(failed_rules) if level == AnalysisLevel.STANDARD else failed_rules
+            }
         
         celery_app.current_task.update_state(state='FINALIZING', meta={'progress': 90})
         
@@ -76,8 +87,11 @@ def run_enhanced_pdf_analysis_task(
             analysis_result=analysis_result,
             pdf_ua_result=pdf_ua_result,
             level=level,
-            file_size=len(file_bytes)
+            file_size=len(file_bytes),
+            scoring_profile=scoring_profile,
+            locale=locale
         )
+        report["metadata"]["stages"] = {"computed": analysis.computed, "reused": analysis.reused}
         
         return report
         
@@ -87,8 +101,16 @@ def run_enhanced_pdf_analysis_task(
         if analysis:
             analysis.close()
 
+def _standard_failed_rules(failed_rules: list) -> list:
+    """Zwarta postać błędów PDF/UA dla STANDARD: najczęstsze wpisy, z liczbą wystąpień i stronami, bez kontekstów"""
+    return [
+        {key: value for key, value in rule.items() if key != "contexts"}
+        for rule in failed_rules[:STANDARD_MAX_FAILED_RULES]
+    ]
+
 def _generate_report(filename: str, analysis_result: dict, pdf_ua_result: dict, 
-                    level: AnalysisLevel, file_size: int) -> dict:
+                    level: AnalysisLevel, file_size: int, scoring_profile: str = DETAILED_PROFILE,
+                    locale: str = None) -> dict:
     """
     Generuje raport dostosowany do poziomu analizy
     """
@@ -126,14 +148,17 @@ def _generate_report(filename: str, analysis_result: dict, pdf_ua_result: dict,
         # Dodaj rekomendacje
         report["recommendations"] = _generate_recommendations(
             analysis_result, 
-            pdf_ua_result
+            pdf_ua_result,
+            locale
         )
         
         # Oblicz szczegółowy wynik dostępności
         report["accessibility_score"] = _calculate_detailed_score(
             analysis_result,
-            pdf_ua_result
+            pdf_ua_result,
+            scoring_profile
         )
+        report["metadata"]["scoring_profile"] = scoring_profile
     
     # Dodaj wyniki PROFESSIONAL (deep scan)
     if level == AnalysisLevel.PROFESSIONAL:
@@ -147,130 +172,16 @@ def _generate_report(filename: str, analysis_result: dict, pdf_ua_result: dict,
     
     return report
 
-def _generate_recommendations(analysis: dict, pdf_ua: dict) -> list:
-    """Generuje rekomendacje na podstawie analizy"""
-    recommendations = []
-    
-    # Rekomendacje podstawowe
-    if not analysis.get("is_tagged"):
-        recommendations.append({
-            "priority": "high",
-            "category": "structure",
-            "issue": "Brak tagów struktury",
-            "recommendation": "Dodaj tagi struktury do dokumentu PDF używając Adobe Acrobat Pro.",
-            "wcag_reference": "WCAG 1.3.1"
-        })
-    
-    # Rekomendacje dla obrazów
-    image_info = analysis.get("image_info", {})
-    if image_info.get("images_without_alt", 0) > 0:
-        recommendations.append({
-            "priority": "high",
-            "category": "images",
-            "issue": f"Brakuje opisów alternatywnych dla {image_info['images_without_alt']} obrazów",
-            "recommendation": "Dodaj opisy alternatywne (alt text) do wszystkich znaczących obrazów.",
-            "wcag_reference": "WCAG 1.1.1"
-        })
-    
-    # Rekomendacje dla metadanych
-    metadata = analysis.get("metadata", {})
-    if not metadata.get("is_title_defined"):
-        recommendations.append({
-            "priority": "medium",
-            "category": "metadata",
-            "issue": "Brak tytułu dokumentu",
-            "recommendation": "Ustaw tytuł dokumentu we właściwościach PDF.",
-            "wcag_reference": "WCAG 2.4.2"
-        })
-    
-    if not metadata.get("is_lang_defined"):
-        recommendations.append({
-            "priority": "medium",
-            "category": "metadata",
-            "issue": "Brak zdefiniowanego języka dokumentu",
-            "recommendation": "Ustaw język dokumentu we właściwościach PDF (np. 'pl-PL' dla polskiego).",
-            "wcag_reference": "WCAG 3.1.1"
-        })
-    
-    # Rekomendacje dla nagłówków
-    heading_info = analysis.get("heading_info", {})
-    if heading_info and not heading_info.get("has_single_h1"):
-        recommendations.append({
-            "priority": "medium",
-            "category": "headings",
-            "issue": f"Nieprawidłowa liczba nagłówków H1: {heading_info.get('h1_count', 0)}",
-            "recommendation": "Dokument powinien mieć dokładnie jeden nagłówek H1.",
-            "wcag_reference": "WCAG 1.3.1"
-        })
-    
-    return recommendations
+def _generate_recommendations(analysis: dict, pdf_ua: dict, locale: str = None) -> list:
+    """
+    Generuje rekomendacje na podstawie analizy (te same szablony co raport klasyczny).
+    Błędy PDF/UA są opisane w sekcji pdf_ua_validation, nie w rekomendacjach.
+    """
+    return recommendation_engine.recommend(analysis, locale=locale)
 
-def _calculate_detailed_score(analysis: dict, pdf_ua: dict) -> dict:
-    """Oblicza szczegółowy wynik dostępności"""
-    score = 0
-    max_score = 100
-    details = []
-    
-    # Tagowanie (25 pkt)
-    if analysis.get("is_tagged"):
-        tag_score = 25
-        # Bonus za jakość tagowania
-        if analysis.get("deep_scan", {}).get("tagging_details", {}).get("structure_quality", 0) > 50:
-            tag_score = 25
-        else:
-            tag_score = 15
-        score += tag_score
-        details.append({"criterion": "Struktura tagów", "points": tag_score, "max": 25})
-    else:
-        details.append({"criterion": "Struktura tagów", "points": 0, "max": 25})
-    
-    # Tekst (15 pkt)
-    if analysis.get("contains_text"):
-        score += 15
-        details.append({"criterion": "Zawiera tekst", "points": 15, "max": 15})
-    else:
-        details.append({"criterion": "Zawiera tekst", "points": 0, "max": 15})
-    
-    # Alt-teksty (20 pkt)
-    image_info = analysis.get("image_info", {})
-    if image_info.get("image_count", 0) > 0:
-        alt_ratio = image_info.get("images_with_alt", 0) / image_info.get("image_count", 1)
-        alt_points = int(20 * alt_ratio)
-        score += alt_points
-        details.append({"criterion": "Opisy alternatywne", "points": alt_points, "max": 20})
-    else:
-        score += 20  # Brak obrazów = pełne punkty
-        details.append({"criterion": "Opisy alternatywne", "points": 20, "max": 20})
-    
-    # Metadane (10 pkt)
-    metadata = analysis.get("metadata", {})
-    metadata_points = 0
-    if metadata.get("is_title_defined"):
-        metadata_points += 5
-    if metadata.get("is_lang_defined"):
-        metadata_points += 5
-    score += metadata_points
-    details.append({"criterion": "Metadane", "points": metadata_points, "max": 10})
-    
-    # PDF/UA (30 pkt)
-    if pdf_ua and pdf_ua.get("is_compliant"):
-        score += 30
-        details.append({"criterion": "Zgodność PDF/UA", "points": 30, "max": 30})
-    elif pdf_ua:
-        # Częściowe punkty za mniej błędów
-        partial = max(0, 30 - pdf_ua.get("failed_rules_count", 30))
-        score += partial
-        details.append({"criterion": "Zgodność PDF/UA", "points": partial, "max": 30})
-    
-    level = "Wysoki" if score >= 80 else "Średni" if score >= 50 else "Niski"
-    
-    return {
-        "total_score": score,
-        "max_score": max_score,
-        "percentage": round((score / max_score) * 100),
-        "level": level,
-        "details": details
-    }
+def _calculate_detailed_score(analysis: dict, pdf_ua: dict, profile: str = DETAILED_PROFILE) -> dict:
+    """Oblicza szczegółowy wynik dostępności wg profilu oceny (domyślnie 'detailed')"""
+    return scoring_profiles.get(profile, DETAILED_PROFILE).score(analysis, pdf_ua)
 
 def _generate_wcag_report(analysis: dict, pdf_ua: dict) -> dict:
     """Generuje szczegółowy raport zgodności WCAG (PROFESSIONAL)"""
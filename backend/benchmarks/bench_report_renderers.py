@@ -0,0 +1,98 @@
+"""
+Benchmark silników renderowania raportu PDF (PyMuPDF vs WeasyPrint).
+
+Każdy silnik mierzony jest w osobnym, świeżym procesie, żeby czas importu
+i zużycie pamięci nie mieszały się między silnikami.
+
+Uruchomienie (z katalogu backend):
+    python -m benchmarks.bench_report_renderers --rules 500 --runs 5
+"""
+import argparse
+import multiprocessing
+import statistics
+import time
+
+
+def build_synthetic_report(rule_count: int) -> dict:
+    """Raport z dużą liczbą kryteriów i rekomendacji"""
+    return {
+        "metadata": {"filename": "synthetic.pdf", "analysis_date": "2024-01-01T00:00:00"},
+        "accessibility_score": {
+            "percentage": 42,
+            "level": "Niski",
+            "details": [
+                {"criterion": f"Kryterium {i}", "points": i % 10, "max": 10}
+                for i in range(rule_count)
+            ]
+        },
+        "recommendations": [
+            {
+                "priority": ("high", "medium", "low")[i % 3],
+                "issue": f"Naruszenie PDF/UA 7.{i % 21}: opis problemu numer {i}",
+                "recommendation": "Napraw błąd zgodnie ze specyfikacją PDF/UA."
+            }
+            for i in range(rule_count)
+        ]
+    }
+
+
+def _measure(renderer: str, rule_count: int, runs: int, queue) -> None:
+    import resource
+    import tracemalloc
+
+    from app.services.report_renderer import render_report
+
+    # Mierzymy wyłącznie koszt importu samego silnika
+    started = time.perf_counter()
+    if renderer == "weasyprint":
+        import weasyprint  # noqa: F401
+    else:
+        import pymupdf  # noqa: F401
+    import_time = time.perf_counter() - started
+
+    report = build_synthetic_report(rule_count)
+    timings = []
+    tracemalloc.start()
+    for _ in range(runs):
+        started = time.perf_counter()
+        pdf_bytes = render_report(report, "pdf", pdf_renderer=renderer)
+        timings.append(time.perf_counter() - started)
+    _, peak_python = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    queue.put({
+        "renderer": renderer,
+        "import_s": import_time,
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "peak_python_mb": peak_python / 1024 / 1024,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "pdf_kb": len(pdf_bytes) / 1024
+    })
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", type=int, default=200, help="Liczba kryteriów i rekomendacji w raporcie")
+    parser.add_argument("--runs", type=int, default=5, help="Liczba renderowań na silnik")
+    parser.add_argument("--renderers", nargs="+", default=["pymupdf", "weasyprint"])
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{'silnik':<12}{'import [s]':>12}{'mediana [s]':>13}{'min [s]':>10}"
+          f"{'peak py [MB]':>14}{'max RSS [MB]':>14}{'PDF [kB]':>10}")
+    for renderer in args.renderers:
+        queue = context.Queue()
+        process = context.Process(target=_measure, args=(renderer, args.rules, args.runs, queue))
+        process.start()
+        process.join()
+        if process.exitcode != 0 or queue.empty():
+            print(f"{renderer:<12}niedostępny (kod wyjścia {process.exitcode})")
+            continue
+        r = queue.get()
+        print(f"{r['renderer']:<12}{r['import_s']:>12.3f}{r['median_s']:>13.3f}{r['min_s']:>10.3f}"
+              f"{r['peak_python_mb']:>14.1f}{r['max_rss_mb']:>14.1f}{r['pdf_kb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
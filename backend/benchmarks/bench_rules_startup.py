@@ -0,0 +1,67 @@
+"""
+Benchmark czasu wczytania bazy reguł przy starcie procesu (API / worker Celery).
+
+Porównuje ścieżkę JSON (parsowanie + walidacja pydantic + budowa indeksów)
+ze snapshotem binarnym (rules_snapshot.py: model_construct + gotowe indeksy).
+Baza jest powielana do zadanej liczby reguł, żeby przybliżyć pełny zestaw
+WCAG 2.2 + PDF/UA + Matterhorn.
+
+Uruchomienie (z katalogu backend):
+    python -m benchmarks.bench_rules_startup --rules 500 --runs 5
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+
+def build_rules_file(directory: Path, rule_count: int) -> Path:
+    """Plik reguł z `rule_count` wpisami powielonymi z wcag_rules.json"""
+    source = Path(__file__).parent.parent / "app" / "data" / "wcag_rules.json"
+    base = json.loads(source.read_text(encoding="utf-8"))["rules"]
+    rules = []
+    for i in range(rule_count):
+        rule = dict(base[i % len(base)])
+        rule["id"] = f"{rule['id']}_{i}"
+        rule["description"] = f"{rule['description']} (wariant {i})"
+        rules.append(rule)
+    path = directory / "wcag_rules.json"
+    path.write_text(json.dumps({"rules": rules}, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+def _time(func, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    from app.services.rules_service import RulesService
+    from app.services.rules_snapshot import snapshot_path, write_snapshot
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rules_file = build_rules_file(Path(tmp), args.rules)
+        json_time = _time(lambda: RulesService(rules_file), args.runs)
+        snapshot = write_snapshot(rules_file)
+        snapshot_time = _time(lambda: RulesService(rules_file), args.runs)
+
+        print(f"Baza: {args.rules} reguł, JSON {rules_file.stat().st_size / 1024:.1f} KB, "
+              f"snapshot {snapshot_path(rules_file).stat().st_size / 1024:.1f} KB")
+        print(f"  {'JSON + walidacja + indeksy':<28} {json_time * 1000:8.1f} ms")
+        print(f"  {'snapshot binarny':<28} {snapshot_time * 1000:8.1f} ms")
+        print(f"  Start {json_time / snapshot_time:.1f}x szybszy (na proces, także dziecko prefork Celery)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark serializacji i kompresji dużego raportu (domyślnie 10 000 naruszeń PDF/UA).
+
+Porównuje czas kodowania (json, orjson, jsonable_encoder + json), rozmiar
+odpowiedzi po kompresji gzip i Brotli oraz rozmiar wpisu w Redis
+(serialization.pack: msgpack + zstd/zlib).
+
+Uruchomienie (z katalogu backend):
+    python -m benchmarks.bench_serialization --rules 10000 --runs 5
+"""
+import argparse
+import gzip
+import json
+import statistics
+import time
+
+
+def build_large_report(rule_count: int) -> dict:
+    """Raport z dużą liczbą nieudanych reguł PDF/UA i rekomendacji"""
+    return {
+        "metadata": {"filename": "synthetic.pdf", "analysis_date": "2024-01-01T00:00:00"},
+        "accessibility_score": {"percentage": 12, "level": "Niski", "details": []},
+        "pdf_ua_validation": {
+            "is_compliant": False,
+            "failed_rules_count": rule_count,
+            "failed_rules": [
+                {
+                    "clause": f"7.{i % 21}",
+                    "testNumber": str(i % 7 + 1),
+                    "description": f"Zawartość nie jest oznaczona tagiem (obiekt {i})",
+                    "wcag_reference": "1.3.1",
+                    "page": i % 250 + 1
+                }
+                for i in range(rule_count)
+            ]
+        },
+        "recommendations": [
+            {"priority": "high", "issue": f"Błąd struktury {i}", "recommendation": "Otaguj dokument"}
+            for i in range(rule_count // 10)
+        ]
+    }
+
+
+def _time(func, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    from fastapi.encoders import jsonable_encoder
+
+    from app.common import serialization
+
+    report = build_large_report(args.rules)
+    print(f"Raport: {args.rules} reguł, serializer: {serialization.JSON_BACKEND}")
+
+    encoders = {
+        "json": lambda: json.dumps(report, ensure_ascii=False).encode(),
+        "jsonable_encoder+json": lambda: json.dumps(jsonable_encoder(report), ensure_ascii=False).encode(),
+        "serialization.dumps": lambda: serialization.dumps(report),
+        "serialization.pack": lambda: serialization.pack(report),
+    }
+    for name, func in encoders.items():
+        print(f"  {name:<24} {_time(func, args.runs) * 1000:8.1f} ms")
+
+    body = serialization.dumps(report)
+    sizes = {"raw": len(body), "gzip-6": len(gzip.compress(body, compresslevel=6))}
+    try:
+        import brotli
+        sizes["brotli-4"] = len(brotli.compress(body, quality=4))
+    except ImportError:
+        pass
+    sizes["redis pack"] = len(serialization.pack(report))
+    for name, size in sizes.items():
+        print(f"  {name:<24} {size / 1024:8.1f} KB")
+    print(f"  Redis: {sizes['raw'] / sizes['redis pack']:.1f}x mniej pamięci na raport niż JSON")
+
+
+if __name__ == "__main__":
+    main()
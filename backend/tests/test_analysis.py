@@ -1,6 +1,6 @@
 import pytest
 from pathlib import Path
-from app.analysis import PdfAnalysis
+from app.analysis import PdfAnalysis, parse_verapdf_report, MAX_SAMPLE_CONTEXTS
 
 # run: pytest backend/tests/ -v 
 
@@ -181,4 +181,39 @@ def test_heading_analysis_for_skipped_level():
 
     heading_info = results["heading_info"]
     assert heading_info["has_skipped_levels"] is True
-    assert any("Pominięty poziom" in issue for issue in heading_info["issues"])
\ No newline at end of file
+    assert any("Pominięty poziom" in issue for issue in heading_info["issues"])
+
+def _verapdf_rule(clause, test_number, failed_checks, pages):
+    checks = "".join(
+        f'<check status="failed"><context>root/document[0]/pages[{page}](3 0 obj PDPage)/contentStream[0]'
+        f'/operators[{n}]</context></check>'
+        for n, page in enumerate(pages)
+    )
+    return (f'<rule specification="ISO 14289-1:2014" clause="{clause}" testNumber="{test_number}" '
+            f'status="failed" failedChecks="{failed_checks}"><description>Opis {clause}</description>'
+            f'<object>SEFigure</object>{checks}</rule>')
+
+
+def test_verapdf_report_aggregated_per_clause_and_test():
+    """
+    Błędy veraPDF są agregowane per (klauzula, numer testu) z liczbą wystąpień,
+    numerami stron i ograniczoną liczbą przykładowych kontekstów.
+    """
+    xml = ('<report xmlns="http://www.verapdf.org/ValidationProfile"><details>'
+           + _verapdf_rule("7.1", "3", 2, [0, 0])
+           + _verapdf_rule("7.18.1", "2", 500, [4, 1, 4, 9, 2])
+           + _verapdf_rule("7.1", "3", 1, [6])
+           + '<rule clause="7.2" testNumber="1" status="passed" passedChecks="9"/></details></report>')
+
+    failed_rules = parse_verapdf_report(xml)
+
+    assert [(r["clause"], r["testNumber"], r["count"]) for r in failed_rules] == [("7.18.1", "2", 500), ("7.1", "3", 3)]
+    widget, figure = failed_rules
+    assert widget["pages"] == [2, 3, 5, 10]
+    assert len(widget["contexts"]) == MAX_SAMPLE_CONTEXTS
+    assert figure["pages"] == [1, 7]
+    assert figure["object"] == "SEFigure"
+
+
+def test_verapdf_report_parse_error():
+    assert "error" in parse_verapdf_report("<report><unclosed>")[0]
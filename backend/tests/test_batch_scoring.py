@@ -0,0 +1,109 @@
+import json
+import random
+import sqlite3
+
+from app.models.analysis_levels import AnalysisLevel
+from app.services import batch_scoring
+from app.services.batch_scoring import rescore
+from app.tasks import calculate_accessibility_score
+from app.tasks_enhanced import _generate_report
+
+
+def _legacy_report(rng):
+    image_count = rng.choice([0, 0, 1, 3, 7, 10])
+    headings = rng.choice([
+        {},
+        {"h1_count": 0, "has_single_h1": False, "has_skipped_levels": rng.random() < 0.5,
+         "heading_structure": rng.choice([[], [2, 3]])},
+        {"h1_count": 1, "has_single_h1": True, "has_skipped_levels": rng.random() < 0.5, "heading_structure": [1, 2]},
+        {"h1_count": 2, "has_single_h1": False, "has_skipped_levels": rng.random() < 0.5,
+         "heading_structure": rng.choice([[], [1, 1, 3]])},
+    ])
+    basic = {
+        "is_tagged": rng.random() < 0.5,
+        "contains_text": rng.random() < 0.8,
+        "is_title_defined": rng.random() < 0.5,
+        "is_lang_defined": rng.random() < 0.5,
+        "heading_info": headings,
+        "image_info": {"image_count": image_count, "images_with_alt": rng.randint(0, image_count),
+                       "images_without_alt": 0},
+    }
+    return {"basic_analysis": basic, "pdf_ua_validation": {"is_compliant": rng.random() < 0.3}}
+
+
+def _detailed_report(rng):
+    level = rng.choice([AnalysisLevel.STANDARD, AnalysisLevel.PROFESSIONAL])
+    image_count = rng.choice([0, 2, 3, 9])
+    analysis = {
+        "page_count": 3,
+        "is_tagged": rng.random() < 0.5,
+        "contains_text": rng.random() < 0.8,
+        "metadata": {"is_title_defined": rng.random() < 0.5, "is_lang_defined": rng.random() < 0.5},
+        "image_info": {"image_count": image_count, "images_with_alt": rng.randint(0, image_count)},
+        "heading_info": {},
+    }
+    if level == AnalysisLevel.PROFESSIONAL:
+        # Etap deep_scan istnieje tylko na poziomie PROFESSIONAL
+        analysis["deep_scan"] = {"tagging_details": {"structure_quality": rng.choice([0, 50, 51, 90])}}
+    failed = rng.randint(0, 40)
+    pdf_ua = rng.choice([None, {"is_compliant": failed == 0, "failed_rules_count": failed, "failed_rules": []}])
+    return _generate_report("doc.pdf", analysis, pdf_ua, level, 1024)
+
+
+def test_vectorized_scores_match_per_document_functions():
+    rng = random.Random(7)
+    legacy = [_legacy_report(rng) for _ in range(400)]
+    detailed = [_detailed_report(rng) for _ in range(400)]
+    quick = {"analysis_level": "quick", "basic_results": {}}
+    reports = [r for pair in zip(legacy, detailed) for r in pair] + [quick]
+
+    scores = rescore(reports)
+
+    for report, score in zip(reports, scores):
+        if "basic_analysis" in report:
+            expected = calculate_accessibility_score(report["basic_analysis"],
+                                                     report["pdf_ua_validation"]["is_compliant"])
+        elif report["analysis_level"] == "quick":
+            expected = None
+        else:
+            expected = report["accessibility_score"]
+        assert score == expected
+
+
+def test_cli_rescores_jsonl_and_sqlite(tmp_path):
+    rng = random.Random(1)
+    reports = [_legacy_report(rng) for _ in range(5)] + [{"analysis_level": "quick"}]
+    archive = tmp_path / "archive.jsonl"
+    archive.write_text("\n".join(json.dumps({"id": f"t{i}", "report": r}) for i, r in enumerate(reports)))
+    db = tmp_path / "archive.db"
+    with sqlite3.connect(db) as connection:
+        connection.execute("CREATE TABLE reports (task_id TEXT, report TEXT)")
+        connection.executemany("INSERT INTO reports VALUES (?, ?)",
+                               [(f"t{i}", json.dumps(r)) for i, r in enumerate(reports)])
+
+    outputs = []
+    for args in (["--batch-size", "2"], [str(db), "--id-column", "task_id"]):
+        output = tmp_path / f"out{len(outputs)}.jsonl"
+        source = [str(archive)] if args[0].startswith("--") else []
+        batch_scoring.main(source + args + ["-o", str(output)])
+        outputs.append([json.loads(line) for line in output.read_text().splitlines()])
+
+    assert outputs[0] == outputs[1]
+    assert [row["id"] for row in outputs[0]] == [f"t{i}" for i in range(5)]
+    assert outputs[0][0]["accessibility_score"] == calculate_accessibility_score(
+        reports[0]["basic_analysis"], reports[0]["pdf_ua_validation"]["is_compliant"])
+
+
+def test_unknown_stored_profile_skips_only_that_report():
+    rng = random.Random(5)
+    reports = [_legacy_report(rng) for _ in range(3)]
+    reports[1]["metadata"] = {"scoring_profile": "usuniety"}
+
+    scores = rescore(reports)
+
+    assert scores[1] is None
+    assert scores[0] == calculate_accessibility_score(
+        reports[0]["basic_analysis"], reports[0]["pdf_ua_validation"]["is_compliant"]
+    )
+    # Jawnie wybrany profil obowiązuje także dla tego raportu
+    assert rescore(reports, "classic")[1] is not None
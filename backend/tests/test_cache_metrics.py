@@ -0,0 +1,73 @@
+import time
+
+import fakeredis
+
+from app.services.cache_metrics import CacheMetrics, namespace_of, PROCESSES_KEY, PROCESS_TTL_SECONDS
+
+
+def _metrics(server) -> CacheMetrics:
+    """Instancja jak w osobnym procesie, zrzucająca liczniki przy każdym zdarzeniu"""
+    client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    metrics = CacheMetrics(lambda: client, flush_interval=0)
+    metrics.process = f"test:{id(metrics)}"
+    return metrics
+
+
+def test_namespaces_from_key_prefix():
+    assert namespace_of("pdf_analysis:v1.0:abc") == "analysis"
+    assert namespace_of("rule:wcag_1.1.1") == "rule"
+    assert namespace_of("something:else") == "other"
+
+
+def test_counters_are_aggregated_across_processes():
+    server = fakeredis.FakeServer()
+    api, worker = _metrics(server), _metrics(server)
+
+    api.incr("rule:wcag_1.1.1", "hit", tier="local")
+    api.incr("rule:wcag_1.1.1", "miss")
+    worker.incr("pdf_analysis:v1.0:abc", "hit")
+    worker.incr("pdf_analysis:v1.0:abc", "error")
+
+    snapshot = api.snapshot()
+    assert snapshot["namespaces"]["rule"]["events"] == {"local_hit": 1, "redis_miss": 1}
+    assert snapshot["namespaces"]["analysis"]["events"] == {"redis_hit": 1, "redis_error": 1}
+    assert len(snapshot["processes"]) == 2
+
+
+def test_finished_processes_are_dropped():
+    server = fakeredis.FakeServer()
+    metrics = _metrics(server)
+    client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    # Wpis procesu, który zakończył się dawno temu (restart, recykling workera)
+    client.hset(PROCESSES_KEY, "old-host:123", int(time.time() - PROCESS_TTL_SECONDS - 1))
+
+    metrics.incr("rule:x", "hit")
+
+    assert list(metrics.snapshot()["processes"]) == [metrics.process]
+    assert client.hkeys(PROCESSES_KEY) == [metrics.process]
+    assert client.ttl(PROCESSES_KEY) > 0
+
+
+def test_counters_are_kept_when_redis_is_down():
+    metrics = CacheMetrics(lambda: None, flush_interval=0)
+
+    metrics.incr("rule:x", "hit")
+    metrics.incr("rule:x", "hit")
+
+    assert metrics.snapshot()["namespaces"]["rule"]["events"] == {"redis_hit": 2}
+
+
+def test_prometheus_exposition_with_latency_histogram():
+    metrics = _metrics(fakeredis.FakeServer())
+    metrics.incr("rule:x", "hit")
+    metrics.observe("rule:x", "get", 0.0007)
+    metrics.observe("rule:x", "get", 0.02)
+    metrics.observe("rule:x", "get", 9.0)
+
+    text = metrics.render_prometheus()
+
+    assert 'pdf_audit_cache_events_total{namespace="rule",tier="redis",event="hit"} 1' in text
+    assert 'pdf_audit_cache_operation_seconds_bucket{namespace="rule",operation="get",le="0.001"} 1' in text
+    assert 'pdf_audit_cache_operation_seconds_bucket{namespace="rule",operation="get",le="0.025"} 2' in text
+    assert 'pdf_audit_cache_operation_seconds_bucket{namespace="rule",operation="get",le="+Inf"} 3' in text
+    assert 'pdf_audit_cache_operation_seconds_count{namespace="rule",operation="get"} 3' in text
@@ -0,0 +1,126 @@
+import pytest
+
+from app.services import fingerprints, stage_cache
+from app.services.stage_cache import StagedAnalysis, stage_fingerprint
+
+
+def _namespace(source: str):
+    namespace = {}
+    exec(compile(source, "<test>", "exec"), namespace)
+    return namespace["compute"]
+
+
+@pytest.fixture
+def fresh_stage_fingerprints():
+    stage_cache._code_fingerprint.cache_clear()
+    yield
+    stage_cache._code_fingerprint.cache_clear()
+
+
+def test_source_fingerprint_changes_with_code():
+    v1 = _namespace("def compute(x):\n    return x + 1\n")
+    v2 = _namespace("def compute(x):\n    return x + 2\n")
+
+    assert fingerprints.source_fingerprint(v1) == fingerprints.source_fingerprint(v1)
+    assert fingerprints.source_fingerprint(v1) != fingerprints.source_fingerprint(v2)
+    assert len(fingerprints.source_fingerprint(v1)) == fingerprints.FINGERPRINT_LENGTH
+
+
+def test_changed_helper_in_analyzer_module_invalidates_its_stages(tmp_path, monkeypatch, fresh_stage_fingerprints):
+    """Odcisk obejmuje cały moduł - także funkcje pomocnicze, których nie wymieniono z nazwy"""
+    import importlib.util
+    import linecache
+
+    module_file = tmp_path / "analyzer_helpers.py"
+    module_file.write_text("def helper():\n    return 1\n")
+    spec = importlib.util.spec_from_file_location("analyzer_helpers", module_file)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.setitem(stage_cache.STAGE_DEPENDENCIES, "metadata",
+                        stage_cache.STAGE_DEPENDENCIES["metadata"] + (module,))
+    before = stage_cache.all_stage_fingerprints()
+
+    module_file.write_text("def helper():\n    return 2\n")
+    linecache.checkcache(str(module_file))
+    stage_cache._code_fingerprint.cache_clear()
+    after = stage_cache.all_stage_fingerprints()
+
+    assert after["metadata"] != before["metadata"]
+    assert {s: fp for s, fp in after.items() if s != "metadata"} == \
+        {s: fp for s, fp in before.items() if s != "metadata"}
+
+
+def test_verapdf_version_change_invalidates_validation_only(monkeypatch, fresh_stage_fingerprints):
+    monkeypatch.setitem(fingerprints._components, "verapdf", lambda: "1.24.1")
+    before = stage_cache.all_stage_fingerprints()
+    monkeypatch.setitem(fingerprints._components, "verapdf", lambda: "1.26.2")
+    after = stage_cache.all_stage_fingerprints()
+
+    assert after["validation"] != before["validation"]
+    assert after["basic"] == before["basic"]
+
+
+def test_unknown_verapdf_version_disables_caching(monkeypatch, fresh_stage_fingerprints):
+    from app.tasks import analysis_fingerprint
+
+    monkeypatch.setitem(fingerprints._components, "verapdf", lambda: fingerprints.UNKNOWN_VERSION)
+
+    assert stage_fingerprint("validation") is None
+    assert analysis_fingerprint() is None
+    assert stage_fingerprint("basic") is not None
+
+
+def test_verapdf_version_env_override(monkeypatch):
+    fingerprints.reset_verapdf_version()
+    monkeypatch.setenv("VERAPDF_VERSION", "veraPDF 1.26.2")
+    try:
+        assert fingerprints.verapdf_version() == "veraPDF 1.26.2"
+    finally:
+        fingerprints.reset_verapdf_version()
+
+
+def test_unknown_verapdf_version_is_not_kept_for_process_lifetime(monkeypatch):
+    fingerprints.reset_verapdf_version()
+    versions = iter([None, "veraPDF 1.26.2"])
+    monkeypatch.setattr(fingerprints, "_read_verapdf_version", lambda: next(versions))
+    try:
+        # Kontener niedostępny - kolejne wywołania nie uruchamiają `docker exec` od razu
+        assert fingerprints.verapdf_version() == "unknown"
+        assert fingerprints.verapdf_version() == "unknown"
+
+        monkeypatch.setattr(fingerprints, "VERAPDF_VERSION_RETRY_SECONDS", 0)
+        fingerprints._verapdf_retry_at = 0.0
+        assert fingerprints.verapdf_version() == "veraPDF 1.26.2"
+        assert fingerprints.verapdf_version() == "veraPDF 1.26.2"
+    finally:
+        fingerprints.reset_verapdf_version()
+
+
+def test_rules_version_follows_rules_file(tmp_path, monkeypatch):
+    rules_file = tmp_path / "rules.json"
+    rules_file.write_text('{"rules": []}')
+    monkeypatch.setattr(fingerprints, "RULES_FILE", str(rules_file))
+    first = fingerprints.rules_file_version()
+    rules_file.write_text('{"rules": [{"id": "wcag_1.1.1"}]}')
+
+    assert fingerprints.rules_file_version() != first
+
+
+def test_stage_keys_embed_fingerprints(monkeypatch):
+    monkeypatch.setitem(fingerprints._components, "verapdf", lambda: "1.26.2")
+    staged = StagedAnalysis(b"%PDF-1.7 test")
+
+    assert staged.stage_key("images").endswith(f":images:{stage_fingerprint('images')}")
+    assert staged.stage_key("validation").startswith("validation:")
+    # Etap "basic" jest wspólny dla wszystkich poziomów - bez parametru limitu stron
+    assert staged.stage_key("basic").endswith(f":basic:{stage_fingerprint('basic')}")
+
+
+def test_analysis_key_includes_fingerprint(monkeypatch):
+    from app.services.redis_client import RedisClient
+    from app.tasks import analysis_fingerprint
+
+    monkeypatch.setitem(fingerprints._components, "verapdf", lambda: "1.26.2")
+    key = RedisClient().generate_file_key(b"%PDF", analysis_fingerprint())
+
+    assert key.split(":")[2] == analysis_fingerprint()
@@ -0,0 +1,147 @@
+import pytest
+
+from app.services.knowledge_base import KnowledgeBaseCache
+
+
+class FakeQuery:
+    def __init__(self, db):
+        self.db = db
+        self.filters = []
+        self.window = None
+
+    def select(self, columns):
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda row: row.get(column) in values)
+        self.db.calls.append(("in", tuple(sorted(values))))
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] > value)
+        self.db.calls.append(("gt", value))
+        return self
+
+    def range(self, start, end):
+        self.window = (start, end)
+        self.db.calls.append(("range", start, end))
+        return self
+
+    def execute(self):
+        if self.db.down:
+            raise ConnectionError("supabase down")
+        rows = [row for row in self.db.rows if all(f(row) for f in self.filters)]
+        if self.window:
+            rows = rows[self.window[0]:self.window[1] + 1]
+        return type("Response", (), {"data": [dict(row) for row in rows]})()
+
+
+class FakeSupabase:
+    """Lokalny odpowiednik klienta Supabase (table().select()...execute())"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+        self.down = False
+
+    def table(self, name):
+        assert name == "knowledge_base_rules"
+        return FakeQuery(self)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _row(rule_id, updated_at="2024-01-01T00:00:00", title="Tytuł"):
+    return {"rule_id": rule_id, "title": title, "updated_at": updated_at}
+
+
+@pytest.fixture
+def db():
+    return FakeSupabase([_row("7.1-1"), _row("7.1-2"), _row("7.2-1")])
+
+
+def test_preloaded_entries_are_served_without_queries(db):
+    cache = KnowledgeBaseCache(db, ttl=60, clock=FakeClock())
+    assert cache.preload()
+    db.calls.clear()
+
+    entries = cache.get_many(["7.1-1", "7.2-1"])
+
+    assert set(entries) == {"7.1-1", "7.2-1"}
+    assert db.calls == []
+
+
+def test_preload_pages_through_table(db, monkeypatch):
+    monkeypatch.setattr("app.services.knowledge_base.PAGE_SIZE", 2)
+    cache = KnowledgeBaseCache(db, clock=FakeClock())
+
+    cache.preload()
+
+    assert cache.stats()["entries"] == 3
+    assert [c for c in db.calls if c[0] == "range"] == [("range", 0, 1), ("range", 2, 3)]
+
+
+def test_miss_falls_back_to_live_query_once(db):
+    cache = KnowledgeBaseCache(db, ttl=60, clock=FakeClock())
+    cache.preload()
+    db.rows.append(_row("7.18.1-2"))
+    db.calls.clear()
+
+    assert "7.18.1-2" in cache.get_many(["7.1-1", "7.18.1-2", "9.9-9"])
+    assert db.calls == [("in", ("7.18.1-2", "9.9-9"))]
+    # Znalezione i nieistniejące ID są zapamiętane - bez kolejnych zapytań
+    cache.get_many(["7.18.1-2", "9.9-9"])
+    assert len(db.calls) == 1
+
+
+def test_refresh_after_ttl_fetches_only_changed_rows(db):
+    clock = FakeClock()
+    cache = KnowledgeBaseCache(db, ttl=60, clock=clock)
+    cache.preload()
+    db.rows[0] = _row("7.1-1", updated_at="2024-02-01T00:00:00", title="Nowy tytuł")
+    db.calls.clear()
+
+    clock.now = 61
+    entries = cache.get_many(["7.1-1"])
+
+    assert entries["7.1-1"]["title"] == "Nowy tytuł"
+    assert db.calls == [("gt", "2024-01-01T00:00:00")]
+    assert cache.stats()["watermark"] == "2024-02-01T00:00:00"
+
+
+def test_supabase_outage_serves_local_copy(db):
+    clock = FakeClock()
+    cache = KnowledgeBaseCache(db, ttl=60, clock=clock)
+    cache.preload()
+    db.down = True
+    clock.now = 61
+
+    entries = cache.get_many(["7.1-1", "8.1-1"])
+
+    assert set(entries) == {"7.1-1"}
+    assert cache.stats()["errors"] >= 1
+
+
+def test_enriched_report_uses_cached_knowledge_base(db, monkeypatch):
+    from app import tasks
+
+    db.rows.append({"rule_id": "7.1-3", "title": "Brak tagów", "explanation_what": "Treść nieotagowana",
+                    "wcag_reference": "WCAG 1.3.1", "severity": "high", "updated_at": "2024-01-01T00:00:00"})
+    cache = KnowledgeBaseCache(db, clock=FakeClock())
+    cache.preload()
+    monkeypatch.setattr(tasks, "knowledge_base", cache)
+    db.calls.clear()
+
+    report = tasks.build_enriched_legacy_report(
+        {"is_tagged": True}, [{"clause": "7.1", "testNumber": "3", "description": "x"}], db
+    )
+
+    assert db.calls == []
+    assert report["enhanced_failed_rules"][0]["wcag_reference"] == "WCAG 1.3.1"
+    assert report["knowledge_base_used"] is True
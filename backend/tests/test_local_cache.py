@@ -0,0 +1,85 @@
+import time
+
+import fakeredis
+
+from app.common.local_cache import LocalCache
+from app.services.redis_client import RedisClient
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction_respects_byte_budget():
+    cache = LocalCache(max_bytes=800)
+    for i in range(10):
+        cache.set(f"k{i}", i, size=100)
+    cache.get("k2")  # k2 staje się najświeższym wpisem
+    cache.set("k10", 10, size=100)
+
+    stats = cache.stats()
+    assert stats["bytes"] <= 800
+    assert cache.get("k2") == 2
+    assert cache.get("k0") is None
+    assert stats["evictions"] == 3
+
+
+def test_entries_expire_and_oversized_values_are_skipped():
+    clock = FakeClock()
+    cache = LocalCache(max_bytes=1000, ttl=60, clock=clock)
+
+    assert cache.set("short", "v", size=10, ttl=5)
+    assert not cache.set("huge", "v", size=500)
+    clock.now += 6
+
+    assert cache.get("short") is None
+
+
+def test_pattern_invalidation():
+    cache = LocalCache()
+    cache.set("rule:wcag_1.1.1", 1, size=1)
+    cache.set("rule:wcag_1.4.3", 2, size=1)
+    cache.set("pdf_analysis:v1.0:abc", 3, size=1)
+
+    assert cache.invalidate("rule:*") == 2
+    assert cache.get("pdf_analysis:v1.0:abc") == 3
+
+
+def _process(server) -> RedisClient:
+    """Instancja RedisClient jak w osobnym procesie API/workera"""
+    instance = RedisClient()
+    instance.client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    instance.raw_client = fakeredis.FakeRedis(server=server)
+    instance.breaker.record_success()
+    return instance
+
+
+def test_hot_reads_are_served_from_process_memory():
+    server = fakeredis.FakeServer()
+    cache = _process(server)
+    cache.set_cache("rule:wcag_1.1.1", {"id": "wcag_1.1.1"})
+    cache.raw_client = None  # każde odwołanie do Redis zakończyłoby się błędem
+
+    assert cache.get_cache("rule:wcag_1.1.1") == {"id": "wcag_1.1.1"}
+    tiers = cache.get_metrics()["tiers"]
+    assert tiers["local"]["hits"] == 1
+    assert tiers["redis"]["hits"] == 0
+
+
+def test_invalidation_propagates_to_other_processes():
+    server = fakeredis.FakeServer()
+    api, worker = _process(server), _process(server)
+    worker.set_cache("rule:wcag_1.1.1", {"v": 1})
+    assert api.get_cache("rule:wcag_1.1.1") == {"v": 1}
+
+    worker.set_cache("rule:wcag_1.1.1", {"v": 2})
+
+    deadline = time.monotonic() + 3
+    while api.get_cache("rule:wcag_1.1.1") != {"v": 2} and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert api.get_cache("rule:wcag_1.1.1") == {"v": 2}
+    assert api.get_metrics()["tiers"]["redis"]["hits"] == 2
@@ -0,0 +1,124 @@
+from app.services.findings import FINDING_RULES
+from app.services.recommendations import recommendation_engine
+from app.tasks import build_enriched_legacy_report, generate_recommendations
+from app.tasks_enhanced import _generate_recommendations, _standard_failed_rules, STANDARD_MAX_FAILED_RULES
+
+LEGACY_ANALYSIS = {
+    "is_tagged": False,
+    "contains_text": True,
+    "is_title_defined": False,
+    "is_lang_defined": True,
+    "heading_info": {},
+    "image_info": {"image_count": 3, "images_with_alt": 2, "images_without_alt": 1},
+}
+
+
+def test_static_templates_are_prerendered_and_not_shared():
+    first = generate_recommendations(LEGACY_ANALYSIS, [])
+    untagged = next(r for r in first if r["category"] == "structure")
+    # Zmiana rekomendacji w jednym raporcie nie może wyciec do kolejnych
+    untagged["issue"] = "zmienione"
+    second = generate_recommendations(LEGACY_ANALYSIS, [])
+
+    assert next(r for r in second if r["category"] == "structure")["issue"] == "Brak tagów struktury"
+    assert recommendation_engine.templates["pl"]["untagged"].static is not None
+    assert [r["priority"] for r in first] == ["high", "high", "medium"]
+
+
+def test_both_pipelines_share_templates():
+    enhanced_analysis = {
+        "is_tagged": False,
+        "contains_text": True,
+        "is_title_defined": False,
+        "is_lang_defined": True,
+        "metadata": {"is_title_defined": False, "is_lang_defined": True},
+        "image_info": {"image_count": 3, "images_with_alt": 2, "images_without_alt": 1},
+        "quick_metrics": {"is_scanned_pdf": False},
+    }
+
+    assert _generate_recommendations(enhanced_analysis, None) == generate_recommendations(LEGACY_ANALYSIS, [])
+
+
+def test_locale_variants_and_plural_forms():
+    english = generate_recommendations(LEGACY_ANALYSIS, [], locale="en")
+    images = next(r for r in english if r["category"] == "images")
+
+    assert images["issue"] == "1 image is missing alternative text"
+    assert images["wcag_reference"] == "WCAG 1.1.1"
+    # Nieznany język - teksty domyślne (polskie)
+    assert generate_recommendations(LEGACY_ANALYSIS, [], locale="xx") == generate_recommendations(LEGACY_ANALYSIS, [])
+    for templates in recommendation_engine.templates.values():
+        assert set(FINDING_RULES) <= set(templates)
+
+
+def test_failed_rules_beyond_three_are_summarized():
+    failed_rules = [{"clause": "7.1", "testNumber": str(n), "description": "x"} for n in range(5)]
+    analysis = {**LEGACY_ANALYSIS, "is_tagged": True, "is_title_defined": True, "image_info": {}}
+
+    recommendations = generate_recommendations(analysis, failed_rules)
+
+    assert sum(r["issue"].startswith("Naruszenie PDF/UA") for r in recommendations) == 3
+    assert recommendations[-1]["issue"] == "Pozostałe 2 błędy zgodności PDF/UA"
+
+
+def test_recommendations_keep_baseline_triggers():
+    """Warunki jak w rekomendacjach sprzed szablonów (brak danych = niespełnione wymaganie)"""
+    issues = [r["issue"] for r in generate_recommendations(
+        {"contains_text": False, "heading_info": {"h1_count": 0}, "image_info": {"image_count": 2}}, []
+    )]
+    assert issues == [
+        "Brak tagów struktury", "Dokument zeskanowany bez warstwy tekstowej", "Brak tytułu dokumentu",
+        "Niezdefiniowany język dokumentu", "Brak głównego nagłówka H1",
+    ]
+
+    # Brak tekstu bez obrazów nie daje osobnej rekomendacji
+    no_text = {**LEGACY_ANALYSIS, "is_tagged": True, "is_title_defined": True, "contains_text": False, "image_info": {}}
+    assert [r["priority"] for r in generate_recommendations(no_text, [])] == ["info"]
+
+
+def test_enhanced_recommendations_do_not_list_pdf_ua_failures():
+    analysis = {"is_tagged": True, "contains_text": True,
+                "metadata": {"is_title_defined": True, "is_lang_defined": True}}
+    pdf_ua = {"failed_rules_count": 1, "failed_rules": [{"clause": "7.1", "testNumber": "1", "description": "x"}]}
+
+    assert [r["priority"] for r in _generate_recommendations(analysis, pdf_ua)] == ["info"]
+
+
+def test_knowledge_base_recommendations_sorted_by_severity(monkeypatch):
+    from app import tasks
+
+    entries = {"7.1-1": {"rule_id": "7.1-1", "severity": "high", "title": "Tagi", "explanation_why": "Dlaczego",
+                         "solution_how": "Jak", "wcag_reference": "WCAG 1.3.1"}}
+    monkeypatch.setattr(tasks.knowledge_base, "get_many", lambda ids, client=None: entries)
+    failed_rules = [
+        {"clause": "7.18", "testNumber": "2", "description": "Pole", "wcag_criteria": ["wcag_4.1.2"]},
+        {"clause": "7.1", "testNumber": "1", "description": "Tag"},
+    ]
+    analysis = {**LEGACY_ANALYSIS, "is_tagged": True, "is_title_defined": True, "image_info": {}}
+
+    result = build_enriched_legacy_report(analysis, failed_rules, supabase_client=object())
+
+    assert [r["issue"] for r in result["enhanced_recommendations"]] == [
+        "Dlaczego", "Błąd techniczny (kod: 7.18-2) - brak opisu w bazie wiedzy"
+    ]
+    assert result["enhanced_recommendations"][1]["wcag_reference"] == "wcag_4.1.2"
+    assert result["enhanced_failed_rules"][0]["wcag_reference"] == "wcag_4.1.2"
+    assert result["enhanced_failed_rules"][1]["description"] == "Tagi: Tag"
+
+
+def test_standard_report_keeps_most_frequent_rules_without_contexts():
+    failed_rules = [
+        {"clause": "7.1", "testNumber": str(n), "description": "Brak tagu", "count": 10 - n, "pages": [1],
+         "contexts": ["root/document[0]/pages[0]"]}
+        for n in range(8)
+    ]
+    analysis = {**LEGACY_ANALYSIS, "is_tagged": True, "is_title_defined": True, "image_info": {}}
+
+    compact = _standard_failed_rules(failed_rules)
+    recommendations = generate_recommendations(analysis, failed_rules)
+
+    assert [rule["count"] for rule in compact] == [10, 9, 8, 7, 6]
+    assert len(compact) == STANDARD_MAX_FAILED_RULES
+    assert all("contexts" not in rule and rule["pages"] == [1] for rule in compact)
+    assert recommendations[0]["issue"] == "Naruszenie PDF/UA: Brak tagu (wystąpienia: 10)"
+    assert recommendations[-1]["issue"] == "Pozostałe 5 błędy zgodności PDF/UA"
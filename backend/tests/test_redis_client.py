@@ -0,0 +1,244 @@
+import time
+
+import fakeredis
+import redis
+
+from app.common.circuit_breaker import CircuitBreaker
+from app.services.redis_client import RedisClient
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingRedis(fakeredis.FakeRedis):
+    """fakeredis liczący wywołania PING"""
+    pings = 0
+
+    def ping(self, *args, **kwargs):
+        CountingRedis.pings += 1
+        return super().ping(*args, **kwargs)
+
+
+class DownRedis:
+    """Klient Redis, którego każde wywołanie kończy się błędem połączenia"""
+    def __init__(self):
+        self.calls = 0
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls += 1
+            raise redis.ConnectionError("Connection refused")
+        return call
+
+
+def _client(client, raw_client=None, clock=None) -> RedisClient:
+    instance = RedisClient()
+    instance.client = client
+    instance.raw_client = raw_client or client
+    instance.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock or FakeClock())
+    instance._last_healthy_at = 0.0
+    return instance
+
+
+def test_healthy_cache_path_does_not_ping_per_call():
+    server = fakeredis.FakeServer()
+    CountingRedis.pings = 0
+    cache = _client(CountingRedis(server=server, decode_responses=True), fakeredis.FakeRedis(server=server))
+
+    for i in range(20):
+        cache.set_cache(f"k{i}", {"i": i})
+        assert cache.get_cache(f"k{i}") == {"i": i}
+
+    # Tylko jedno sprawdzenie stanu na początku - kolejne operacje same potwierdzają zdrowie
+    assert CountingRedis.pings == 1
+
+
+def test_breaker_opens_and_fails_fast_when_redis_is_down():
+    down = DownRedis()
+    cache = _client(down)
+
+    for _ in range(10):
+        assert cache.get_cache("k") is None
+        assert cache.set_cache("k", 1) is False
+
+    assert cache.breaker.state == CircuitBreaker.OPEN
+    # Po otwarciu obwodu Redis nie jest już w ogóle odpytywany
+    assert down.calls == 3
+    assert cache.get_metrics()["circuit_breaker"]["state"] == "open"
+
+
+def test_breaker_recovers_after_reset_timeout():
+    clock = FakeClock()
+    server = fakeredis.FakeServer()
+    healthy = fakeredis.FakeRedis(server=server, decode_responses=True)
+    cache = _client(DownRedis(), clock=clock)
+    for _ in range(3):
+        cache.get_cache("k")
+    assert cache.breaker.state == CircuitBreaker.OPEN
+
+    # Redis wraca; po reset_timeout jedno wywołanie próbne zamyka obwód
+    cache.client = healthy
+    cache.raw_client = fakeredis.FakeRedis(server=server)
+    assert cache.is_available() is False
+    clock.now += 31
+    assert cache.breaker.state == CircuitBreaker.HALF_OPEN
+
+    assert cache.set_cache("k", {"ok": True}) is True
+    assert cache.breaker.state == CircuitBreaker.CLOSED
+    assert cache.get_cache("k") == {"ok": True}
+
+
+def test_failed_half_open_trial_reopens_circuit():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.allow_request()
+
+    clock.now += 10
+    assert breaker.allow_request()
+    # Tylko jedno wywołanie próbne naraz
+    assert not breaker.allow_request()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.snapshot()["opened"] == 2
+
+
+class MisconfiguredRedis(fakeredis.FakeRedis):
+    """Redis odpowiadający błędem serwera (ResponseError), a nie błędem połączenia"""
+    def ping(self, *args, **kwargs):
+        raise redis.ResponseError("MISCONF Redis is configured to save RDB snapshots")
+
+
+def test_non_connection_error_during_trial_closes_out_half_open_state():
+    clock = FakeClock()
+    cache = _client(DownRedis(), clock=clock)
+    for _ in range(3):
+        cache.get_cache("k")
+    assert cache.breaker.state == CircuitBreaker.OPEN
+
+    # Próbny PING kończy się błędem innym niż błąd połączenia - obwód wraca do stanu open
+    cache.client = MisconfiguredRedis(decode_responses=True)
+    clock.now += 31
+    assert cache.is_available() is False
+    assert cache.breaker.state == CircuitBreaker.OPEN
+
+    # ...a po kolejnym reset_timeout następna próba jest znowu dopuszczona
+    cache.client = fakeredis.FakeRedis(decode_responses=True)
+    clock.now += 31
+    assert cache.is_available() is True
+    assert cache.breaker.state == CircuitBreaker.CLOSED
+
+
+def _healthy_cache():
+    server = fakeredis.FakeServer()
+    return _client(fakeredis.FakeRedis(server=server, decode_responses=True), fakeredis.FakeRedis(server=server))
+
+
+def test_invalidate_uses_scan_batches_and_reports_progress():
+    cache = _healthy_cache()
+    for i in range(1200):
+        cache.client.set(f"pdf_analysis:v1.0:{i}", "x")
+    cache.client.set("celery-task-meta-abc", "keep")
+    progress = []
+
+    deleted = cache.invalidate_cache(progress=lambda scanned, removed: progress.append((scanned, removed)))
+
+    assert deleted == 1200
+    assert len(progress) >= 3
+    assert progress[-1] == (1200, 1200)
+    assert cache.client.get("celery-task-meta-abc") == "keep"
+
+
+def test_only_cache_namespaces_are_clearable():
+    cache = _healthy_cache()
+
+    assert cache.is_safe_pattern("pdf_analysis:v1.0:*")
+    assert cache.is_safe_pattern("rule:wcag_1.1.*")
+    assert not cache.is_safe_pattern("*")
+    assert not cache.is_safe_pattern("celery-task-meta-*")
+    assert not cache.is_safe_pattern("webhook:*")
+    assert not cache.is_safe_pattern("pdf_analysis:[a-z]*")
+
+
+def test_cleanup_caps_ttl_without_reading_values():
+    cache = _healthy_cache()
+    cache.client.setex("pdf_analysis:v1.0:long", 7 * 24 * 3600, "x")
+    cache.client.setex("pdf_analysis:v1.0:short", 60, "x")
+    cache.client.set("pdf_analysis:v1.0:no-ttl", "x")
+
+    cache.cleanup_old_cache(max_age_hours=1)
+
+    assert cache.client.ttl("pdf_analysis:v1.0:long") <= 3600
+    assert cache.client.ttl("pdf_analysis:v1.0:short") <= 60
+    # Wpis bez TTL (fakeredis nie zna OBJECT IDLETIME) dostaje TTL zamiast zostać na zawsze
+    assert 0 < cache.client.ttl("pdf_analysis:v1.0:no-ttl") <= 3600
+
+
+def _process(server) -> RedisClient:
+    """Osobna instancja (jak inny worker Celery) współdzieląca serwer Redis"""
+    instance = _client(fakeredis.FakeRedis(server=server, decode_responses=True), fakeredis.FakeRedis(server=server))
+    instance.local_cache.max_bytes = 0  # bez warstwy lokalnej - testujemy koordynację przez Redis
+    return instance
+
+
+def test_concurrent_misses_trigger_single_recompute():
+    import threading
+
+    server = fakeredis.FakeServer()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.3)
+        return {"score": 90}
+
+    results = []
+    workers = [
+        threading.Thread(target=lambda c=_process(server): results.append(c.get_or_compute("pdf_analysis:v1.0:hot", compute)))
+        for _ in range(8)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(calls) == 1
+    assert results == [{"score": 90}] * 8
+
+
+def test_stale_value_served_while_another_process_recomputes(monkeypatch):
+    server = fakeredis.FakeServer()
+    owner, reader = _process(server), _process(server)
+    owner.set_cache("pdf_analysis:v1.0:doc", {"v": 1}, expire=60)
+    # Wpis wygasł logicznie, ale jest w oknie łaski; blokadę trzyma inny proces
+    monkeypatch.setattr(time, "time", lambda real=time.time: real() + 120)
+    owner._acquire_lock("pdf_analysis:v1.0:doc")
+
+    value = reader.get_or_compute("pdf_analysis:v1.0:doc", lambda: {"v": 2})
+
+    assert value == {"v": 1}
+    assert reader.metrics["stale_served"] == 1
+    assert reader.metrics["recomputes"] == 0
+
+
+def test_expensive_entries_are_refreshed_before_expiry(monkeypatch):
+    import random
+
+    monkeypatch.setattr(random, "random", lambda: 0.5)
+    server = fakeredis.FakeServer()
+    cache = _process(server)
+    cache.set_cache("pdf_analysis:v1.0:doc", {"v": 1}, expire=60, compute_time=1000.0)
+
+    # Przeliczenie trwa dłużej niż pozostały czas życia - odświeżamy zawczasu
+    value = cache.get_or_compute("pdf_analysis:v1.0:doc", lambda: {"v": 2})
+
+    assert value == {"v": 2}
+    assert cache.metrics["recomputes"] == 1
+    assert not cache.client.exists("lock:pdf_analysis:v1.0:doc")
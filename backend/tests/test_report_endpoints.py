@@ -0,0 +1,73 @@
+import json
+
+import fakeredis
+import pytest
+from fakeredis import aioredis as fake_aioredis
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.task_status import task_status_watcher, TASK_META_PREFIX
+from app.services.report_renderer import report_renderer
+
+REPORT = {
+    "metadata": {"filename": "doc.pdf", "analysis_date": "2024-05-01T10:00:00"},
+    "accessibility_score": {"percentage": 80, "level": "Średni", "details": []},
+    "recommendations": []
+}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    server = fakeredis.FakeServer()
+    sync_redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+    sync_redis.set(f"{TASK_META_PREFIX}done", json.dumps({
+        "status": "SUCCESS", "result": REPORT, "task_id": "done", "date_done": "2024-05-01T10:00:05"
+    }))
+    sync_redis.set(f"{TASK_META_PREFIX}clear-job", json.dumps({
+        "status": "PROGRESS", "result": {"pattern": None, "scanned": 1500, "deleted": 1400}, "task_id": "clear-job"
+    }))
+    monkeypatch.setattr(task_status_watcher, "client", fake_aioredis.FakeRedis(server=server, decode_responses=True))
+    monkeypatch.setattr(report_renderer, "cache_dir", tmp_path)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_report_rendered_from_stored_result(client):
+    response = client.get("/report/done/html")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/html")
+    assert "doc.pdf" in response.text
+    assert response.headers["etag"]
+    assert "max-age" in response.headers["cache-control"]
+    # Raporty z audytu nie mogą trafiać do współdzielonych cache (proxy, CDN)
+    assert response.headers["cache-control"].startswith("private")
+
+
+def test_conditional_get_returns_not_modified(client):
+    etag = client.get("/report/done/json").headers["etag"]
+
+    response = client.get("/report/done/json", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    # Słaby ETag z odpowiedzi skompresowanej też pasuje
+    assert client.get("/report/done/json", headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+    # ETag zależy od formatu
+    assert client.get("/report/done/html").headers["etag"] != etag
+
+
+def test_missing_report_returns_404(client):
+    assert client.get("/report/unknown/json").status_code == 404
+
+
+def test_cache_clear_rejects_patterns_outside_cache(client):
+    response = client.delete("/cache/clear", params={"pattern": "celery-task-meta-*"})
+
+    assert response.status_code == 400
+
+
+def test_cache_clear_job_progress(client):
+    response = client.get("/cache/clear/clear-job")
+
+    assert response.json() == {"job_id": "clear-job", "status": "PROGRESS", "pattern": None, "scanned": 1500, "deleted": 1400}
@@ -0,0 +1,170 @@
+import asyncio
+import json
+
+from app.services.report_renderer import (
+    ReportRenderer, report_hash, render_report, generate_html_report, iter_html_report
+)
+
+REPORT = {
+    "metadata": {"filename": "doc.pdf", "analysis_date": "2024-05-01T10:00:00"},
+    "accessibility_score": {
+        "percentage": 55,
+        "level": "Niski",
+        "details": [{"criterion": "Dokument otagowany", "points": 0, "max": 15}]
+    },
+    "recommendations": [{"priority": "high", "issue": "Brak tagów", "recommendation": "Dodaj tagi"}]
+}
+
+
+def test_report_hash_ignores_key_order():
+    reordered = json.loads(json.dumps(REPORT))
+    reordered = {k: reordered[k] for k in reversed(list(reordered))}
+    assert report_hash(REPORT) == report_hash(reordered)
+
+
+def test_render_is_cached_per_report_and_format(tmp_path):
+    """Drugie pobranie tego samego raportu jest serwowane z dysku, bez ponownego renderowania"""
+    renderer = ReportRenderer(cache_dir=str(tmp_path), max_workers=1)
+
+    async def scenario():
+        first = await renderer.render(REPORT, "html")
+        second = await renderer.render(REPORT, "html")
+        as_json = await renderer.render(REPORT, "json")
+        return first, second, as_json
+
+    try:
+        first, second, as_json = asyncio.run(scenario())
+    finally:
+        renderer.shutdown()
+
+    assert first == second
+    assert b"Brak tag" in first
+    assert json.loads(as_json) == REPORT
+    assert renderer.metrics == {"renders": 2, "cache_hits": 1}
+    assert sorted(p.suffix for p in tmp_path.iterdir()) == [".html", ".json"]
+
+
+def test_concurrent_downloads_share_one_render(tmp_path):
+    renderer = ReportRenderer(cache_dir=str(tmp_path), max_workers=1)
+
+    async def scenario():
+        return await asyncio.gather(*[renderer.render(REPORT, "html") for _ in range(5)])
+
+    try:
+        results = asyncio.run(scenario())
+    finally:
+        renderer.shutdown()
+
+    assert len(set(results)) == 1
+    assert renderer.metrics["renders"] == 1
+
+
+def test_cancelled_render_does_not_hang_waiters(tmp_path, monkeypatch):
+    """Anulowanie prowadzącego żądania nie zawiesza oczekujących - przejmują renderowanie"""
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from app.services import report_renderer as module
+
+    release = threading.Event()
+
+    def slow_render(report_data, format, pdf_renderer):
+        release.wait(5)
+        time.sleep(0.01)
+        return b"rendered"
+
+    monkeypatch.setattr(module, "render_report", slow_render)
+    renderer = ReportRenderer(cache_dir=str(tmp_path), max_workers=1)
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(renderer, "_get_pool", lambda: pool)
+
+    async def scenario():
+        leader = asyncio.create_task(renderer.render(REPORT, "html"))
+        await asyncio.sleep(0.05)
+        waiter = asyncio.create_task(renderer.render(REPORT, "html"))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        result = await asyncio.wait_for(waiter, timeout=5)
+        return leader, result
+
+    try:
+        leader, result = asyncio.run(scenario())
+    finally:
+        pool.shutdown(wait=True)
+
+    assert leader.cancelled()
+    assert result == b"rendered"
+    assert renderer._in_flight == {}
+
+
+def test_default_pdf_renderer_is_tagged_weasyprint(tmp_path, monkeypatch):
+    monkeypatch.delenv("REPORT_PDF_RENDERER", raising=False)
+
+    assert ReportRenderer(cache_dir=str(tmp_path)).pdf_renderer == "weasyprint"
+
+
+def test_pymupdf_renderer_produces_pdf_with_title_and_language():
+    """Alternatywny silnik PDF (PyMuPDF) nie wymaga WeasyPrint i ustawia tytuł oraz język"""
+    import pymupdf as fitz
+
+    pdf_bytes = render_report(REPORT, "pdf", pdf_renderer="pymupdf")
+
+    doc = fitz.open("pdf", pdf_bytes)
+    try:
+        assert doc.metadata["title"] == "Raport Dostępności PDF"
+        assert doc.xref_get_key(doc.pdf_catalog(), "Lang")[1] == "pl-PL"
+        assert "doc.pdf" in doc[0].get_text()
+    finally:
+        doc.close()
+
+
+def test_html_report_escapes_values():
+    report = {**REPORT, "metadata": {"filename": "<script>alert(1)</script>.pdf"}}
+
+    html = generate_html_report(report)
+
+    assert "<script>alert" not in html
+    assert "&lt;script&gt;alert(1)&lt;/script&gt;.pdf" in html
+
+
+def test_html_report_includes_pdf_ua_and_deep_scan_sections():
+    report = {
+        **REPORT,
+        "pdf_ua_validation": {
+            "is_compliant": False,
+            "failed_rules_count": 1,
+            "failed_rules": [{"clause": "7.1", "testNumber": "3", "description": "Brak tagu Figure"}]
+        },
+        "deep_scan": {
+            "tagging_details": {"total_tags": 12, "structure_quality": 60},
+            "page_analysis": [{"page_number": 1, "has_text": True, "image_count": 2}]
+        }
+    }
+
+    html = generate_html_report(report)
+
+    assert "Walidacja PDF/UA" in html
+    assert "Brak tagu Figure" in html
+    assert "Pełny skan dokumentu" in html
+    assert "Jakość struktury: 60/100" in html
+
+
+def test_html_report_streams_header_first():
+    """Pierwszy fragment zawiera nagłówek raportu niezależnie od liczby błędów"""
+    huge = {
+        **REPORT,
+        "pdf_ua_validation": {
+            "is_compliant": False,
+            "failed_rules_count": 20000,
+            "failed_rules": [{"clause": "7.1", "testNumber": str(i), "description": "x"} for i in range(20000)]
+        }
+    }
+
+    chunks = iter_html_report(huge)
+    first = next(chunks)
+
+    assert "Raport Dostępności PDF" in first
+    assert len(first) < 64 * 1024
+    assert sum(1 for _ in chunks) > 10
@@ -0,0 +1,125 @@
+import json
+
+import fakeredis
+import pytest
+from fakeredis import aioredis as fake_aioredis
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routers import rules as rules_router
+from app.services.redis_client import RedisClient
+from app.services import findings, rules_service as rules_service_module
+from app.services.rules_service import rules_service
+from app.services.task_status import task_status_watcher, TASK_META_PREFIX
+
+LEGACY_REPORT = {
+    "basic_analysis": {
+        "is_tagged": False,
+        "contains_text": True,
+        "is_title_defined": False,
+        "is_lang_defined": True,
+        "image_info": {"images_without_alt": 3},
+        "heading_info": {"h1_count": 0, "issues": ["Dokument nie jest otagowany"]},
+    },
+    "pdf_ua_validation": {
+        "failed_rules": [
+            {"clause": "7.18.1", "testNumber": "2", "description": "Adnotacja bez opisu"},
+            {"error": "Nie udało się sparsować raportu XML z veraPDF."},
+        ]
+    },
+}
+
+ENHANCED_REPORT = {
+    "basic_results": {"is_tagged": True, "contains_text": True},
+    "detailed_results": {
+        "metadata": {"is_title_defined": True, "is_lang_defined": False},
+        "heading_info": {"h1_count": 2, "has_skipped_levels": True},
+    },
+    "deep_scan": {"forms": {"unlabeled_fields": 4}, "contrast_issues": []},
+}
+
+
+def _ids(recommendations):
+    return [r["rule"]["id"] for r in recommendations]
+
+
+def test_legacy_report_findings_map_to_rules():
+    recommendations = rules_service.get_rules_for_pdf_analysis(LEGACY_REPORT)
+    by_id = {r["rule"]["id"]: r for r in recommendations}
+
+    assert by_id["wcag_1.3.1"]["priority"] == "high"
+    assert "untagged" in by_id["wcag_1.3.1"]["findings"]
+    assert "3 obrazów" in by_id["wcag_1.1.1"]["reason"]
+    assert by_id["wcag_2.4.2"]["findings"] == ["missing_title"]
+    # Błąd PDF/UA 7.18.1 trafia do reguł z mapowaniem 7.18
+    assert "pdf_ua_failure" in by_id["wcag_2.1.1"]["findings"]
+    # Nagłówki nie są oceniane w nieotagowanym dokumencie
+    assert not any("heading_no_h1" in r["findings"] for r in recommendations)
+    # Najpierw priorytet wysoki
+    priorities = [r["priority"] for r in recommendations]
+    assert priorities == sorted(priorities, key={"high": 0, "medium": 1, "low": 2}.get)
+
+
+def test_enhanced_report_findings_map_to_rules():
+    recommendations = rules_service.get_rules_for_pdf_analysis(ENHANCED_REPORT)
+    by_id = {r["rule"]["id"]: r for r in recommendations}
+
+    assert set(by_id) >= {"wcag_3.1.1", "wcag_3.3.2", "wcag_4.1.2", "wcag_1.3.1", "wcag_2.4.6"}
+    assert "4 pól" in by_id["wcag_3.3.2"]["reason"]
+    assert by_id["wcag_2.4.6"]["priority"] == "low"
+    assert by_id["wcag_1.3.1"]["priority"] == "medium"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    server = fakeredis.FakeServer()
+    sync_redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+    for task_id, meta in {
+        "done": {"status": "SUCCESS", "result": LEGACY_REPORT},
+        "failed": {"status": "FAILURE", "result": {"exc_type": "PDFAnalysisError", "exc_message": ["x"]}},
+    }.items():
+        sync_redis.set(f"{TASK_META_PREFIX}{task_id}", json.dumps({**meta, "task_id": task_id}))
+    monkeypatch.setattr(task_status_watcher, "client", fake_aioredis.FakeRedis(server=server, decode_responses=True))
+
+    cache = RedisClient()
+    cache.client = sync_redis
+    cache.raw_client = fakeredis.FakeRedis(server=server)
+    cache.breaker.record_success()
+    monkeypatch.setattr(rules_router, "redis_client", cache)
+    with TestClient(app) as test_client:
+        yield test_client, cache
+
+
+def test_endpoint_uses_stored_result_and_caches_per_task(client, monkeypatch):
+    test_client, cache = client
+
+    response = test_client.get("/rules/analysis/done/recommendations")
+    assert response.status_code == 200
+    assert _ids(response.json()) == _ids(rules_service.get_rules_for_pdf_analysis(LEGACY_REPORT))
+    assert cache.client.keys(f"rule:recommendations:*:done")
+
+    # Drugie wywołanie nie sięga po wynik zadania
+    async def no_meta(task_id):
+        raise AssertionError("wynik powinien pochodzić z cache")
+
+    monkeypatch.setattr(task_status_watcher, "get_meta", no_meta)
+    assert test_client.get("/rules/analysis/done/recommendations").json() == response.json()
+
+
+def test_endpoint_reports_missing_and_failed_tasks(client):
+    test_client, _ = client
+
+    assert test_client.get("/rules/analysis/unknown/recommendations").status_code == 404
+    assert test_client.get("/rules/analysis/failed/recommendations").status_code == 409
+
+
+def test_cache_key_changes_with_finding_rules_map(monkeypatch):
+    before = rules_service.recommendations_version()
+    monkeypatch.setitem(findings.FINDING_RULES, "untagged", (("wcag_4.1.2",), "high", "Brak tagów"))
+    rules_service_module._findings_fingerprint.cache_clear()
+    try:
+        assert rules_service.recommendations_version() != before
+    finally:
+        monkeypatch.undo()
+        rules_service_module._findings_fingerprint.cache_clear()
+    assert rules_service.recommendations_version() == before
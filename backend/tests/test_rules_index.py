@@ -0,0 +1,130 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models.rules import WCAGRule
+from app.services.rules_index import ClauseIndex, RulesIndex, normalize, tokenize
+from app.services.rules_service import rules_service
+
+
+def _rule(rule_id, title, description="Opis", level="A", category="perceivable", pdf_specific=True):
+    return WCAGRule(id=rule_id, title=title, description=description, level=level,
+                    category=category, pdf_specific=pdf_specific)
+
+
+@pytest.fixture
+def index():
+    return RulesIndex([
+        _rule("wcag_1.1.1", "Treść nietekstowa", "Obrazy muszą mieć tekst alternatywny"),
+        _rule("wcag_1.4.3", "Kontrast (minimum)", "Kontrast tekstu względem tła", level="AA"),
+        _rule("wcag_2.4.2", "Tytuł strony", "Dokument ma tytuł opisujący obraz treści",
+              category="operable", pdf_specific=False),
+        _rule("wcag_3.1.1", "Język strony", "Język dokumentu określony programowo",
+              category="understandable"),
+    ])
+
+
+def test_normalize_folds_polish_characters():
+    assert normalize("Zażółć GĘŚLĄ jaźń") == "zazolc gesla jazn"
+    assert tokenize("Reguła wcag_1.4.3 (PDF/UA 7.1)") == ["regula", "wcag", "1.4.3", "pdf", "ua", "7.1"]
+
+
+def test_search_ignores_case_and_diacritics(index):
+    _, rules = index.search("tresc")
+    # Tytuł "Treść ..." przed opisem "... treści"
+    assert [r.id for r in rules] == ["wcag_1.1.1", "wcag_2.4.2"]
+    assert [r.id for r in index.search("JĘZYK")[1]] == ["wcag_3.1.1"]
+
+
+def test_search_matches_inflected_forms_by_prefix(index):
+    # "obraz" znajduje "Obrazy" i "obraz"
+    assert {r.id for r in index.search("obraz")[1]} == {"wcag_1.1.1", "wcag_2.4.2"}
+
+
+def test_search_ranks_title_and_id_above_description(index):
+    _, rules = index.search("tytuł")
+    assert rules[0].id == "wcag_2.4.2"
+    _, rules = index.search("1.4")
+    assert rules[0].id == "wcag_1.4.3"
+
+
+def test_all_query_tokens_must_match(index):
+    assert [r.id for r in index.search("kontrast tła")[1]] == ["wcag_1.4.3"]
+    assert index.search("kontrast język") == (0, [])
+
+
+def test_filters_combine_with_search(index):
+    assert index.search(level="AA")[0] == 1
+    assert index.search(pdf_specific=False)[1][0].id == "wcag_2.4.2"
+    assert index.search("strony", category="operable")[1][0].id == "wcag_2.4.2"
+    assert index.search(level="AAA") == (0, [])
+
+
+def test_pagination_reports_total(index):
+    total, page = index.search(limit=2, offset=1)
+    assert total == 4
+    assert [r.id for r in page] == ["wcag_1.4.3", "wcag_2.4.2"]
+
+
+def test_list_rules_endpoint_uses_index():
+    with TestClient(app) as client:
+        response = client.get("/rules/", params={"search": "tekst", "limit": 1})
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+    assert int(response.headers["X-Total-Count"]) == rules_service.query_rules(search="tekst")[0]
+
+
+def test_clause_index_resolves_test_number_clause_and_parents():
+    clauses = ClauseIndex.from_rules([
+        _rule("wcag_1.1.1", "Treść nietekstowa").model_copy(update={"pdf_ua_mapping": "7.1, 7.3"}),
+        _rule("wcag_4.1.2", "Nazwa, rola, wartość").model_copy(update={"pdf_ua_mapping": "7.1, 7.18, 7.18.1-2"}),
+        _rule("wcag_1.4.3", "Kontrast"),
+    ])
+
+    assert clauses.lookup("7.3") == ("wcag_1.1.1",)
+    assert clauses.lookup("7.1", "5") == ("wcag_1.1.1", "wcag_4.1.2")
+    assert clauses.lookup("7.18.1", "2") == ("wcag_4.1.2",)
+    # Klauzula podrzędna bez własnego wpisu -> klauzula nadrzędna
+    assert clauses.lookup("7.18.4", "1") == ("wcag_4.1.2",)
+    assert clauses.lookup("6.2", "1") == ()
+    assert ClauseIndex.from_dict(clauses.to_dict()).table == clauses.table
+
+
+def test_attach_wcag_criteria_does_not_mutate_input():
+    failed = [{"clause": "7.1", "testNumber": "3", "description": "x"}, {"error": "parse"}]
+
+    enriched = rules_service.attach_wcag_criteria(failed)
+
+    assert "wcag_1.1.1" in enriched[0]["wcag_criteria"]
+    assert "wcag_criteria" not in failed[0]
+    assert enriched[1] == {"error": "parse"}
+
+
+def test_clause_table_built_in_memory_or_from_snapshot(tmp_path):
+    import json
+    from app.services.rules_service import RulesService
+    from app.services.rules_snapshot import write_snapshot
+
+    rules_file = tmp_path / "wcag_rules.json"
+    rules_file.write_text(json.dumps({"rules": [
+        {"id": "wcag_2.4.2", "title": "Tytuł", "description": "x", "level": "A",
+         "category": "operable", "pdf_ua_mapping": "7.1"}
+    ]}), encoding="utf-8")
+
+    # Ścieżka JSON: tablica w pamięci, bez zapisywania plików obok reguł
+    assert RulesService(rules_file).wcag_criteria_for("7.1") == ["wcag_2.4.2"]
+    assert [p.name for p in tmp_path.iterdir()] == ["wcag_rules.json"]
+
+    # Snapshot binarny niesie tę samą tablicę
+    write_snapshot(rules_file)
+    assert RulesService(rules_file).snapshot.clauses.to_dict() == {"7.1": ["wcag_2.4.2"]}
+
+
+def test_enrichment_fallback_uses_local_wcag_criteria():
+    from app.tasks import build_enriched_legacy_report
+
+    failed = rules_service.attach_wcag_criteria([{"clause": "7.19", "testNumber": "1", "description": "x"}])
+    report = build_enriched_legacy_report({"is_tagged": True}, failed, supabase_client=None)
+
+    assert report["enhanced_failed_rules"][0]["wcag_reference"] == "wcag_3.3.2"
+    assert report["enhanced_recommendations"][-1]["wcag_reference"] == "wcag_3.3.2"
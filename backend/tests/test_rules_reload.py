@@ -0,0 +1,130 @@
+import json
+import os
+import time
+
+import pytest
+
+from app.services import fingerprints
+from app.services.rules_service import RulesService
+
+
+def _write_rules(path, *titles, mtime=None):
+    rules = [
+        {"id": f"wcag_1.{i}.1", "title": title, "description": "Opis", "level": "A", "category": "perceivable"}
+        for i, title in enumerate(titles, start=1)
+    ]
+    path.write_text(json.dumps({"rules": rules}), encoding="utf-8")
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def rules_file(tmp_path):
+    path = tmp_path / "wcag_rules.json"
+    _write_rules(path, "Treść nietekstowa", mtime=1_000)
+    return path
+
+
+def test_reload_swaps_snapshot_with_new_index(rules_file):
+    service = RulesService(rules_file)
+    old_snapshot = service.snapshot
+
+    _write_rules(rules_file, "Treść nietekstowa", "Kontrast", mtime=2_000)
+    assert service.reload() is True
+
+    assert service.snapshot is not old_snapshot
+    assert service.snapshot.version != old_snapshot.version
+    assert [r.id for r in service.index.search("kontrast")[1]] == ["wcag_1.2.1"]
+    # Stary snapshot (trzymany przez trwające zapytanie) pozostaje spójny
+    assert old_snapshot.index.search("kontrast") == (0, [])
+    assert len(old_snapshot.rules) == 1
+
+
+def test_unchanged_file_is_not_reloaded(rules_file):
+    service = RulesService(rules_file)
+    snapshot = service.snapshot
+
+    assert service.reload() is False
+    # Sam touch bez zmiany treści nie podmienia snapshotu
+    os.utime(rules_file, (3_000, 3_000))
+    assert service.reload() is False
+    assert service.snapshot is snapshot
+    # Opublikowany snapshot jest niezmienny - mtime zapamiętuje serwis
+    assert snapshot.mtime == 1_000
+
+    def unexpected_read():
+        raise AssertionError("plik nie powinien być czytany ponownie")
+
+    service._read_snapshot = unexpected_read
+    assert service.reload() is False
+
+
+def test_get_rule_reads_redis_off_the_event_loop(rules_file, monkeypatch):
+    import asyncio
+    import threading
+
+    from app.models.rules import RuleNotFoundError
+    from app.services import rules_service as rules_service_module
+
+    threads = []
+    monkeypatch.setattr(rules_service_module.redis_client, "get_cache",
+                        lambda key: threads.append(threading.current_thread()))
+    service = RulesService(rules_file)
+
+    with pytest.raises(RuleNotFoundError):
+        asyncio.run(service.get_rule("wcag_9.9.9"))
+    assert threads and threads[0] is not threading.main_thread()
+
+
+@pytest.mark.parametrize("content", [
+    "{niepoprawny json",
+    json.dumps({"rules": []}),
+    json.dumps({"rules": [{"id": "wcag_1.1.1", "title": "Bez poziomu", "description": "x", "category": "perceivable"}]}),
+    json.dumps({"rules": [{"id": "x", "title": "a", "description": "b", "level": "A", "category": "robust"}] * 2}),
+])
+def test_invalid_file_keeps_previous_snapshot(rules_file, content):
+    service = RulesService(rules_file)
+    snapshot = service.snapshot
+
+    rules_file.write_text(content, encoding="utf-8")
+    os.utime(rules_file, (2_000, 2_000))
+
+    assert service.reload() is False
+    assert service.snapshot is snapshot
+    assert service.status()["reload_errors"] == 1
+
+
+def test_watcher_reloads_in_background(rules_file):
+    service = RulesService(rules_file)
+    service.start_watcher(interval=0.01)
+    try:
+        _write_rules(rules_file, "Treść nietekstowa", "Kontrast", mtime=2_000)
+        deadline = time.monotonic() + 2
+        while len(service.rules_cache) == 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(service.rules_cache) == 2
+        assert service.status()["watcher_running"] is True
+    finally:
+        service.stop_watcher()
+    assert service.status()["watcher_running"] is False
+
+
+def test_rules_fingerprint_follows_loaded_snapshot():
+    from app.services.rules_service import rules_service
+
+    assert fingerprints.component_version("rules") == rules_service.snapshot.version
+
+
+def test_worker_processes_start_rules_watcher(monkeypatch):
+    from celery.signals import worker_process_init
+    from app import tasks, tasks_enhanced
+
+    started = []
+    monkeypatch.setattr(tasks.rules_service, "start_watcher", lambda: started.append(True))
+    monkeypatch.setattr(tasks.knowledge_base, "preload", lambda: False)
+
+    worker_process_init.send(sender=None)
+
+    # Oba moduły zadań (klasyczny i wielopoziomowy) uruchamiają watcher
+    assert tasks_enhanced.rules_service is tasks.rules_service
+    assert len(started) == 2
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from app.services import rules_service as rules_service_module
+from app.services.rules_service import RulesService
+from app.services.rules_snapshot import snapshot_path, write_snapshot
+
+RULES = [
+    {"id": "wcag_1.1.1", "title": "Treść nietekstowa", "description": "Obrazy muszą mieć tekst alternatywny",
+     "level": "A", "category": "perceivable", "pdf_specific": True, "pdf_ua_mapping": "7.1, 7.3",
+     "examples": [{"type": "correct", "code": "<Figure/>"}]},
+    {"id": "wcag_1.4.3", "title": "Kontrast (minimum)", "description": "Kontrast tekstu",
+     "level": "AA", "category": "perceivable"},
+]
+
+
+@pytest.fixture
+def rules_file(tmp_path):
+    path = tmp_path / "wcag_rules.json"
+    path.write_text(json.dumps({"rules": RULES}), encoding="utf-8")
+    return path
+
+
+def test_snapshot_loads_same_rules_without_validation(rules_file, monkeypatch):
+    from_json = RulesService(rules_file)
+    write_snapshot(rules_file)
+
+    def no_parsing(raw):
+        raise AssertionError("JSON nie powinien być parsowany")
+
+    monkeypatch.setattr(rules_service_module, "parse_rules", no_parsing)
+    from_snapshot = RulesService(rules_file)
+
+    assert from_snapshot.snapshot.version == from_json.snapshot.version
+    assert [r.model_dump(mode="json") for r in from_snapshot.rules_cache.values()] == \
+        [r.model_dump(mode="json") for r in from_json.rules_cache.values()]
+    assert from_snapshot.index.postings == from_json.index.postings
+    assert from_snapshot.index.search("obraz", level="A")[1][0].id == "wcag_1.1.1"
+    assert from_snapshot.wcag_criteria_for("7.3") == ["wcag_1.1.1"]
+
+
+def test_stale_snapshot_falls_back_to_json(rules_file):
+    write_snapshot(rules_file)
+    rules_file.write_text(json.dumps({"rules": RULES[:1]}), encoding="utf-8")
+
+    service = RulesService(rules_file)
+
+    assert list(service.rules_cache) == ["wcag_1.1.1"]
+
+
+def test_corrupt_snapshot_falls_back_to_json(rules_file):
+    snapshot_path(rules_file).write_bytes(b"\x00PA\x01\x01garbage")
+
+    service = RulesService(rules_file)
+
+    assert len(service.rules_cache) == 2
+
+
+def test_cli_writes_snapshot(rules_file, tmp_path):
+    from app.services.rules_snapshot import main
+
+    output = tmp_path / "out.snapshot"
+    main(["--rules", str(rules_file), "--output", str(output)])
+
+    assert output.stat().st_size > 0
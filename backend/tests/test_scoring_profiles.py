@@ -0,0 +1,118 @@
+import copy
+import json
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models.scoring import ScoringProfileError, ScoringProfileNotFoundError
+from app.services import batch_scoring
+from app.services.scoring import scoring_profiles, compile_profiles, PROFILES_FILE
+
+
+def _profiles_data():
+    with open(PROFILES_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_detailed_profile_scores_quality_and_partial_pdf_ua():
+    detailed = scoring_profiles.get("detailed")
+    analysis = {
+        "is_tagged": True,
+        "contains_text": True,
+        "metadata": {"is_title_defined": True, "is_lang_defined": False},
+        "image_info": {"image_count": 4, "images_with_alt": 3},
+        "deep_scan": {"tagging_details": {"structure_quality": 80}},
+    }
+
+    result = detailed.score(analysis, {"is_compliant": False, "failed_rules_count": 12})
+
+    assert [d["points"] for d in result["details"]] == [25, 15, 15, 5, 18]
+    assert result["total_score"] == 78
+    assert result["level"] == "Średni"
+
+    # Bez walidacji PDF/UA kryterium nie występuje, maksimum pozostaje 100
+    without_pdf_ua = detailed.score(analysis, None)
+    assert [d["criterion"] for d in without_pdf_ua["details"]][-1] == "Metadane"
+    assert without_pdf_ua["max_score"] == 100
+
+
+def test_features_read_from_both_analysis_layouts():
+    classic = scoring_profiles.get("classic")
+    flat = {"is_title_defined": True, "is_lang_defined": True}
+    nested = {"metadata": {"is_title_defined": True, "is_lang_defined": True}}
+
+    assert classic.extract(flat, None) == classic.extract(nested, None)
+
+
+def test_vector_evaluation_matches_scalar_for_every_profile():
+    rng = random.Random(3)
+    reports = []
+    for _ in range(300):
+        image_count = rng.choice([0, 1, 4])
+        failed = rng.randint(0, 35)
+        reports.append({
+            "basic_analysis": {
+                "is_tagged": rng.random() < 0.5,
+                "contains_text": rng.random() < 0.8,
+                "is_title_defined": rng.random() < 0.5,
+                "heading_info": rng.choice([{}, {"h1_count": 2, "has_skipped_levels": True, "heading_structure": [1]}]),
+                "image_info": {"image_count": image_count, "images_with_alt": rng.randint(0, image_count)},
+            },
+            "pdf_ua_validation": {"is_compliant": failed == 0, "failed_rules_count": failed},
+        })
+
+    for name in scoring_profiles.names():
+        profile = scoring_profiles.get(name)
+        expected = [profile.score(*batch_scoring.legacy_source(report)) for report in reports]
+        assert batch_scoring.rescore(reports, name) == expected
+
+
+def test_report_metadata_selects_profile_for_rescoring():
+    report = {
+        "metadata": {"scoring_profile": "balanced"},
+        "basic_analysis": {"is_tagged": True, "contains_text": True},
+        "pdf_ua_validation": {"is_compliant": False, "failed_rules_count": 10},
+    }
+
+    [score] = batch_scoring.rescore([report])
+
+    assert score == scoring_profiles.get("balanced").score(*batch_scoring.legacy_source(report))
+    assert score["details"][-1] == {"criterion": "Zgodność PDF/UA", "points": 20, "max": 30}
+
+
+@pytest.mark.parametrize("mutate, message", [
+    (lambda p: p["criteria"][0].update(points={"if": {"feature": "nope"}, "then": 15}), "nieznana cecha"),
+    (lambda p: p["criteria"][0].update(points=40), "dozwolone"),
+    (lambda p: p["criteria"][0].update(points={"median": []}), "nieznane wyrażenie"),
+    (lambda p: p["criteria"][0].update(points={"if": {"feature": "is_tagged", "op": "~", "value": 1}}),
+     "niepoprawne porównanie"),
+    (lambda p: p["levels"].reverse(), "progi muszą być malejące"),
+])
+def test_invalid_profiles_are_rejected(mutate, message):
+    data = copy.deepcopy(_profiles_data())
+    mutate(data["profiles"]["classic"])
+
+    with pytest.raises(ScoringProfileError, match=message):
+        compile_profiles(data)
+
+
+def test_unknown_profile():
+    with pytest.raises(ScoringProfileNotFoundError):
+        scoring_profiles.get("nope")
+
+
+def test_upload_validates_profile_and_profiles_are_listed():
+    with TestClient(app) as client:
+        listed = client.get("/scoring-profiles").json()
+        response = client.post(
+            "/upload/",
+            files={"file": ("doc.pdf", b"%PDF-1.7", "application/pdf")},
+            data={"scoring_profile": "nope"},
+        )
+
+    assert {p["name"] for p in listed["profiles"]} >= {"classic", "detailed", "balanced"}
+    assert all(p["max_score"] == 100 for p in listed["profiles"])
+    assert response.status_code == 400
+    assert "nope" in response.json()["detail"]
@@ -0,0 +1,147 @@
+import gzip
+import json
+
+import brotli
+from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.common import serialization
+from app.common.compression import BrotliMiddleware
+from app.common.serialization import FastJSONResponse
+
+LARGE = {"failed_rules": [{"clause": "7.1", "description": f"Zażółć gęślą jaźń {i}"} for i in range(2000)]}
+
+
+def test_dumps_roundtrip_keeps_unicode_and_converts_tuples():
+    data = {"tytuł": "Zażółć", "bbox": (1, 2, 3, 4), 5: "klucz liczbowy"}
+
+    encoded = serialization.dumps(data)
+
+    assert "Zażółć".encode() in encoded
+    assert serialization.loads(encoded) == {"tytuł": "Zażółć", "bbox": [1, 2, 3, 4], "5": "klucz liczbowy"}
+    assert serialization.loads(encoded.decode()) == serialization.loads(encoded)
+
+
+def test_dumps_matches_stdlib_json():
+    assert json.loads(serialization.dumps(LARGE, indent=True)) == LARGE
+    assert serialization.dumps({"b": 1, "a": 2}, sort_keys=True) == b'{"a":2,"b":1}'
+
+
+def _app():
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.add_middleware(GZipMiddleware, minimum_size=1024)
+    app.add_middleware(BrotliMiddleware, minimum_size=1024)
+
+    @app.get("/large")
+    def large():
+        return LARGE
+
+    @app.get("/small")
+    def small():
+        return {"status": "ok"}
+
+    @app.get("/pdf")
+    def pdf():
+        return Response(b"%PDF-" + b"0" * 4096, media_type="application/pdf")
+
+    @app.get("/tagged")
+    def tagged():
+        return Response(serialization.dumps(LARGE), media_type="application/json", headers={"ETag": '"v1"'})
+
+    @app.get("/not-modified")
+    def not_modified():
+        return Response(status_code=304, headers={"ETag": '"v1"'})
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((b"<p>wiersz</p>" * 200 for _ in range(10)), media_type="text/html")
+
+    return TestClient(app)
+
+
+def test_brotli_preferred_when_accepted():
+    client = _app()
+
+    response = client.get("/large", headers={"Accept-Encoding": "gzip, br"})
+
+    assert response.headers["content-encoding"] == "br"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(serialization.dumps(LARGE)) // 5
+    # httpx może nie dekodować Brotli, więc sprawdzamy surową treść
+    raw = response.content if response.content.startswith(b"{") else brotli.decompress(response.content)
+    assert serialization.loads(raw) == LARGE
+
+
+def test_gzip_fallback_and_small_responses_untouched():
+    client = _app()
+
+    gzipped = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    small = client.get("/small", headers={"Accept-Encoding": "br"})
+
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.json() == LARGE
+    assert "content-encoding" not in small.headers
+    assert small.json() == {"status": "ok"}
+
+
+def test_encoded_responses_get_weak_etag_and_vary():
+    client = _app()
+
+    br = client.get("/tagged", headers={"Accept-Encoding": "br"})
+    gzipped = client.get("/tagged", headers={"Accept-Encoding": "gzip"})
+    identity = client.get("/tagged", headers={"Accept-Encoding": "identity"})
+    not_modified = client.get("/not-modified", headers={"Accept-Encoding": "br"})
+
+    assert br.headers["etag"] == 'W/"v1"' and "Accept-Encoding" in br.headers["vary"]
+    assert gzipped.headers["etag"] == 'W/"v1"' and "Accept-Encoding" in gzipped.headers["vary"]
+    assert identity.headers["etag"] == '"v1"'
+    assert not_modified.headers["etag"] == 'W/"v1"' and "Accept-Encoding" in not_modified.headers["vary"]
+
+
+def test_pdf_and_streamed_responses():
+    client = _app()
+
+    pdf = client.get("/pdf", headers={"Accept-Encoding": "br"})
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "br"}) as streamed:
+        encoding = streamed.headers.get("content-encoding")
+        raw = b"".join(streamed.iter_raw())
+
+    assert "content-encoding" not in pdf.headers
+    assert pdf.content.startswith(b"%PDF-")
+    assert encoding == "br"
+    assert brotli.decompress(raw) == b"<p>wiersz</p>" * 2000
+
+
+def test_pack_roundtrip_and_compression():
+    packed = serialization.pack(LARGE)
+
+    assert packed.startswith(serialization.PACK_MAGIC)
+    assert serialization.unpack(packed) == LARGE
+    assert len(packed) * 5 < len(serialization.dumps(LARGE))
+
+
+def test_pack_small_payload_is_not_compressed():
+    packed = serialization.pack({"status": "ok", "when": (2024, 1)})
+
+    assert packed[len(serialization.PACK_MAGIC) + 1] >> 4 == serialization.COMPRESSION_NONE
+    assert serialization.unpack(packed) == {"status": "ok", "when": [2024, 1]}
+
+
+def test_unpack_reads_legacy_json_entries():
+    assert serialization.unpack(json.dumps(LARGE)) == LARGE
+    assert serialization.unpack(json.dumps(LARGE).encode()) == LARGE
+
+
+def test_celery_backend_stores_packed_results():
+    """Backend wyników Celery zapisuje wyniki binarnie, a odczytuje też stare wpisy JSON"""
+    from app.tasks import celery_app
+
+    backend = celery_app.backend
+    meta = backend._get_result_meta(LARGE, "SUCCESS", None, None, format_date=True)
+    encoded = backend.encode(meta)
+
+    assert encoded.startswith(serialization.PACK_MAGIC)
+    assert backend.decode_result(encoded)["result"] == LARGE
+    assert backend.decode_result(json.dumps({"status": "SUCCESS", "result": 1}).encode())["result"] == 1
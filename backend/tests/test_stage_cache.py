@@ -0,0 +1,139 @@
+import fakeredis
+import pymupdf as fitz
+import pytest
+
+from app.analysis_enhanced import EnhancedPdfAnalysis
+from app.models.analysis_levels import AnalysisLevel
+from app.services import fingerprints, stage_cache
+from app.services.redis_client import RedisClient
+from app.services.stage_cache import StagedAnalysis
+
+
+def _pdf_bytes() -> bytes:
+    doc = fitz.open()
+    for i in range(3):
+        doc.new_page().insert_text((72, 72), f"Strona {i + 1} - tekst testowy")
+    doc.set_metadata({"title": "Dokument testowy"})
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+@pytest.fixture
+def cache():
+    server = fakeredis.FakeServer()
+    instance = RedisClient()
+    instance.client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    instance.raw_client = fakeredis.FakeRedis(server=server)
+    instance.breaker.record_success()
+    return instance
+
+
+def _without_timing(result: dict) -> dict:
+    return {k: v for k, v in result.items() if k != "analysis_time"}
+
+
+def test_staged_result_matches_direct_analysis(cache):
+    pdf = _pdf_bytes()
+    direct = EnhancedPdfAnalysis(pdf)
+    staged = StagedAnalysis(pdf, cache=cache)
+    try:
+        expected = _without_timing(direct.analyze(AnalysisLevel.PROFESSIONAL))
+        # Drugi przebieg w całości z cache (po serializacji) daje ten sam wynik
+        StagedAnalysis(pdf, cache=cache).analyze(AnalysisLevel.PROFESSIONAL)
+        actual = _without_timing(staged.analyze(AnalysisLevel.PROFESSIONAL))
+    finally:
+        direct.close()
+        staged.close()
+
+    assert actual == expected
+    assert staged.computed == []
+
+
+def test_upgrading_level_computes_only_missing_stages(cache):
+    pdf = _pdf_bytes()
+    quick = StagedAnalysis(pdf, cache=cache)
+    quick.analyze(AnalysisLevel.QUICK)
+    quick.close()
+
+    professional = StagedAnalysis(pdf, cache=cache)
+    professional.analyze(AnalysisLevel.PROFESSIONAL)
+    professional.close()
+
+    assert quick.computed == ["basic", "quick_metrics"]
+    # "basic" jest wspólny dla wszystkich poziomów, pozostałe to etapy, których QUICK nie liczył
+    assert professional.reused == ["basic", "quick_metrics"]
+    assert professional.computed == ["metadata", "images", "headings", "text_preview", "deep_scan"]
+
+
+def test_shared_basic_stage_applies_each_level_page_limit(cache):
+    # Tekst dopiero na 12. stronie - poza limitem QUICK (10 stron)
+    doc = fitz.open()
+    for _ in range(11):
+        doc.new_page()
+    doc.new_page().insert_text((72, 72), "Tekst na dalszej stronie")
+    pdf = doc.tobytes()
+    doc.close()
+
+    quick = StagedAnalysis(pdf, cache=cache).analyze(AnalysisLevel.QUICK)
+    professional = StagedAnalysis(pdf, cache=cache)
+    result = professional.analyze(AnalysisLevel.PROFESSIONAL)
+    professional.close()
+
+    assert "basic" in professional.reused
+    assert (quick["page_count"], quick["contains_text"]) == (10, False)
+    assert (result["page_count"], result["contains_text"]) == (12, True)
+
+
+def test_fully_cached_analysis_does_not_open_document(cache):
+    pdf = _pdf_bytes()
+    first = StagedAnalysis(pdf, cache=cache)
+    assert first.contains_javascript() is False
+    first.analyze(AnalysisLevel.STANDARD)
+    first.close()
+
+    staged = StagedAnalysis(pdf, cache=cache)
+    assert staged.contains_javascript() is False
+    staged.analyze(AnalysisLevel.STANDARD)
+
+    assert staged._analysis is None
+    assert staged.computed == []
+
+
+def test_validation_is_shared_between_runs(cache, tmp_path, monkeypatch):
+    calls = []
+
+    def fake_validate(filename):
+        calls.append(filename)
+        return False, "<report/>"
+
+    monkeypatch.setattr(stage_cache, "validate_pdf_ua", fake_validate)
+    monkeypatch.setattr(stage_cache, "parse_verapdf_report", lambda xml: [{"clause": "7.1", "testNumber": "1"}])
+    monkeypatch.setitem(fingerprints._components, "verapdf", lambda: "1.26.2")
+    pdf = _pdf_bytes()
+
+    first = StagedAnalysis(pdf, storage_path=str(tmp_path), cache=cache).validate()
+    second = StagedAnalysis(pdf, storage_path=str(tmp_path), cache=cache).validate()
+
+    assert first == second == {"is_compliant": False, "failed_rules": [{"clause": "7.1", "testNumber": "1"}]}
+    assert len(calls) == 1
+    assert list(tmp_path.iterdir()) == []
+    assert cache.raw_client.exists(StagedAnalysis(pdf, cache=cache).stage_key("validation"))
+
+
+def test_validation_not_cached_while_verapdf_version_is_unknown(cache, tmp_path, monkeypatch):
+    """Wynik zapisany pod wersją "unknown" byłby serwowany także po aktualizacji veraPDF"""
+    calls = []
+    monkeypatch.setattr(stage_cache, "validate_pdf_ua", lambda filename: calls.append(filename) or (True, "<report/>"))
+    monkeypatch.setattr(stage_cache, "parse_verapdf_report", lambda xml: [])
+    monkeypatch.setitem(fingerprints._components, "verapdf", lambda: fingerprints.UNKNOWN_VERSION)
+    pdf = _pdf_bytes()
+
+    StagedAnalysis(pdf, storage_path=str(tmp_path), cache=cache).validate()
+    staged = StagedAnalysis(pdf, storage_path=str(tmp_path), cache=cache)
+    staged.validate()
+
+    assert len(calls) == 2
+    assert staged.stage_key("validation") is None
+    assert staged.computed == ["validation"]
+    assert cache.raw_client.keys("validation:*") == []
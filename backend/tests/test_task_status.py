@@ -0,0 +1,161 @@
+import asyncio
+import json
+import time
+
+import fakeredis
+import redis.asyncio as aioredis
+from fakeredis import aioredis as fake_aioredis
+
+from app.services.task_status import TaskStatusWatcher, TASK_META_PREFIX, describe_failure
+
+
+def _store_result(server, task_id: str, meta: dict):
+    """Zapisuje wynik tak jak RedisBackend Celery (SET + PUBLISH)"""
+    client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    value = json.dumps({"task_id": task_id, **meta})
+    client.set(f"{TASK_META_PREFIX}{task_id}", value)
+    client.publish(f"{TASK_META_PREFIX}{task_id}", value)
+
+
+def _watcher(server) -> TaskStatusWatcher:
+    client = fake_aioredis.FakeRedis(
+        server=server,
+        decode_responses=True,
+        connection_pool_class=aioredis.BlockingConnectionPool,
+        max_connections=10
+    )
+    return TaskStatusWatcher(client=client)
+
+
+def test_unknown_task_is_pending():
+    """Nieznane zadanie jest raportowane jako PENDING (jak w AsyncResult)"""
+    async def scenario():
+        watcher = _watcher(fakeredis.FakeServer())
+        meta = await watcher.get_meta("missing")
+        await watcher.close()
+        return meta
+
+    assert asyncio.run(scenario())["status"] == "PENDING"
+
+
+def test_long_poll_wakes_up_on_completion():
+    """Long-poll zwraca wynik zaraz po zapisaniu go przez workera, a nie po upływie limitu"""
+    server = fakeredis.FakeServer()
+
+    async def scenario():
+        watcher = _watcher(server)
+        _store_result(server, "abc", {"status": "STARTED", "result": None})
+        asyncio.get_running_loop().call_later(
+            0.2, _store_result, server, "abc", {"status": "SUCCESS", "result": {"score": 90}}
+        )
+        started = time.monotonic()
+        meta = await watcher.wait_for_meta("abc", timeout=10)
+        elapsed = time.monotonic() - started
+        await watcher.close()
+        return meta, elapsed
+
+    meta, elapsed = asyncio.run(scenario())
+    assert meta["status"] == "SUCCESS"
+    assert meta["result"] == {"score": 90}
+    assert elapsed < 5
+
+
+def test_long_poll_many_waiters_share_one_subscription():
+    """Wielu klientów czekających na to samo zadanie obsługuje jedna subskrypcja"""
+    server = fakeredis.FakeServer()
+
+    async def scenario():
+        watcher = _watcher(server)
+        asyncio.get_running_loop().call_later(
+            0.2, _store_result, server, "shared", {"status": "SUCCESS", "result": 1}
+        )
+        results = await asyncio.gather(*[watcher.wait_for_meta("shared", timeout=10) for _ in range(200)])
+        waiters_left = len(watcher._waiters)
+        await watcher.close()
+        return results, waiters_left
+
+    results, waiters_left = asyncio.run(scenario())
+    assert all(meta["status"] == "SUCCESS" for meta in results)
+    assert waiters_left == 0
+
+
+def test_long_poll_timeout_returns_current_state():
+    """Po upływie limitu zwracany jest bieżący stan zadania"""
+    server = fakeredis.FakeServer()
+
+    async def scenario():
+        watcher = _watcher(server)
+        _store_result(server, "slow", {"status": "STARTED", "result": None})
+        meta = await watcher.wait_for_meta("slow", timeout=0.3)
+        await watcher.close()
+        return meta
+
+    assert asyncio.run(scenario())["status"] == "STARTED"
+
+
+def test_describe_failure_matches_exception_str():
+    """Komunikat błędu odpowiada str(wyjątku) zwracanemu wcześniej przez AsyncResult.info"""
+    meta = {
+        "status": "FAILURE",
+        "result": {"exc_type": "CorruptPDFError", "exc_message": ["Plik PDF jest uszkodzony"], "exc_module": "app"}
+    }
+    assert describe_failure(meta) == "Plik PDF jest uszkodzony"
+
+
+def test_packed_result_is_read_and_pushed_to_waiters():
+    """Wyniki zapisane binarnie (serialization.pack) są czytelne także przez pub/sub"""
+    from app.common.serialization import pack
+
+    server = fakeredis.FakeServer()
+
+    async def scenario():
+        watcher = TaskStatusWatcher(client=fake_aioredis.FakeRedis(server=server))
+        waiting = asyncio.create_task(watcher.wait_for_meta("bin", timeout=5))
+        await asyncio.sleep(0.1)
+        value = pack({"task_id": "bin", "status": "SUCCESS", "result": {"score": 80}})
+        writer = fakeredis.FakeRedis(server=server)
+        writer.set(f"{TASK_META_PREFIX}bin", value)
+        writer.publish(f"{TASK_META_PREFIX}bin", value)
+        meta = await waiting
+        stored = await watcher.get_meta("bin")
+        await watcher.close()
+        return meta, stored
+
+    meta, stored = asyncio.run(scenario())
+    assert meta["result"] == {"score": 80}
+    assert stored == meta
+
+
+def test_listener_failure_replaces_broken_pubsub():
+    """Po błędzie listenera kolejny czekający subskrybuje na nowym połączeniu"""
+    server = fakeredis.FakeServer()
+
+    async def scenario():
+        watcher = _watcher(server)
+        _store_result(server, "t1", {"status": "STARTED", "result": None})
+        _store_result(server, "t2", {"status": "STARTED", "result": None})
+
+        async def broken(**kwargs):
+            raise ConnectionError("pub/sub connection lost")
+
+        waiter = asyncio.ensure_future(watcher.wait_for_meta("t1", timeout=10))
+        await asyncio.sleep(0.1)
+        broken_pubsub = watcher._pubsub
+        broken_pubsub.get_message = broken
+        # Czekający zostaje obudzony i dostaje bieżący stan zamiast czekać do limitu
+        assert (await asyncio.wait_for(waiter, 5))["status"] == "STARTED"
+        assert watcher._pubsub is None
+
+        asyncio.get_running_loop().call_later(
+            0.2, _store_result, server, "t2", {"status": "SUCCESS", "result": {"score": 1}}
+        )
+        started = time.monotonic()
+        meta = await watcher.wait_for_meta("t2", timeout=10)
+        elapsed = time.monotonic() - started
+        assert watcher._pubsub is not broken_pubsub
+        await watcher.close()
+        return meta, elapsed
+
+    meta, elapsed = asyncio.run(scenario())
+    assert meta["status"] == "SUCCESS"
+    assert elapsed < 5
@@ -0,0 +1,297 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import fakeredis
+import pytest
+from fastapi.testclient import TestClient
+
+from app import tasks
+from app.main import app
+
+from app.services import webhooks
+from app.services.webhooks import (
+    WebhookOutbox, build_callback_payload, sign_payload, is_valid_callback_url,
+    OUTBOX_KEY, DEAD_LETTER_KEY, CLAIM_KEY_PREFIX, MAX_ATTEMPTS, CallbackPayload, resolve_callback_address
+)
+
+SECRET = "test-secret"
+
+
+class StubReceiver:
+    """Lokalny serwer HTTP udający odbiorcę webhooków"""
+
+    def __init__(self, status_code: int = 200):
+        self.requests = []
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                receiver.requests.append((dict(self.headers), body))
+                self.send_response(receiver.status_code)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.status_code = status_code
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def receiver():
+    stub = StubReceiver()
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def outbox():
+    # Odbiorca testowy nasłuchuje na 127.0.0.1
+    return WebhookOutbox(client=fakeredis.FakeRedis(decode_responses=True), secret=SECRET, allow_private_targets=True)
+
+
+@pytest.fixture
+def dns(monkeypatch):
+    """Podmienia rozwiązywanie nazw: host -> lista adresów"""
+    records = {"example.com": ["93.184.216.34"]}
+    monkeypatch.setattr(webhooks, "_resolve_host", lambda host, port: records.get(host, []))
+    return records
+
+
+SAMPLE_REPORT = {
+    "metadata": {"filename": "doc.pdf"},
+    "accessibility_score": {"percentage": 72, "level": "Średni"},
+    "pdf_ua_validation": {"is_compliant": False, "failed_rules_count": 4},
+    "recommendations": [{"priority": "high"}, {"priority": "low"}]
+}
+
+
+def test_summary_payload_is_compact():
+    payload = build_callback_payload("t1", "SUCCESS", report=SAMPLE_REPORT)
+    assert "report" not in payload
+    assert payload["summary"] == {
+        "filename": "doc.pdf",
+        "percentage": 72,
+        "level": "Średni",
+        "is_pdf_ua_compliant": False,
+        "failed_rules_count": 4,
+        "recommendations_count": 2
+    }
+    full = build_callback_payload("t1", "SUCCESS", report=SAMPLE_REPORT, mode=CallbackPayload.full)
+    assert full["report"] == SAMPLE_REPORT
+
+
+def test_callback_url_validation(dns):
+    assert is_valid_callback_url("https://example.com/hook")
+    assert not is_valid_callback_url("ftp://example.com/hook")
+    assert not is_valid_callback_url("/relative/path")
+    assert not is_valid_callback_url("https://unknown.invalid/hook")
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1:8000/hook",
+    "http://localhost/hook",
+    "http://10.0.0.5/hook",
+    "http://192.168.1.10/hook",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://[::1]/hook",
+    "http://[::ffff:127.0.0.1]/hook",
+    "http://0.0.0.0/hook",
+    "http://224.0.0.1/hook",
+    "http://redis:6379/",
+    "http://rebind.example.com/hook",
+])
+def test_callback_url_to_internal_address_is_rejected(dns, url):
+    dns.update({
+        "localhost": ["127.0.0.1", "::1"],
+        "redis": ["172.18.0.3"],
+        # Jeden z adresów publiczny, drugi wewnętrzny - odrzucony
+        "rebind.example.com": ["93.184.216.34", "10.0.0.7"],
+    })
+    for host in ("127.0.0.1", "10.0.0.5", "192.168.1.10", "169.254.169.254", "::1", "::ffff:127.0.0.1",
+                 "0.0.0.0", "224.0.0.1"):
+        dns[host] = [host]
+
+    assert not is_valid_callback_url(url)
+
+
+def test_delivery_to_internal_address_is_not_sent(receiver):
+    # Adres sprawdzany ponownie przed wysłaniem - np. po zmianie rekordu DNS
+    outbox = WebhookOutbox(client=fakeredis.FakeRedis(decode_responses=True), secret=SECRET)
+    outbox.enqueue(receiver.url, {"task_id": "t4"})
+
+    assert outbox.process_due() == 0
+    assert receiver.requests == []
+    assert outbox.client.zcard(OUTBOX_KEY) == 0
+    assert outbox.client.llen(DEAD_LETTER_KEY) == 1
+
+
+def test_delivery_connects_to_the_validated_address(outbox, receiver, monkeypatch):
+    """Połączenie idzie na sprawdzony adres IP - nazwa nie jest rozwiązywana drugi raz (DNS rebinding)"""
+    port = receiver.server.server_port
+    monkeypatch.setattr(webhooks, "_resolve_host", lambda host, port: ["127.0.0.1"] if host == "hooks.test" else [])
+    assert resolve_callback_address(f"http://hooks.test:{port}/hook", allow_private=True) == "127.0.0.1"
+
+    outbox.enqueue(f"http://hooks.test:{port}/hook", {"task_id": "t7"})
+
+    assert outbox.process_due() == 1
+    headers, _ = receiver.requests[0]
+    assert headers["Host"] == f"hooks.test:{port}"
+
+
+def test_dead_letter_list_is_capped(monkeypatch):
+    monkeypatch.setattr(webhooks, "MAX_DEAD_LETTERS", 2)
+    outbox = WebhookOutbox(client=fakeredis.FakeRedis(decode_responses=True), secret=SECRET)
+    for i in range(4):
+        outbox.enqueue("http://127.0.0.1:1/hook", {"task_id": f"t{i}"})
+
+    assert outbox.process_due() == 0
+    assert outbox.client.llen(DEAD_LETTER_KEY) == 2
+    assert outbox.get_metrics()["dead_lettered"] == 4
+
+
+def test_upload_rejects_internal_callback_url(monkeypatch):
+    monkeypatch.setattr(webhooks.webhook_outbox, "secret", SECRET)
+    with TestClient(app) as client:
+        response = client.post(
+            "/upload/",
+            files={"file": ("doc.pdf", b"%PDF-1.7", "application/pdf")},
+            data={"callback_url": "http://169.254.169.254/latest/meta-data/"},
+        )
+
+    assert response.status_code == 400
+    assert "callback_url" in response.json()["detail"]
+
+
+def test_delivery_is_signed(outbox, receiver):
+    outbox.enqueue(receiver.url, build_callback_payload("t1", "SUCCESS", report=SAMPLE_REPORT))
+
+    assert outbox.process_due() == 1
+    headers, body = receiver.requests[0]
+    expected = sign_payload(body, headers["X-Webhook-Timestamp"], SECRET)
+    assert headers["X-Webhook-Signature"] == f"sha256={expected}"
+    assert json.loads(body)["task_id"] == "t1"
+
+    metrics = outbox.get_metrics()
+    assert metrics["delivered"] == 1
+    assert metrics["pending"] == 0
+
+
+def test_failed_delivery_is_retried_with_backoff(outbox):
+    stub = StubReceiver(status_code=500)
+    try:
+        outbox.enqueue(stub.url, {"task_id": "t2"})
+        assert outbox.process_due() == 0
+
+        # Doręczenie wróciło do kolejki z czasem w przyszłości
+        [(delivery_id, next_attempt)] = outbox.client.zrange(OUTBOX_KEY, 0, -1, withscores=True)
+        assert next_attempt > time.time() + 20
+        assert outbox.process_due() == 0  # jeszcze nie czas
+        assert len(stub.requests) == 1
+
+        # Odbiorca wstaje - kolejna próba po upływie opóźnienia kończy się sukcesem
+        stub.status_code = 200
+        outbox.client.zadd(OUTBOX_KEY, {delivery_id: 0})
+        assert outbox.process_due() == 1
+        assert outbox.get_metrics()["retried"] == 1
+    finally:
+        stub.close()
+
+
+def test_delivery_survives_worker_crash_after_claim(outbox, receiver):
+    delivery_id = outbox.enqueue(receiver.url, {"task_id": "t6"})
+
+    # Worker przejął doręczenie i padł przed wysłaniem
+    assert outbox._claim(delivery_id)
+    assert not outbox._claim(delivery_id)
+    assert outbox.process_due() == 0
+    assert outbox.client.zcard(OUTBOX_KEY) == 1
+
+    # Po upływie CLAIM_TIMEOUT_SECONDS doręczenie wraca do kolejki
+    outbox.client.delete(f"{CLAIM_KEY_PREFIX}{delivery_id}")
+    outbox.client.zadd(OUTBOX_KEY, {delivery_id: 0})
+    assert outbox.process_due() == 1
+    assert len(receiver.requests) == 1
+    assert outbox.client.zcard(OUTBOX_KEY) == 0
+    assert not outbox.client.exists(f"{CLAIM_KEY_PREFIX}{delivery_id}")
+
+
+def test_delivery_dead_lettered_after_max_attempts(outbox):
+    stub = StubReceiver(status_code=503)
+    try:
+        outbox.enqueue(stub.url, {"task_id": "t3"})
+        for _ in range(MAX_ATTEMPTS):
+            for delivery_id in outbox.client.zrange(OUTBOX_KEY, 0, -1):
+                outbox.client.zadd(OUTBOX_KEY, {delivery_id: 0})
+            outbox.process_due()
+
+        assert outbox.client.zcard(OUTBOX_KEY) == 0
+        assert outbox.client.llen(DEAD_LETTER_KEY) == 1
+        assert len(stub.requests) == MAX_ATTEMPTS
+    finally:
+        stub.close()
+
+
+def test_callbacks_refused_without_secret(receiver, monkeypatch):
+    outbox = WebhookOutbox(client=fakeredis.FakeRedis(decode_responses=True), secret="", allow_private_targets=True)
+    assert outbox.enqueue(receiver.url, {"task_id": "t5"}) is None
+
+    monkeypatch.setattr(webhooks.webhook_outbox, "secret", "")
+    with TestClient(app) as client:
+        response = client.post(
+            "/upload/",
+            files={"file": ("doc.pdf", b"%PDF-1.7", "application/pdf")},
+            data={"callback_url": "https://example.com/hook"},
+        )
+
+    assert response.status_code == 400
+    assert "WEBHOOK_SECRET" in response.json()["detail"]
+
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    calls = []
+    monkeypatch.setattr(tasks.webhook_outbox, "enqueue", lambda url, payload: calls.append((url, payload)))
+    monkeypatch.setattr(tasks.redis_client, "should_cache_file", lambda size: False)
+    return calls
+
+
+def test_task_notifies_after_success(enqueued, monkeypatch):
+    monkeypatch.setattr(tasks, "_run_pdf_analysis", lambda file_bytes: {
+        "basic_analysis": {"is_tagged": True, "contains_text": True}, "is_compliant": True, "failed_rules": []
+    })
+
+    result = tasks.run_full_pdf_analysis_task.apply(
+        kwargs={"file_bytes": b"%PDF", "filename": "doc.pdf", "callback_url": "https://example.com/hook"}
+    )
+
+    [(url, payload)] = enqueued
+    assert url == "https://example.com/hook"
+    assert payload["task_id"] == result.id
+    assert payload["status"] == "SUCCESS"
+    assert payload["summary"]["filename"] == "doc.pdf"
+
+
+def test_task_notifies_on_any_failure(enqueued, monkeypatch):
+    def fail(file_bytes):
+        raise TimeoutError("veraPDF timeout")
+
+    monkeypatch.setattr(tasks, "_run_pdf_analysis", fail)
+
+    result = tasks.run_full_pdf_analysis_task.apply(
+        args=(b"%PDF", "doc.pdf", "https://example.com/hook", "full")
+    )
+
+    assert result.failed()
+    [(url, payload)] = enqueued
+    assert payload == {"task_id": result.id, "status": "FAILURE", "report_url": f"/report/{result.id}",
+                       "error_message": "veraPDF timeout"}
@@ -29,7 +29,7 @@ import { useDragAndDrop } from '../hooks/useDragAndDrop';
 const PDFAuditTool = () => {
 	const state = usePdfAuditState();
 	const dispatch = usePdfAuditDispatch();
-	const { status, file, results, reportData, error, progress, analysisLevel } =
+	const { status, file, results, reportData, error, progress, analysisLevel, taskId } =
 		state;
 
 	const fileInputRef = useRef<HTMLInputElement>(null);
@@ -178,12 +178,12 @@ const PDFAuditTool = () => {
 									</div>
 								)}
 
-								{reportData && (
+								{reportData && taskId && (
 									<div id='report-section' className='mt-8'>
 										<ReportView
 											reportData={reportData}
 											onDownload={(format) =>
-												downloadReportAction(dispatch, format, reportData)
+												downloadReportAction(dispatch, format, taskId)
 											}
 										/>
 										<div className='flex justify-center mt-4'>
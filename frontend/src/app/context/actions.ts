@@ -1,5 +1,4 @@
 import { AppState, pdfAuditReducer } from '@/app/components/audit/state';
-import type { ReportData } from '@/app/types';
 import type { AnalysisLevel } from '@/app/components/audit/AnalysisLevelSelector';
 // KROK 1: Importujemy nasze scentralizowane funkcje z pliku api.ts
 import {
@@ -120,11 +119,11 @@ export const setAnalysisLevelAction = (
 export const downloadReportAction = async (
 	dispatch: Dispatch,
 	format: string,
-	reportData: ReportData
+	taskId: string
 ) => {
 	try {
 		// Wywołujemy funkcję z api.ts
-		await apiDownloadReport(format, reportData);
+		await apiDownloadReport(format, taskId);
 	} catch (err) {
 		dispatch({ type: 'SET_ERROR', payload: (err as Error).message });
 	}
@@ -1,4 +1,4 @@
-import type { AnalysisStatusResponse, AnalysisTaskResponse, ReportData } from '@/app/types';
+import type { AnalysisStatusResponse, AnalysisTaskResponse } from '@/app/types';
 import { AnalysisLevel } from '../components/audit/AnalysisLevelSelector';
 
 // Definiujemy bazowy adres URL API w jednym miejscu
@@ -50,21 +50,16 @@ export const checkAnalysisStatus = async (
 };
 
 /**
- * Wysyła żądanie pobrania raportu w określonym formacie.
+ * Pobiera raport zapisanej analizy w określonym formacie.
+ * Serwer renderuje raport z zapisanego wyniku - nie odsyłamy danych raportu.
  * @param format - Format raportu ('json', 'html', 'pdf').
- * @param reportData - Dane raportu do wysłania w ciele żądania.
+ * @param taskId - ID zadania analizy.
  */
 export const downloadReport = async (
 	format: string,
-	reportData: ReportData
+	taskId: string
 ): Promise<void> => {
-	const response = await fetch(`${API_URL}/download-report/${format}`, {
-		method: 'POST',
-		headers: {
-			'Content-Type': 'application/json',
-		},
-		body: JSON.stringify(reportData),
-	});
+	const response = await fetch(`${API_URL}/report/${taskId}/${format}`);
 
 	if (!response.ok) {
 		const errorData = await response.json().catch(() => ({}));